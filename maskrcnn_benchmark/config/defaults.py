@@ -50,6 +50,20 @@ _C.INPUT.PIXEL_MEAN = [102.9801, 115.9465, 122.7717]
 _C.INPUT.PIXEL_STD = [1., 1., 1.]
 # Convert image to BGR format (for Caffe2 models), in range 0-255
 _C.INPUT.TO_BGR255 = True
+# Keep the image in uint8 until the last transform, which converts it to
+# float and normalizes it in a single pass (see ToNormalizedTensor)
+_C.INPUT.FUSED_TRANSFORMS = False
+# Produce uint8 batches in the data loader, and normalize them in the model
+# after the transfer to the device. This cuts the memory and bandwidth
+# used by the batches by 4x. Implies FUSED_TRANSFORMS
+_C.INPUT.NORMALIZE_ON_DEVICE = False
+# Decode JPEG images at 1/2, 1/4 or 1/8 of their resolution when they are
+# resized to less than that anyway. Much faster for large images, but the
+# resized images differ slightly from the ones decoded at full resolution
+_C.INPUT.DRAFT_DECODING = False
+# Only record the resize and the flip of the targets in the transforms, and
+# apply them to all the boxes and polygons of a batch at once when collating
+_C.INPUT.DEFER_TARGET_TRANSFORMS = False
 
 # of compare test conf
 _C.INPUT.FLIP_PROB_TRAIN = 0.5
@@ -65,6 +79,19 @@ _C.DATASETS.TRAIN = ()
 _C.DATASETS.TEST = ()
 
 _C.DATASETS.USE_CONTIGUOUS_CATEGORY_ID = True
+# Directory with the pre-decoded image shards written by
+# tools/compile_image_shards.py, one sub-directory per dataset name.
+# Datasets without shards fall back to decoding the original images
+_C.DATASETS.DECODED_SHARDS_DIR = ""
+# If not empty, the annotations are parsed once and cached in this directory
+# as memory-mapped arrays, which are used to build the targets and avoid
+# parsing the json file when the job is restarted. The image sizes used for
+# aspect ratio grouping are cached there as well, for all the datasets
+_C.DATASETS.ANNOTATION_CACHE_DIR = ""
+# Directory with the tar shards written by tools/convert_to_tar_shards.py,
+# one sub-directory per dataset name. If not empty, the training samples are
+# streamed sequentially from the shards instead of read one file at a time
+_C.DATASETS.TAR_SHARDS_DIR = ""
 
 # -----------------------------------------------------------------------------
 # DataLoader
@@ -79,10 +106,56 @@ _C.DATALOADER.SIZE_DIVISIBILITY = 0
 # is compatible. This groups portrait images together, and landscape images
 # are not batched with portrait images.
 _C.DATALOADER.ASPECT_RATIO_GROUPING = True
+# If True, images are batched with images of close shapes once resized and
+# padded, instead of grouping them by aspect ratio, to reduce padding. At
+# inference, the batches are also sorted by shape
+_C.DATALOADER.SHAPE_BUCKETING = False
+# Minimum number of batches worth of images in each shape bucket during
+# training. Smaller buckets give less padding, but shuffle less
+_C.DATALOADER.SHAPE_BUCKET_MIN_BATCHES = 16
+# If True, distributed training draws the same global batches on every rank,
+# and splits each of them between the ranks so that their estimated costs
+# are balanced. The cost of an image is its number of megapixels once
+# resized, plus COST_PER_ANNOTATION for each of its annotations
+_C.DATALOADER.COST_BALANCING = False
+_C.DATALOADER.COST_PER_ANNOTATION = 0.02
+# If > 0, batches are collated into a pool of this many preallocated buffers
+# per worker (in shared memory, or pinned without workers) instead of newly
+# allocated tensors. It is raised to the number of batches alive at once if
+# needed: the batches prefetched by each worker, the PREFETCH_BATCHES of the
+# DataPrefetcher plus the one it moves to the device, and the one in use
+_C.DATALOADER.COLLATE_BUFFER_POOL_SIZE = 0
+
+# If > 0, the encoded image files are cached in a shared memory arena of this
+# many MB, shared by all the workers of a data loader, so that each file is
+# only read once from the storage as long as the dataset fits. Images that
+# were not read recently are evicted when it is full. The budget applies to
+# each rank: a node training on N GPUs uses N times this much memory
+_C.DATALOADER.IMAGE_CACHE_SIZE_MB = 0
+# Fill the image cache before training (or testing) starts, instead of as the
+# images are first read
+_C.DATALOADER.IMAGE_CACHE_PRELOAD = False
+
+# If > 0, the image files of this many batches ahead of the ones requested by
+# the workers are read into the page cache by a pool of threads, following
+# the order of the batch sampler
+_C.DATALOADER.READAHEAD_BATCHES = 0
+
+# If > 0, a background thread keeps up to this many batches ahead of the
+# model already copied to the device (see DataPrefetcher)
+_C.DATALOADER.PREFETCH_BATCHES = 0
+# Number of samples each data loading process shuffles the stream of tar
+# shards with (see DATASETS.TAR_SHARDS_DIR)
+_C.DATALOADER.SHUFFLE_BUFFER_SIZE = 1000
 
 # of compare test conf
 _C.DATALOADER.SEQUENTIAL_SAMPLE = False
 _C.DATALOADER.FAKE_IMAGE_DATA_PATH = ""
+# If not empty, training replays the batches recorded in this file by
+# tools/record_batches.py instead of loading the datasets, to measure the
+# throughput of the model alone. They must have been recorded for the same
+# SOLVER.IMS_PER_BATCH and number of GPUs, and each GPU replays its own batches
+_C.DATALOADER.SYNTHETIC_DATA_PATH = ""
 
 # ---------------------------------------------------------------------------- #
 # Backbone options
@@ -123,6 +196,14 @@ _C.MODEL.RPN.FG_IOU_THRESHOLD = 0.7
 # (anchor, gt box) pair to be a negative examples (IoU < BG_IOU_THRESHOLD
 # ==> negative RPN example)
 _C.MODEL.RPN.BG_IOU_THRESHOLD = 0.3
+# If > 0, the IoU between the anchors and the ground-truth boxes is computed
+# by tiles of this many anchors when matching them, which bounds the memory
+# used with many anchors and crowded images. The matches are the same
+_C.MODEL.RPN.MATCHER_TILE_SIZE = 0
+# If True, the IoU between the anchors and the ground-truth boxes is only
+# computed for the anchors of the grid cells near each box when matching them.
+# The matches are the same
+_C.MODEL.RPN.SPARSE_MATCHING = False
 # Total number of RPN examples per image
 _C.MODEL.RPN.BATCH_SIZE_PER_IMAGE = 256
 # Target fraction of foreground (positive) examples per RPN minibatch
@@ -148,6 +229,9 @@ _C.MODEL.RPN.RPN_HEAD = "SingleConvRPNHead"
 
 # of compare test conf
 _C.MODEL.RPN.RANDOM_SAMPLE = True
+# If True, the random samples of all the images are drawn at once, instead of
+# with a randperm per image. The samples differ from the per-image draws
+_C.MODEL.RPN.BATCHED_RANDOM_SAMPLE = False
 
 
 # ---------------------------------------------------------------------------- #
@@ -186,6 +270,9 @@ _C.MODEL.ROI_HEADS.DETECTIONS_PER_IMG = 100
 
 # of compare test conf
 _C.MODEL.ROI_HEADS.RANDOM_SAMPLE = True
+# If True, the random samples of all the images are drawn at once, instead of
+# with a randperm per image. The samples differ from the per-image draws
+_C.MODEL.ROI_HEADS.BATCHED_RANDOM_SAMPLE = False
 
 _C.MODEL.ROI_BOX_HEAD = CN()
 _C.MODEL.ROI_BOX_HEAD.FEATURE_EXTRACTOR = "ResNet50Conv5ROIFeatureExtractor"
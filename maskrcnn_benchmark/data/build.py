@@ -1,9 +1,10 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
-import bisect
-import copy
 import logging
+import os
 
+import numpy as np
 import torch.utils.data
+from maskrcnn_benchmark.utils.comm import get_rank
 from maskrcnn_benchmark.utils.comm import get_world_size
 from maskrcnn_benchmark.utils.imports import import_file
 
@@ -11,11 +12,20 @@ from . import datasets as D
 from . import samplers
 
 from .collate_batch import BatchCollator
+from .collate_batch import ImageBufferPool
+from .collate_batch import min_buffer_pool_size
+from .image_cache import SharedImageCache
+from .image_cache import attach_image_cache
+from .replay_batches import ReplayBatches
+from .replay_batches import ReplayDataLoader
+from .samplers.shape_bucketed_batch_sampler import compute_shape_buckets
+from .samplers.shape_bucketed_batch_sampler import pad_shapes
 from .transforms import build_transforms
 
 
 def build_dataset(dataset_list, transforms, dataset_catalog, is_train=True, 
-                  use_contiguous_category_id=True):
+                  use_contiguous_category_id=True, decoded_shards_dir="",
+                  annotation_cache_dir="", draft_decoding=False):
     """
     Arguments:
         dataset_list (list[str]): Contains the names of the datasets, i.e.,
@@ -24,6 +34,12 @@ def build_dataset(dataset_list, transforms, dataset_catalog, is_train=True,
         dataset_catalog (DatasetCatalog): contains the information on how to
             construct a dataset.
         is_train (bool): whether to setup the dataset for training or testing
+        decoded_shards_dir (str): if not empty, COCO datasets are served from
+            the pre-decoded shards found in `decoded_shards_dir/<dataset_name>`
+        annotation_cache_dir (str): if not empty, the parsed annotations are
+            cached in this directory as memory-mappable arrays
+        draft_decoding (bool): decode large JPEG images at a reduced scale,
+            close to the size they are resized to by the transforms
     """
     if not isinstance(dataset_list, (list, tuple)):
         raise RuntimeError(
@@ -38,8 +54,19 @@ def build_dataset(dataset_list, transforms, dataset_catalog, is_train=True,
         # during training
         if data["factory"] == "COCODataset":
             args["remove_images_without_annotations"] = is_train
+            shards_dir = os.path.join(decoded_shards_dir, dataset_name)
+            if decoded_shards_dir and os.path.exists(
+                os.path.join(shards_dir, D.DecodedImageShards.INDEX_FILE)
+            ):
+                args["decoded_shards_dir"] = shards_dir
+            if annotation_cache_dir:
+                args["ann_cache_dir"] = annotation_cache_dir
         if data["factory"] == "PascalVOCDataset":
             args["use_difficult"] = not is_train
+            if annotation_cache_dir:
+                args["ann_cache_dir"] = annotation_cache_dir
+        if data["factory"] in ("COCODataset", "PascalVOCDataset", "ListDataset"):
+            args["draft_decoding"] = draft_decoding
         args["transforms"] = transforms
         args["use_contiguous_category_id"] = use_contiguous_category_id
         # make dataset from factory
@@ -62,35 +89,107 @@ def make_data_sampler(dataset, shuffle, distributed):
     if distributed:
         return samplers.DistributedSampler(dataset, shuffle=shuffle)
     if shuffle:
-        sampler = torch.utils.data.sampler.RandomSampler(dataset)
+        # seeded by the epoch, like DistributedSampler, so that a pass can
+        # be drawn again to resume from the middle of it. The base seed is
+        # drawn from the torch RNG, as RandomSampler does, so that runs with
+        # different seeds see different orders, and is saved with the state
+        # of the batch sampler
+        seed = int(torch.empty((), dtype=torch.int64).random_(2 ** 31).item())
+        sampler = samplers.DistributedSampler(dataset, num_replicas=1, rank=0, seed=seed)
     else:
         sampler = torch.utils.data.sampler.SequentialSampler(dataset)
     return sampler
 
 
 def _quantize(x, bins):
-    bins = copy.copy(bins)
     bins = sorted(bins)
-    quantized = list(map(lambda y: bisect.bisect_right(bins, y), x))
-    return quantized
+    # same as bisect.bisect_right for each element of x
+    quantized = np.searchsorted(np.asarray(bins, dtype=np.float64), x, side="right")
+    return quantized.tolist()
 
 
-def _compute_aspect_ratios(dataset):
-    aspect_ratios = []
-    for i in range(len(dataset)):
-        img_info = dataset.get_img_info(i)
-        aspect_ratio = float(img_info["height"]) / float(img_info["width"])
-        aspect_ratios.append(aspect_ratio)
-    return aspect_ratios
+def _compute_aspect_ratios(dataset, cache_dir=""):
+    image_info = D.load_or_compute_image_info(dataset, cache_dir)
+    heights = image_info[:, 0].astype(np.float64)
+    widths = image_info[:, 1].astype(np.float64)
+    return heights / widths
+
+
+def _compute_resized_shapes(dataset, min_size, max_size, cache_dir=""):
+    """
+    (height, width) of each image after the Resize transform, computed as
+    in Resize.get_size without loading the images
+    """
+    image_info = D.load_or_compute_image_info(dataset, cache_dir)
+    h = image_info[:, 0].astype(np.float64)
+    w = image_info[:, 1].astype(np.float64)
+    min_original_size = np.minimum(w, h)
+    max_original_size = np.maximum(w, h)
+    size = np.full(len(image_info), float(min_size))
+    if max_size is not None:
+        too_large = max_original_size / min_original_size * min_size > max_size
+        size[too_large] = np.round(
+            max_size * min_original_size[too_large] / max_original_size[too_large]
+        )
+    resized_shapes = np.stack([h, w], axis=1)
+    # images whose smaller side is already at the right size are not resized
+    resize = min_original_size != size
+    portrait = resize & (w < h)
+    landscape = resize & (w >= h)
+    resized_shapes[portrait, 0] = np.floor(size * h / w)[portrait]
+    resized_shapes[portrait, 1] = size[portrait]
+    resized_shapes[landscape, 0] = size[landscape]
+    resized_shapes[landscape, 1] = np.floor(size * w / h)[landscape]
+    return resized_shapes.astype(np.int64)
+
+
+def _compute_image_costs(dataset, min_size, max_size, cost_per_annotation, cache_dir=""):
+    """
+    Estimated cost of training on each image: its number of megapixels once
+    resized, plus cost_per_annotation for each of its annotations (matching
+    and mask targets grow with them)
+    """
+    resized_shapes = _compute_resized_shapes(dataset, min_size, max_size, cache_dir)
+    image_info = D.load_or_compute_image_info(dataset, cache_dir)
+    # -1 when the number of annotations is unknown
+    num_annotations = np.maximum(image_info[:, 2], 0)
+    return resized_shapes.prod(axis=1) / 1e6 + cost_per_annotation * num_annotations
+
+
+def make_cost_balanced_batch_sampler(
+    dataset, group_ids, costs, images_per_gpu, num_replicas, rank, num_iters=None,
+    start_iter=0
+):
+    # every rank draws the same global batches, whose images it then splits
+    sampler = samplers.DistributedSampler(dataset, num_replicas=1, rank=0)
+    batch_sampler = samplers.GroupedBatchSampler(
+        sampler, group_ids, images_per_gpu * num_replicas, drop_uneven=True
+    )
+    batch_sampler = samplers.CostBalancedBatchSampler(
+        batch_sampler, costs, num_replicas, rank
+    )
+    if num_iters is not None:
+        batch_sampler = samplers.IterationBasedBatchSampler(
+            batch_sampler, num_iters, start_iter
+        )
+    return batch_sampler
 
 
 def make_batch_data_sampler(
-    dataset, sampler, aspect_grouping, images_per_batch, num_iters=None, start_iter=0
+    dataset, sampler, aspect_grouping, images_per_batch, num_iters=None, start_iter=0,
+    image_info_cache_dir="", image_shapes=None, size_divisible=0, min_bucket_size=1,
+    sort_by_shape=False
 ):
-    if aspect_grouping:
+    if image_shapes is not None:
+        # group the images by padded shape, instead of by aspect ratio
+        batch_sampler = samplers.ShapeBucketedBatchSampler(
+            sampler, image_shapes, images_per_batch, size_divisible,
+            min_bucket_size, drop_uneven=False, sort_by_shape=sort_by_shape
+        )
+    elif aspect_grouping:
         if not isinstance(aspect_grouping, (list, tuple)):
             aspect_grouping = [aspect_grouping]
-        aspect_ratios = _compute_aspect_ratios(dataset)
+        aspect_ratios = _compute_aspect_ratios(dataset, image_info_cache_dir)
         group_ids = _quantize(aspect_ratios, aspect_grouping)
         batch_sampler = samplers.GroupedBatchSampler(
             sampler, group_ids, images_per_batch, drop_uneven=False
@@ -106,7 +205,154 @@ def make_batch_data_sampler(
     return batch_sampler
 
 
-def make_data_loader(cfg, is_train=True, is_distributed=False, start_iter=0):
+def _make_cost_balanced_batch_sampler(
+    cfg, dataset, aspect_grouping, image_shapes, images_per_gpu, num_gpus, num_iters,
+    start_iter
+):
+    cache_dir = cfg.DATASETS.ANNOTATION_CACHE_DIR
+    # the global batches are grouped like the per-rank batches would be
+    if image_shapes is not None:
+        group_ids = compute_shape_buckets(
+            pad_shapes(image_shapes, cfg.DATALOADER.SIZE_DIVISIBILITY),
+            cfg.DATALOADER.SHAPE_BUCKET_MIN_BATCHES * images_per_gpu * num_gpus,
+        )
+    elif aspect_grouping:
+        group_ids = _quantize(_compute_aspect_ratios(dataset, cache_dir), aspect_grouping)
+    else:
+        group_ids = [0] * len(dataset)
+    costs = _compute_image_costs(
+        dataset, cfg.INPUT.MIN_SIZE_TRAIN, cfg.INPUT.MAX_SIZE_TRAIN,
+        cfg.DATALOADER.COST_PER_ANNOTATION, cache_dir,
+    )
+    return make_cost_balanced_batch_sampler(
+        dataset, group_ids, costs, images_per_gpu, num_gpus, get_rank(), num_iters,
+        start_iter,
+    )
+
+
+def _load_sampler_state(batch_sampler, sampler_states, start_iter, num_gpus):
+    logger = logging.getLogger(__name__)
+    if len(sampler_states) != num_gpus:
+        logger.warning(
+            "Not resuming the batch sampler: the checkpoint has the states of "
+            "{} ranks, for {} ranks".format(len(sampler_states), num_gpus)
+        )
+        return
+    state = sampler_states[get_rank()]
+    if state["iteration"] != start_iter:
+        logger.warning(
+            "Not resuming the batch sampler: its state is at iteration {}, "
+            "not {}".format(state["iteration"], start_iter)
+        )
+        return
+    batch_sampler.load_state_dict(state)
+
+
+def _make_buffer_pool(cfg, is_train, images_per_gpu):
+    num_buffers = cfg.DATALOADER.COLLATE_BUFFER_POOL_SIZE
+    if num_buffers <= 0:
+        return None
+    # the DataPrefetcher is used for training and inference
+    min_buffers = min_buffer_pool_size(
+        cfg.DATALOADER.NUM_WORKERS, cfg.DATALOADER.PREFETCH_BATCHES
+    )
+    if num_buffers < min_buffers:
+        logger = logging.getLogger(__name__)
+        logger.warning(
+            "DATALOADER.COLLATE_BUFFER_POOL_SIZE ({}) is smaller than the "
+            "number of batches alive at once, using {} buffers".format(
+                num_buffers, min_buffers
+            )
+        )
+        num_buffers = min_buffers
+    # large enough for a batch of the largest images, in any orientation
+    max_size = cfg.INPUT.MAX_SIZE_TRAIN if is_train else cfg.INPUT.MAX_SIZE_TEST
+    stride = max(cfg.DATALOADER.SIZE_DIVISIBILITY, 1)
+    max_size = -(-max_size // stride) * stride
+    return ImageBufferPool(num_buffers, images_per_gpu * 3 * max_size * max_size)
+
+
+def _make_image_cache(cfg, dataset):
+    if cfg.DATALOADER.IMAGE_CACHE_SIZE_MB <= 0:
+        return None
+    # one cache per rank, each with the full budget
+    cache = SharedImageCache(
+        len(dataset), cfg.DATALOADER.IMAGE_CACHE_SIZE_MB * 1024 * 1024
+    )
+    keys, paths = attach_image_cache([dataset], cache)
+    if cfg.DATALOADER.IMAGE_CACHE_PRELOAD:
+        logger = logging.getLogger(__name__)
+        cache.preload(keys, paths)
+        stats = cache.stats()
+        logger.info(
+            "Preloaded {} of {} images ({:.0f} MB) in the image cache".format(
+                stats["num_images"], len(keys), stats["bytes"] / 1024.0 / 1024.0
+            )
+        )
+    return cache
+
+
+def _make_replay_data_loader(cfg, images_per_gpu, num_iters, start_iter):
+    path = cfg.DATALOADER.SYNTHETIC_DATA_PATH
+    replay_batches = ReplayBatches(path)
+    num_gpus = get_world_size()
+    if (replay_batches.images_per_gpu, replay_batches.world_size) != (
+        images_per_gpu,
+        num_gpus,
+    ):
+        raise ValueError(
+            "{} has batches of {} images for {} GPUs, but training uses {} "
+            "images per GPU on {} GPUs: record them again with "
+            "tools/record_batches.py --num-gpus {}".format(
+                path,
+                replay_batches.images_per_gpu,
+                replay_batches.world_size,
+                images_per_gpu,
+                num_gpus,
+                num_gpus,
+            )
+        )
+    return ReplayDataLoader(replay_batches, num_iters, start_iter, get_rank(), num_gpus)
+
+
+def _make_tar_shards_data_loader(cfg, images_per_gpu, num_iters, start_iter):
+    shard_dirs = [
+        os.path.join(cfg.DATASETS.TAR_SHARDS_DIR, dataset_name)
+        for dataset_name in cfg.DATASETS.TRAIN
+    ]
+    dataset = D.TarShardDataset(
+        shard_dirs,
+        images_per_gpu,
+        num_iters,
+        start_iter,
+        transforms=build_transforms(cfg, True),
+        aspect_grouping=cfg.DATALOADER.ASPECT_RATIO_GROUPING,
+        shuffle_buffer_size=cfg.DATALOADER.SHUFFLE_BUFFER_SIZE,
+        rank=get_rank(),
+        world_size=get_world_size(),
+        draft_decoding=cfg.INPUT.DRAFT_DECODING,
+    )
+    collator = BatchCollator(
+        cfg.DATALOADER.SIZE_DIVISIBILITY,
+        _make_buffer_pool(cfg, True, images_per_gpu),
+    )
+    # the dataset returns whole batches
+    return torch.utils.data.DataLoader(
+        dataset,
+        batch_size=None,
+        num_workers=cfg.DATALOADER.NUM_WORKERS,
+        collate_fn=collator,
+    )
+
+
+def make_data_loader(
+    cfg, is_train=True, is_distributed=False, start_iter=0, sampler_states=None
+):
+    """
+    sampler_states (list[dict]): the state of the batch sampler of every rank
+        at start_iter, as saved in the checkpoints by do_train, to resume
+        with the same batches as an uninterrupted run
+    """
     num_gpus = get_world_size()
     if is_train:
         images_per_batch = cfg.SOLVER.IMS_PER_BATCH
@@ -117,6 +363,9 @@ def make_data_loader(cfg, is_train=True, is_distributed=False, start_iter=0):
         images_per_gpu = images_per_batch // num_gpus
         shuffle = True
         num_iters = cfg.SOLVER.MAX_ITER
+        min_size = cfg.INPUT.MIN_SIZE_TRAIN
+        max_size = cfg.INPUT.MAX_SIZE_TRAIN
+        bucket_size = cfg.DATALOADER.SHAPE_BUCKET_MIN_BATCHES * images_per_gpu
     else:
         images_per_batch = cfg.TEST.IMS_PER_BATCH
         assert (
@@ -127,6 +376,8 @@ def make_data_loader(cfg, is_train=True, is_distributed=False, start_iter=0):
         shuffle = False if not is_distributed else True
         num_iters = None
         start_iter = 0
+        min_size = cfg.INPUT.MIN_SIZE_TEST
+        max_size = cfg.INPUT.MAX_SIZE_TEST
 
     if images_per_gpu > 1:
         logger = logging.getLogger(__name__)
@@ -141,6 +392,12 @@ def make_data_loader(cfg, is_train=True, is_distributed=False, start_iter=0):
             "https://github.com/facebookresearch/Detectron/blob/master/configs/getting_started/tutorial_1gpu_e2e_faster_rcnn_R-50-FPN.yaml#L14"
         )
 
+    if is_train and cfg.DATALOADER.SYNTHETIC_DATA_PATH:
+        # the datasets are not even built
+        return _make_replay_data_loader(cfg, images_per_gpu, num_iters, start_iter)
+    if is_train and cfg.DATASETS.TAR_SHARDS_DIR:
+        return _make_tar_shards_data_loader(cfg, images_per_gpu, num_iters, start_iter)
+
     # group images which have similar aspect ratio. In this case, we only
     # group in two cases: those with width / height > 1, and the other way around,
     # but the code supports more general grouping strategy
@@ -154,7 +411,10 @@ def make_data_loader(cfg, is_train=True, is_distributed=False, start_iter=0):
 
     transforms = build_transforms(cfg, is_train)
     datasets = build_dataset(dataset_list, transforms, DatasetCatalog, is_train, 
-                             cfg.DATASETS.USE_CONTIGUOUS_CATEGORY_ID)
+                             cfg.DATASETS.USE_CONTIGUOUS_CATEGORY_ID,
+                             cfg.DATASETS.DECODED_SHARDS_DIR,
+                             cfg.DATASETS.ANNOTATION_CACHE_DIR,
+                             cfg.INPUT.DRAFT_DECODING)
 
     data_loaders = []
     for dataset in datasets:
@@ -162,10 +422,38 @@ def make_data_loader(cfg, is_train=True, is_distributed=False, start_iter=0):
             sampler = torch.utils.data.sampler.SequentialSampler(dataset)
         else:
             sampler = make_data_sampler(dataset, shuffle, is_distributed)
-        batch_sampler = make_batch_data_sampler(
-            dataset, sampler, aspect_grouping, images_per_gpu, num_iters, start_iter
+        image_shapes = None
+        if cfg.DATALOADER.SHAPE_BUCKETING:
+            image_shapes = _compute_resized_shapes(
+                dataset, min_size, max_size, cfg.DATASETS.ANNOTATION_CACHE_DIR
+            )
+        if is_train and is_distributed and cfg.DATALOADER.COST_BALANCING:
+            batch_sampler = _make_cost_balanced_batch_sampler(
+                cfg, dataset, aspect_grouping, image_shapes, images_per_gpu,
+                num_gpus, num_iters, start_iter,
+            )
+        else:
+            batch_sampler = make_batch_data_sampler(
+                dataset, sampler, aspect_grouping, images_per_gpu, num_iters,
+                start_iter, cfg.DATASETS.ANNOTATION_CACHE_DIR,
+                image_shapes=image_shapes,
+                size_divisible=cfg.DATALOADER.SIZE_DIVISIBILITY,
+                # at inference, a bucket per shape, in order, gives the least padding
+                min_bucket_size=bucket_size if is_train else 1,
+                sort_by_shape=not is_train,
+            )
+        if cfg.DATALOADER.READAHEAD_BATCHES > 0:
+            batch_sampler = samplers.ReadAheadBatchSampler(
+                batch_sampler, dataset.get_image_path, cfg.DATALOADER.READAHEAD_BATCHES
+            )
+        if is_train and sampler_states:
+            _load_sampler_state(batch_sampler, sampler_states, start_iter, num_gpus)
+        collator = BatchCollator(
+            cfg.DATALOADER.SIZE_DIVISIBILITY,
+            _make_buffer_pool(cfg, is_train, images_per_gpu),
         )
-        collator = BatchCollator(cfg.DATALOADER.SIZE_DIVISIBILITY)
+        # created before the workers, which share it
+        image_cache = _make_image_cache(cfg, dataset)
         num_workers = cfg.DATALOADER.NUM_WORKERS
         data_loader = torch.utils.data.DataLoader(
             dataset,
@@ -173,6 +461,8 @@ def make_data_loader(cfg, is_train=True, is_distributed=False, start_iter=0):
             batch_sampler=batch_sampler,
             collate_fn=collator,
         )
+        # for the hit and miss counters
+        data_loader.image_cache = image_cache
         data_loaders.append(data_loader)
     if is_train:
         # during training, a single (possibly concatenated) data_loader is returned
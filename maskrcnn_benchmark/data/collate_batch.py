@@ -1,7 +1,101 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import torch
+
+from maskrcnn_benchmark.structures.deferred_box_list import apply_deferred_transforms
 from maskrcnn_benchmark.structures.image_list import to_image_list
 
 
+def _is_in_use(buffer):
+    """
+    Returns whether other tensors than buffer (e.g., the images of a batch)
+    use its storage, in this process
+    """
+    if not hasattr(torch._C, "_storage_Use_Count"):
+        return False
+    storage = buffer.untyped_storage()
+    # the references of buffer and of the storage object
+    return torch._C._storage_Use_Count(storage._cdata) > 2
+
+
+def min_buffer_pool_size(num_workers, prefetch_batches):
+    """
+    Returns the number of buffers each process needs so that a buffer is
+    never reused while the batch collated into it is alive: the batches
+    prefetched by a DataLoader worker (2 by default), the batches in the
+    queue of the DataPrefetcher plus the one it moves to the device, and the
+    batch being trained on
+    """
+    loader_batches = 2 if num_workers > 0 else 0
+    return loader_batches + prefetch_batches + 2
+
+
+class ImageBufferPool(object):
+    """
+    Round-robin pool of preallocated buffers that padded batches are
+    collated into, instead of allocating (and zero-filling) a new tensor
+    for every batch.
+    Inside a DataLoader worker, the buffers live in shared memory, so
+    that sending a batch to the main process doesn't copy it again. In
+    the main process, they are pinned when CUDA is available.
+    A buffer is reused num_buffers batches later. When a batch collated
+    into it is still alive in this process, a new buffer replaces it
+    instead. A worker can't see the batches alive in the main process, so
+    num_buffers must be larger than the number of batches alive at any time
+    (see min_buffer_pool_size).
+    """
+
+    def __init__(self, num_buffers, numel=0):
+        """
+        Arguments:
+            num_buffers (int): number of buffers in the pool
+            numel (int): initial size of each buffer, in elements. Buffers
+                grow when a batch doesn't fit
+        """
+        self.num_buffers = num_buffers
+        self.numel = numel
+        self.buffers = []
+        self.next_buffer = 0
+
+    def _allocate(self, numel, dtype):
+        buffer = torch.empty(numel, dtype=dtype)
+        worker_info = None
+        if hasattr(torch.utils.data, "get_worker_info"):
+            worker_info = torch.utils.data.get_worker_info()
+        if worker_info is not None:
+            buffer.share_memory_()
+        elif torch.cuda.is_available():
+            buffer = buffer.pin_memory()
+        return buffer
+
+    def get(self, numel, dtype):
+        """
+        Returns the next buffer of the pool, with at least numel elements
+        """
+        # allocated lazily, so that each worker owns its buffers
+        if len(self.buffers) < self.num_buffers:
+            self.buffers.append(None)
+            index = len(self.buffers) - 1
+        else:
+            index = self.next_buffer
+            self.next_buffer = (self.next_buffer + 1) % self.num_buffers
+        buffer = self.buffers[index]
+        if buffer is not None and _is_in_use(buffer):
+            # the batch collated into it is still alive: the pool lets go of
+            # the buffer, which is freed with the batch
+            buffer = None
+        if buffer is None or buffer.numel() < numel or buffer.dtype != dtype:
+            buffer = self._allocate(max(numel, self.numel), dtype)
+            self.buffers[index] = buffer
+        return buffer
+
+    def __getstate__(self):
+        # each process allocates its own buffers
+        state = self.__dict__.copy()
+        state["buffers"] = []
+        state["next_buffer"] = 0
+        return state
+
+
 class BatchCollator(object):
     """
     From a list of samples from the dataset,
@@ -9,12 +103,27 @@ class BatchCollator(object):
     This should be passed to the DataLoader
     """
 
-    def __init__(self, size_divisible=0):
+    def __init__(self, size_divisible=0, buffer_pool=None):
         self.size_divisible = size_divisible
+        self.buffer_pool = buffer_pool
+
+    def _get_buffer(self, images):
+        if self.buffer_pool is None or not isinstance(images[0], torch.Tensor):
+            return None
+        stride = max(self.size_divisible, 1)
+        c = max(img.shape[0] for img in images)
+        h = -(-max(img.shape[1] for img in images) // stride) * stride
+        w = -(-max(img.shape[2] for img in images) // stride) * stride
+        return self.buffer_pool.get(len(images) * c * h * w, images[0].dtype)
 
     def __call__(self, batch):
         transposed_batch = list(zip(*batch))
-        images = to_image_list(transposed_batch[0], self.size_divisible)
-        targets = transposed_batch[1]
+        images = to_image_list(
+            transposed_batch[0],
+            self.size_divisible,
+            out=self._get_buffer(transposed_batch[0]),
+        )
+        # resize and flip the targets of DeferTargetTransforms
+        targets = tuple(apply_deferred_transforms(transposed_batch[1]))
         img_ids = transposed_batch[2]
         return images, targets, img_ids
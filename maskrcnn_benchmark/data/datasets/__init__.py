@@ -2,5 +2,9 @@
 from .coco import COCODataset
 from .voc import PascalVOCDataset
 from .concat_dataset import ConcatDataset
+from .decoded_shards import DecodedImageShards
+from .image_info_cache import load_or_compute_image_info
+from .tar_shards import TarShardDataset
 
-__all__ = ["COCODataset", "ConcatDataset", "PascalVOCDataset"]
+__all__ = ["COCODataset", "ConcatDataset", "PascalVOCDataset", "DecodedImageShards",
+           "load_or_compute_image_info", "TarShardDataset"]
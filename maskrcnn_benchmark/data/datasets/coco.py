@@ -1,25 +1,61 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import hashlib
 import os
+
 import numpy
 import torch
 import torchvision
+from PIL import Image
 
+from maskrcnn_benchmark.data.image_io import find_resize_transform
+from maskrcnn_benchmark.data.image_io import load_image
 from maskrcnn_benchmark.structures.bounding_box import BoxList
 from maskrcnn_benchmark.structures.segmentation_mask import SegmentationMask
 
+from .coco_annotation_index import CocoAnnotationIndex
+from .coco_annotation_index import file_fingerprint
+from .coco_targets import CocoTargets
+from .decoded_shards import DecodedImageShards
+
 
 class COCODataset(torchvision.datasets.coco.CocoDetection):
     def __init__(
-        self, ann_file, root, remove_images_without_annotations, transforms=None, 
-        use_contiguous_category_id=True
+        self, ann_file, root, remove_images_without_annotations, transforms=None,
+        use_contiguous_category_id=True, decoded_shards_dir=None, ann_cache_dir=None,
+        draft_decoding=False
     ):
-        super(COCODataset, self).__init__(root, ann_file)
+        self.ann_file = ann_file
+        self.ann_index = None
+        self.compiled_targets = None
+        self._coco = None
+        if ann_cache_dir:
+            # the json file is only parsed if the index is not cached yet, or
+            # when self.coco is accessed (e.g., for evaluation). Only the
+            # initialization of CocoDetection, which parses it, is skipped
+            super(torchvision.datasets.coco.CocoDetection, self).__init__(root)
+            self.ann_index = CocoAnnotationIndex.load_or_build(ann_file, ann_cache_dir)
+            self.ids = self.ann_index.image_ids.tolist()
+            # clipped targets without crowd and empty boxes, see CocoTargets
+            self.compiled_targets = CocoTargets.load_or_compile(
+                self.ann_index,
+                CocoAnnotationIndex.cache_path(ann_file, ann_cache_dir),
+            )
+        else:
+            super(COCODataset, self).__init__(root, ann_file)
 
         # remove Imgs with category_id > 81
-        to_remove = set([])
-        for cat_id, _ in self.coco.cats.items():
-            if cat_id > 81:
-                to_remove |= set(self.coco.catToImgs[cat_id])
+        if self.ann_index is not None:
+            cat_ids = self.ann_index.cat_ids.tolist()
+            rows = self.ann_index.image_rows_with_categories(
+                [c for c in cat_ids if c > 81]
+            )
+            to_remove = set(self.ann_index.image_ids[rows].tolist())
+        else:
+            cat_ids = self.coco.getCatIds()
+            to_remove = set([])
+            for cat_id, _ in self.coco.cats.items():
+                if cat_id > 81:
+                    to_remove |= set(self.coco.catToImgs[cat_id])
         self.ids = list(set(self.ids) - to_remove)
 
         # sort indices for reproducible results
@@ -27,51 +63,136 @@ class COCODataset(torchvision.datasets.coco.CocoDetection):
 
         # filter images without detection annotations
         if remove_images_without_annotations:
-            self.ids = [
-                img_id
-                for img_id in self.ids
-                if len(self.coco.getAnnIds(imgIds=img_id, iscrowd=None)) > 0
-            ]
+            if self.ann_index is not None:
+                num_anns = numpy.diff(self.ann_index.ann_offsets)
+                keep = set(self.ann_index.image_ids[num_anns > 0].tolist())
+                self.ids = [img_id for img_id in self.ids if img_id in keep]
+            else:
+                self.ids = [
+                    img_id
+                    for img_id in self.ids
+                    if len(self.coco.getAnnIds(imgIds=img_id, iscrowd=None)) > 0
+                ]
 
         self.json_category_id_to_contiguous_id = {
-            v: i + 1 for i, v in enumerate(self.coco.getCatIds())
+            v: i + 1 for i, v in enumerate(cat_ids)
         }
         self.contiguous_category_id_to_json_id = {
             v: k for k, v in self.json_category_id_to_contiguous_id.items()
         }
         self.id_to_img_map = {k: v for k, v in enumerate(self.ids)}
+        self._category_lut = None
+        if self.compiled_targets is not None:
+            self._category_lut = numpy.zeros(max(cat_ids, default=0) + 1, numpy.int64)
+            for json_id, contiguous_id in self.json_category_id_to_contiguous_id.items():
+                self._category_lut[json_id] = contiguous_id
         self.transforms = transforms
         self.use_contiguous_category_id = use_contiguous_category_id
+        # decode large JPEG images at a reduced scale, see load_image
+        self.draft_decoding = draft_decoding
+
+        # images that were decoded ahead of time by tools/compile_image_shards.py
+        self.decoded_shards = None
+        if decoded_shards_dir:
+            self.decoded_shards = DecodedImageShards(decoded_shards_dir)
+        # encoded image files shared by the workers, see SharedImageCache
+        self.image_cache = None
 
         self.save_dir = './new_dump'
         if not os.path.exists(self.save_dir):
             os.makedirs(self.save_dir)
 
-
-    def __getitem__(self, idx):
-        img, anno = super(COCODataset, self).__getitem__(idx)
-
-        # numpy.save(self.save_dir + '/img' + '.' + str(img.size), numpy.asarray(img))
-
+    @property
+    def coco(self):
+        if self._coco is None:
+            from pycocotools.coco import COCO
+
+            self._coco = COCO(self.ann_file)
+        return self._coco
+
+    @coco.setter
+    def coco(self, coco):
+        self._coco = coco
+
+    def _load_image(self, idx):
+        """
+        Returns the image and the size of the image the annotations refer to
+        """
+        img_id = self.ids[idx]
+        if self.decoded_shards is not None and img_id in self.decoded_shards:
+            img = Image.fromarray(self.decoded_shards.get(img_id))
+            return img, self.decoded_shards.original_size(img_id)
+
+        resize = None
+        if self.draft_decoding:
+            resize = find_resize_transform(self.transforms)
+        path = self.get_image_path(idx)
+        if self.image_cache is not None:
+            path = self.image_cache.open(idx, path)
+        return load_image(path, resize)
+
+    def _load_annotations(self, idx):
+        """
+        Returns the boxes (xywh), category ids and polygons of the non-crowd
+        annotations of an image
+        """
+        img_id = self.ids[idx]
+        if self.ann_index is not None:
+            row = self.ann_index.get_row(img_id)
+            boxes, classes, iscrowd, masks = self.ann_index.get_annotations(row)
+            keep = iscrowd == 0
+            masks = [m for m, k in zip(masks, keep) if k]
+            return torch.from_numpy(boxes[keep]), classes[keep].tolist(), masks
+
+        anno = self.coco.loadAnns(self.coco.getAnnIds(imgIds=img_id))
         # filter crowd annotations
         # TODO might be better to add an extra field
         anno = [obj for obj in anno if obj["iscrowd"] == 0]
 
         boxes = [obj["bbox"] for obj in anno]
         boxes = torch.as_tensor(boxes).reshape(-1, 4)  # guard against no boxes
-        target = BoxList(boxes, img.size, mode="xywh").convert("xyxy")
-
         classes = [obj["category_id"] for obj in anno]
+        masks = [obj["segmentation"] for obj in anno]
+        return boxes, classes, masks
+
+    def _make_target(self, idx, image_size):
+        boxes, classes, masks = self._load_annotations(idx)
+        target = BoxList(boxes, image_size, mode="xywh").convert("xyxy")
+
         if self.use_contiguous_category_id:
             classes = [self.json_category_id_to_contiguous_id[c] for c in classes]
         classes = torch.tensor(classes)
         target.add_field("labels", classes)
 
-        masks = [obj["segmentation"] for obj in anno]
-        masks = SegmentationMask(masks, img.size)
+        masks = SegmentationMask(masks, image_size)
         target.add_field("masks", masks)
+        return target
+
+    def _make_clipped_target(self, idx, image_size):
+        """
+        Returns the target of the image without the boxes that are empty once
+        clipped to image_size
+        """
+        if self.compiled_targets is not None:
+            row = self.ann_index.get_row(self.ids[idx])
+            if tuple(self.ann_index.image_sizes[row].tolist()) == tuple(image_size):
+                category_lut = None
+                if self.use_contiguous_category_id:
+                    category_lut = self._category_lut
+                return self.compiled_targets.get_target(row, image_size, category_lut)
+        target = self._make_target(idx, image_size)
+        return target.clip_to_image(remove_empty=True)
+
+    def __getitem__(self, idx):
+        img, image_size = self._load_image(idx)
 
-        target = target.clip_to_image(remove_empty=True)
+        # numpy.save(self.save_dir + '/img' + '.' + str(img.size), numpy.asarray(img))
+
+        target = self._make_clipped_target(idx, image_size)
+        # pre-resized shards and draft decoded images are smaller than the
+        # annotated image
+        if img.size != image_size:
+            target = target.resize(img.size)
 
         if self.transforms is not None:
             img, target = self.transforms(img, target)
@@ -80,5 +201,50 @@ class COCODataset(torchvision.datasets.coco.CocoDetection):
 
     def get_img_info(self, index):
         img_id = self.id_to_img_map[index]
+        if self.ann_index is not None:
+            row = self.ann_index.get_row(img_id)
+            width, height = self.ann_index.image_sizes[row].tolist()
+            return {
+                "id": img_id,
+                "file_name": str(self.ann_index.file_names[row]),
+                "width": width,
+                "height": height,
+            }
         img_data = self.coco.imgs[img_id]
         return img_data
+
+    def get_image_path(self, index):
+        img_id = self.id_to_img_map[index]
+        if self.ann_index is not None:
+            row = self.ann_index.get_row(img_id)
+            path = str(self.ann_index.file_names[row])
+        else:
+            path = self.coco.loadImgs(img_id)[0]["file_name"]
+        return os.path.join(self.root, path)
+
+    def get_groundtruth(self, index):
+        """
+        Returns the target of the image, in the frame of the annotated
+        image, without loading the image
+        """
+        img_info = self.get_img_info(index)
+        return self._make_target(index, (img_info["width"], img_info["height"]))
+
+    def get_num_annotations(self, index):
+        """
+        Returns the number of non-crowd annotations of the image
+        """
+        img_id = self.id_to_img_map[index]
+        if self.ann_index is not None:
+            row = self.ann_index.get_row(img_id)
+            start, end = self.ann_index.ann_offsets[row : row + 2]
+            return int((self.ann_index.iscrowd[start:end] == 0).sum())
+        return len(self.coco.getAnnIds(imgIds=img_id, iscrowd=False))
+
+    def get_cache_key(self):
+        """
+        Identifies the annotation file and the images kept from it
+        """
+        key = hashlib.sha1(numpy.asarray(self.ids, dtype=numpy.int64).tobytes())
+        key.update(file_fingerprint(self.ann_file).encode("utf-8"))
+        return key.hexdigest()[:16]
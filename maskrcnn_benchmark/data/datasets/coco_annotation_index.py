@@ -0,0 +1,220 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Columnar store for the annotations of a COCO json file.
+
+All the annotations are flattened into a few arrays (boxes, category ids,
+crowd flags and polygon coordinates) plus per-image and per-annotation
+offset arrays. The arrays are saved as .npy files and memory-mapped on
+load, so that restarting a job does not need to parse the json file and
+building the target of an image only slices a few arrays.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+def file_fingerprint(path):
+    """
+    Cheap identifier of the content of a file, based on its absolute path,
+    size and modification time.
+    """
+    stat = os.stat(path)
+    key = "{}:{}:{}".format(os.path.abspath(path), stat.st_size, stat.st_mtime)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def files_fingerprint(paths):
+    """
+    Same as file_fingerprint, for a list of files, e.g., one annotation file
+    per image. Unlike the modification time of their directory, it changes
+    when a file is edited in place.
+    """
+    key = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        key.update("{}:{}:{}\n".format(path, stat.st_size, stat.st_mtime).encode("utf-8"))
+    return key.hexdigest()[:16]
+
+
+def save_arrays(cache_dir, arrays):
+    """
+    Saves each array of the dict as cache_dir/<name>.npy
+    """
+    # write to a temporary directory and rename it, so that concurrent
+    # processes never see a partially written directory
+    parent = os.path.dirname(os.path.abspath(cache_dir))
+    if not os.path.exists(parent):
+        os.makedirs(parent)
+    tmp_dir = tempfile.mkdtemp(dir=parent)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, name + ".npy"), array)
+    try:
+        os.rename(tmp_dir, cache_dir)
+    except OSError:
+        # another process was faster
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def load_arrays(cache_dir, names):
+    """
+    Memory-maps the arrays saved by save_arrays
+    """
+    return {
+        name: np.load(os.path.join(cache_dir, name + ".npy"), mmap_mode="r")
+        for name in names
+    }
+
+
+class CocoAnnotationIndex(object):
+    """
+    Arrays:
+        image_ids (int64[I]): sorted image ids
+        image_sizes (int64[I, 2]): (width, height) of each image
+        file_names (str[I]): file name of each image
+        ann_offsets (int64[I + 1]): annotations of image i are in
+            [ann_offsets[i], ann_offsets[i + 1])
+        boxes (float32[A, 4]): boxes in xywh format
+        category_ids (int64[A]): json category id of each annotation
+        iscrowd (uint8[A])
+        ann_poly_offsets (int64[A + 1]): polygons of annotation j are in
+            [ann_poly_offsets[j], ann_poly_offsets[j + 1]). Crowd annotations
+            stored as RLE have no polygons
+        poly_offsets (int64[P + 1]): coordinates of polygon k are in
+            [poly_offsets[k], poly_offsets[k + 1])
+        poly_coords (float32[C]): x0, y0, x1, y1, ... of all the polygons
+        cat_ids (int64[K]): json category ids of the dataset, in the order
+            returned by `COCO.getCatIds`
+    """
+
+    ARRAYS = (
+        "image_ids",
+        "image_sizes",
+        "file_names",
+        "ann_offsets",
+        "boxes",
+        "category_ids",
+        "iscrowd",
+        "ann_poly_offsets",
+        "poly_offsets",
+        "poly_coords",
+        "cat_ids",
+    )
+
+    def __init__(self, **arrays):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    @classmethod
+    def from_coco(cls, coco):
+        image_ids = np.array(sorted(coco.imgs.keys()), dtype=np.int64)
+        image_sizes = np.zeros((len(image_ids), 2), dtype=np.int64)
+        file_names = []
+        ann_offsets = np.zeros(len(image_ids) + 1, dtype=np.int64)
+        boxes = []
+        category_ids = []
+        iscrowd = []
+        ann_poly_offsets = [0]
+        poly_offsets = [0]
+        poly_coords = []
+        for i, img_id in enumerate(image_ids.tolist()):
+            img_info = coco.imgs[img_id]
+            image_sizes[i] = (img_info["width"], img_info["height"])
+            file_names.append(img_info["file_name"])
+            anns = coco.imgToAnns.get(img_id, [])
+            ann_offsets[i + 1] = ann_offsets[i] + len(anns)
+            for ann in anns:
+                boxes.append(ann["bbox"])
+                category_ids.append(ann["category_id"])
+                iscrowd.append(ann["iscrowd"])
+                polygons = ann["segmentation"]
+                if not isinstance(polygons, list):
+                    polygons = []
+                for poly in polygons:
+                    poly_coords.extend(poly)
+                    poly_offsets.append(len(poly_coords))
+                ann_poly_offsets.append(len(poly_offsets) - 1)
+
+        return cls(
+            image_ids=image_ids,
+            image_sizes=image_sizes,
+            file_names=np.array(file_names, dtype=np.str_),
+            ann_offsets=ann_offsets,
+            boxes=np.array(boxes, dtype=np.float32).reshape(-1, 4),
+            category_ids=np.array(category_ids, dtype=np.int64),
+            iscrowd=np.array(iscrowd, dtype=np.uint8),
+            ann_poly_offsets=np.array(ann_poly_offsets, dtype=np.int64),
+            poly_offsets=np.array(poly_offsets, dtype=np.int64),
+            poly_coords=np.array(poly_coords, dtype=np.float32),
+            cat_ids=np.array(coco.getCatIds(), dtype=np.int64),
+        )
+
+    def save(self, cache_dir):
+        save_arrays(cache_dir, {name: getattr(self, name) for name in self.ARRAYS})
+
+    @classmethod
+    def load(cls, cache_dir):
+        return cls(**load_arrays(cache_dir, cls.ARRAYS))
+
+    @staticmethod
+    def cache_path(ann_file, cache_dir):
+        name = os.path.splitext(os.path.basename(ann_file))[0]
+        return os.path.join(
+            cache_dir, "{}-{}".format(name, file_fingerprint(ann_file))
+        )
+
+    @classmethod
+    def load_or_build(cls, ann_file, cache_dir, coco=None):
+        """
+        Loads the index of `ann_file` from `cache_dir`, building and saving
+        it first if needed. `coco` can be given to avoid parsing the json
+        file again when it has already been loaded.
+        """
+        path = cls.cache_path(ann_file, cache_dir)
+        if not os.path.exists(path):
+            if coco is None:
+                from pycocotools.coco import COCO
+
+                coco = COCO(ann_file)
+            cls.from_coco(coco).save(path)
+        return cls.load(path)
+
+    def get_row(self, image_id):
+        return int(np.searchsorted(self.image_ids, image_id))
+
+    def get_annotations(self, row):
+        """
+        Returns the boxes (xywh), json category ids, crowd flags and the
+        polygons of the annotations of the image in `row`, where the
+        polygons are a list (one entry per annotation) of lists of arrays.
+        """
+        start, end = self.ann_offsets[row], self.ann_offsets[row + 1]
+        ann_poly_offsets = self.ann_poly_offsets[start : end + 1]
+        poly_offsets = self.poly_offsets
+        polygons = []
+        for p_start, p_end in zip(ann_poly_offsets[:-1], ann_poly_offsets[1:]):
+            polygons.append([
+                np.array(self.poly_coords[poly_offsets[k] : poly_offsets[k + 1]])
+                for k in range(p_start, p_end)
+            ])
+        # copy the slices out of the (read-only) memory maps
+        return (
+            np.array(self.boxes[start:end]),
+            np.array(self.category_ids[start:end]),
+            np.array(self.iscrowd[start:end]),
+            polygons,
+        )
+
+    def image_rows_with_categories(self, cat_ids):
+        """
+        Returns the rows of the images that have an annotation whose
+        category id is in `cat_ids`
+        """
+        has_cat = np.isin(self.category_ids, np.asarray(list(cat_ids)))
+        ann_rows = np.repeat(np.arange(len(self)), np.diff(self.ann_offsets))
+        return np.unique(ann_rows[has_cat])
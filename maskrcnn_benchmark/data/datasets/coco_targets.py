@@ -0,0 +1,149 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Targets of the images of a COCO dataset, compiled once from the annotation
+index.
+
+COCODataset builds the target of an image by removing the crowd
+annotations, converting the boxes to xyxy, clipping them to the image and
+removing the empty ones. This is done here for all the images at once, with
+the same float32 arithmetic, and the result is saved next to the index, so
+that building a target only slices a few memory-mapped arrays.
+"""
+import os
+
+import numpy as np
+import torch
+
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.segmentation_mask import SegmentationMask
+from maskrcnn_benchmark.structures.segmentation_mask import index_ranges
+from maskrcnn_benchmark.structures.segmentation_mask import lengths_to_offsets
+
+from .coco_annotation_index import load_arrays
+from .coco_annotation_index import save_arrays
+
+
+class CocoTargets(object):
+    """
+    Arrays:
+        target_offsets (int64[I + 1]): the objects of the target of image i
+            are in [target_offsets[i], target_offsets[i + 1])
+        boxes (float32[T, 4]): clipped boxes in xyxy format
+        category_ids (int64[T]): json category id of each object
+        instance_offsets (int64[T + 1]): polygons of object j are in
+            [instance_offsets[j], instance_offsets[j + 1])
+        poly_offsets (int64[P + 1]): coordinates of polygon k are in
+            [poly_offsets[k], poly_offsets[k + 1])
+        coords (float32[C]): x0, y0, x1, y1, ... of all the polygons
+    """
+
+    ARRAYS = (
+        "target_offsets",
+        "boxes",
+        "category_ids",
+        "instance_offsets",
+        "poly_offsets",
+        "coords",
+    )
+
+    def __init__(self, **arrays):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def from_index(cls, index):
+        """
+        Compiles the targets of the images of a CocoAnnotationIndex, in the
+        frame of the image sizes of the index
+        """
+        ann_offsets = np.asarray(index.ann_offsets)
+        ann_rows = np.repeat(np.arange(len(index)), np.diff(ann_offsets))
+        image_sizes = np.asarray(index.image_sizes)
+
+        # same as BoxList.convert("xyxy") and clip_to_image in float32
+        TO_REMOVE = np.float32(1)
+        x, y, w, h = np.asarray(index.boxes, dtype=np.float32).reshape(-1, 4).T
+        zero = np.float32(0)
+        max_x = (image_sizes[ann_rows, 0] - 1).astype(np.float32)
+        max_y = (image_sizes[ann_rows, 1] - 1).astype(np.float32)
+        boxes = np.stack(
+            [
+                np.clip(x, zero, max_x),
+                np.clip(y, zero, max_y),
+                np.clip(x + np.maximum(w - TO_REMOVE, zero), zero, max_x),
+                np.clip(y + np.maximum(h - TO_REMOVE, zero), zero, max_y),
+            ],
+            axis=1,
+        )
+        keep = (
+            (np.asarray(index.iscrowd) == 0)
+            & (boxes[:, 3] > boxes[:, 1])
+            & (boxes[:, 2] > boxes[:, 0])
+        )
+        kept = np.flatnonzero(keep)
+
+        # the polygons of the kept annotations
+        ann_poly_offsets = torch.from_numpy(np.array(index.ann_poly_offsets))
+        kept_inds = torch.from_numpy(kept)
+        num_polys = ann_poly_offsets[kept_inds + 1] - ann_poly_offsets[kept_inds]
+        poly_ids = index_ranges(ann_poly_offsets[kept_inds], num_polys)
+        poly_offsets = torch.from_numpy(np.array(index.poly_offsets))
+        poly_lengths = poly_offsets[poly_ids + 1] - poly_offsets[poly_ids]
+        coord_ids = index_ranges(poly_offsets[poly_ids], poly_lengths)
+        num_targets = torch.from_numpy(np.bincount(ann_rows[kept], minlength=len(index)))
+
+        return cls(
+            target_offsets=lengths_to_offsets(num_targets).numpy(),
+            boxes=boxes[kept],
+            category_ids=np.asarray(index.category_ids)[kept],
+            instance_offsets=lengths_to_offsets(num_polys).numpy(),
+            poly_offsets=lengths_to_offsets(poly_lengths).numpy(),
+            coords=np.asarray(index.poly_coords)[coord_ids.numpy()],
+        )
+
+    def save(self, cache_dir):
+        save_arrays(cache_dir, {name: getattr(self, name) for name in self.ARRAYS})
+
+    @classmethod
+    def load(cls, cache_dir):
+        return cls(**load_arrays(cache_dir, cls.ARRAYS))
+
+    @classmethod
+    def load_or_compile(cls, index, cache_dir):
+        """
+        cache_dir is the directory of the index (see
+        CocoAnnotationIndex.cache_path), the targets are saved next to it
+        """
+        path = cache_dir.rstrip(os.sep) + "-targets"
+        if not os.path.exists(path):
+            cls.from_index(index).save(path)
+        return cls.load(path)
+
+    def get_target(self, row, size, category_lut=None):
+        """
+        Returns the target of the image in `row` as a BoxList with the
+        "labels" and "masks" fields. The labels are the json category ids,
+        mapped through category_lut if given.
+        """
+        start, end = self.target_offsets[row], self.target_offsets[row + 1]
+        # copy the slices out of the (read-only) memory maps
+        boxes = torch.from_numpy(np.array(self.boxes[start:end]))
+        target = BoxList(boxes, size, mode="xyxy")
+
+        labels = np.array(self.category_ids[start:end])
+        if category_lut is not None:
+            labels = category_lut[labels]
+        target.add_field("labels", torch.from_numpy(labels))
+
+        instance_offsets = np.array(self.instance_offsets[start : end + 1])
+        poly_start, poly_end = instance_offsets[0], instance_offsets[-1]
+        poly_offsets = np.array(self.poly_offsets[poly_start : poly_end + 1])
+        coord_start, coord_end = poly_offsets[0], poly_offsets[-1]
+        masks = SegmentationMask.from_packed(
+            torch.from_numpy(np.array(self.coords[coord_start:coord_end])),
+            torch.from_numpy(poly_offsets - coord_start),
+            torch.from_numpy(instance_offsets - poly_start),
+            size,
+        )
+        target.add_field("masks", masks)
+        return target
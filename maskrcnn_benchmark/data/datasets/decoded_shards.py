@@ -0,0 +1,130 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Pre-decoded image shards.
+
+Images are decoded once (and optionally resized to the training resolution)
+and their raw uint8 HWC pixels are appended to large shard files. A small
+index maps every image id to its shard, byte offset and shape, so that a
+sample can be served as a view over a memory-mapped shard instead of
+going through a JPEG decode.
+"""
+import os
+
+import numpy as np
+from torchvision.transforms import functional as F
+
+# columns of the index array
+_SHARD, _OFFSET, _HEIGHT, _WIDTH, _ORIG_HEIGHT, _ORIG_WIDTH = range(6)
+
+
+class DecodedImageShards(object):
+    """
+    Read-only access to the shards written by `write_decoded_shards`.
+
+    The shard files are memory-mapped lazily in each process, so an instance
+    can be safely created before the DataLoader workers are forked.
+    """
+
+    INDEX_FILE = "index.npy"
+    IDS_FILE = "image_ids.npy"
+    SHARD_FILE = "shard_{:05d}.bin"
+
+    def __init__(self, shard_dir):
+        self.shard_dir = shard_dir
+        self.index = np.load(os.path.join(shard_dir, self.INDEX_FILE))
+        image_ids = np.load(os.path.join(shard_dir, self.IDS_FILE))
+        self.id_to_row = {int(img_id): row for row, img_id in enumerate(image_ids)}
+        self._shards = {}
+
+    def __len__(self):
+        return len(self.id_to_row)
+
+    def __contains__(self, image_id):
+        return image_id in self.id_to_row
+
+    def __getstate__(self):
+        # memory maps are re-opened on demand by each worker
+        state = self.__dict__.copy()
+        state["_shards"] = {}
+        return state
+
+    def _get_shard(self, shard_id):
+        shard = self._shards.get(shard_id)
+        if shard is None:
+            path = os.path.join(self.shard_dir, self.SHARD_FILE.format(shard_id))
+            shard = np.memmap(path, dtype=np.uint8, mode="r")
+            self._shards[shard_id] = shard
+        return shard
+
+    def get(self, image_id):
+        """
+        Returns the decoded image as a read-only (height, width, 3) uint8
+        array backed by the page cache. No copy is made.
+        """
+        shard_id, offset, height, width = self.index[self.id_to_row[image_id], :4]
+        shard = self._get_shard(int(shard_id))
+        num_bytes = int(height) * int(width) * 3
+        data = shard[int(offset) : int(offset) + num_bytes]
+        return data.reshape(int(height), int(width), 3)
+
+    def original_size(self, image_id):
+        """
+        Returns the (width, height) of the image before it was resized,
+        which is the coordinate frame of the annotations.
+        """
+        row = self.index[self.id_to_row[image_id]]
+        return int(row[_ORIG_WIDTH]), int(row[_ORIG_HEIGHT])
+
+
+def write_decoded_shards(
+    output_dir, image_ids, load_image, resize=None, max_shard_bytes=1 << 30
+):
+    """
+    Decodes every image and packs the raw pixels into shard files.
+
+    Arguments:
+        output_dir (str): directory where the shards and index are written
+        image_ids (list[int]): ids of the images to compile
+        load_image (callable): returns a RGB PIL image given an image id
+        resize (Resize, optional): if given, images are stored at the size
+            returned by `resize.get_size`, i.e. the size they would have
+            after the training resize transform
+        max_shard_bytes (int): a new shard is started once the current one
+            would grow beyond this size
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    index = np.zeros((len(image_ids), 6), dtype=np.int64)
+    shard_id = 0
+    offset = 0
+    shard_file = os.path.join(output_dir, DecodedImageShards.SHARD_FILE)
+    shard = open(shard_file.format(shard_id), "wb")
+    try:
+        for row, img_id in enumerate(image_ids):
+            img = load_image(img_id)
+            orig_width, orig_height = img.size
+            if resize is not None:
+                img = F.resize(img, resize.get_size(img.size))
+            data = np.ascontiguousarray(np.asarray(img, dtype=np.uint8))
+            height, width = data.shape[:2]
+
+            if offset > 0 and offset + data.nbytes > max_shard_bytes:
+                shard.close()
+                shard_id += 1
+                offset = 0
+                shard = open(shard_file.format(shard_id), "wb")
+            shard.write(data.tobytes())
+            index[row] = (shard_id, offset, height, width, orig_height, orig_width)
+            offset += data.nbytes
+    finally:
+        shard.close()
+
+    np.save(
+        os.path.join(output_dir, DecodedImageShards.IDS_FILE),
+        np.asarray(image_ids, dtype=np.int64),
+    )
+    # the index is written last, so that an interrupted compilation is not
+    # mistaken for a complete one
+    np.save(os.path.join(output_dir, DecodedImageShards.INDEX_FILE), index)
+    return index
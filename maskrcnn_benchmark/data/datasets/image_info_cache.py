@@ -0,0 +1,69 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Per-image (height, width, number of annotations) table of a dataset, used
+to group the images by aspect ratio when building the batch sampler.
+
+Computing the table needs a `get_img_info` call per image, which parses an
+xml file per image for Pascal VOC, so it is cached as a .npy sidecar file
+keyed by `dataset.get_cache_key()`, which changes with the annotations.
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from .concat_dataset import ConcatDataset
+
+
+def compute_image_info(dataset):
+    """
+    Returns an int64[N, 3] array with the height, width and number of
+    annotations (-1 if unknown) of each image of the dataset
+    """
+    get_num_annotations = getattr(dataset, "get_num_annotations", None)
+    image_info = np.zeros((len(dataset), 3), dtype=np.int64)
+    for i in range(len(dataset)):
+        img_info = dataset.get_img_info(i)
+        num_annotations = get_num_annotations(i) if get_num_annotations else -1
+        image_info[i] = (img_info["height"], img_info["width"], num_annotations)
+    return image_info
+
+
+def _save(path, array):
+    # write to a temporary file and rename it, so that concurrent
+    # processes never see a partially written table
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npy")
+    with os.fdopen(fd, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def load_or_compute_image_info(dataset, cache_dir=""):
+    """
+    Same as `compute_image_info`, but loads the table from `cache_dir` if
+    it was already computed, and saves it there otherwise. Datasets without
+    a `get_cache_key` method are not cached.
+    """
+    if isinstance(dataset, ConcatDataset):
+        return np.concatenate(
+            [load_or_compute_image_info(d, cache_dir) for d in dataset.datasets]
+        ).reshape(-1, 3)
+
+    get_cache_key = getattr(dataset, "get_cache_key", None)
+    if not cache_dir or get_cache_key is None:
+        return compute_image_info(dataset)
+
+    path = os.path.join(
+        cache_dir,
+        "image_info-{}-{}.npy".format(type(dataset).__name__, get_cache_key()),
+    )
+    if os.path.exists(path):
+        image_info = np.load(path)
+        if len(image_info) == len(dataset):
+            return image_info
+
+    image_info = compute_image_info(dataset)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    _save(path, image_info)
+    return image_info
@@ -2,23 +2,37 @@
 """
 Simple dataset class that wraps a list of path names
 """
-
-from PIL import Image
-
+from maskrcnn_benchmark.data.image_io import find_resize_transform
+from maskrcnn_benchmark.data.image_io import load_image
+from maskrcnn_benchmark.data.image_io import read_image_sizes
 from maskrcnn_benchmark.structures.bounding_box import BoxList
 
+from .coco_annotation_index import files_fingerprint
+
 
 class ListDataset(object):
-    def __init__(self, image_lists, transforms=None):
+    def __init__(self, image_lists, transforms=None, draft_decoding=False):
         self.image_lists = image_lists
         self.transforms = transforms
+        # decode large JPEG images at a reduced scale, see load_image
+        self.draft_decoding = draft_decoding
+        self._image_sizes = None
+        # encoded image files shared by the workers, see SharedImageCache
+        self.image_cache = None
 
     def __getitem__(self, item):
-        img = Image.open(self.image_lists[item]).convert("RGB")
+        resize = None
+        if self.draft_decoding:
+            resize = find_resize_transform(self.transforms)
+        path = self.get_image_path(item)
+        if self.image_cache is not None:
+            path = self.image_cache.open(item, path)
+        img, (w, h) = load_image(path, resize)
 
         # dummy target
-        w, h = img.size
-        target = BoxList([[0, 0, w, h]], img.size, mode="xyxy")
+        target = BoxList([[0, 0, w, h]], (w, h), mode="xyxy")
+        if img.size != (w, h):
+            target = target.resize(img.size)
 
         if self.transforms is not None:
             img, target = self.transforms(img, target)
@@ -28,9 +42,28 @@ class ListDataset(object):
     def __len__(self):
         return len(self.image_lists)
 
+    def get_image_path(self, item):
+        return self.image_lists[item]
+
     def get_img_info(self, item):
         """
         Return the image dimensions for the image, without
         loading and pre-processing it
         """
-        pass
+        if self._image_sizes is None:
+            # read the headers of all the images at once, in parallel, as
+            # the sizes of all the images are needed to group them. They are
+            # persisted with the image info cache (see get_cache_key)
+            self._image_sizes = read_image_sizes(self.image_lists)
+        width, height = self._image_sizes[item]
+        return {"height": height, "width": width}
+
+    def get_num_annotations(self, item):
+        # the dummy target has a single box
+        return 1
+
+    def get_cache_key(self):
+        """
+        Identifies the image files, which change when one is replaced
+        """
+        return files_fingerprint(self.image_lists)
@@ -0,0 +1,324 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Samples packed in tar shards, and streamed sequentially during training.
+
+Each sample is stored as two consecutive members of a shard: "<key>.json",
+with the size and the target of the image, followed by the encoded image
+file as it was on disk. Reading a shard is a single sequential read instead
+of a random access per image, which is what network storage is good at.
+An index file lists the shards with their number of samples, and is written
+last, so that an interrupted conversion is not mistaken for a complete one.
+"""
+import io
+import json
+import os
+import tarfile
+import time
+
+import numpy as np
+import torch
+import torch.utils.data
+
+from maskrcnn_benchmark.data.image_io import find_resize_transform
+from maskrcnn_benchmark.data.image_io import load_image
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.segmentation_mask import SegmentationMask
+
+INDEX_FILE = "index.json"
+SHARD_FILE = "shard_{:05d}.tar"
+
+
+def _is_portrait(height, width):
+    # same groups as aspect ratio grouping with the [1] bin
+    return height >= width
+
+
+def target_to_record(target, index):
+    """
+    Serializes a target (in xyxy mode) and its tensor and mask fields to a
+    json-compatible dict
+    """
+    width, height = target.size
+    record = {
+        "index": index,
+        "width": width,
+        "height": height,
+        "boxes": target.convert("xyxy").bbox.tolist(),
+        "fields": {},
+    }
+    for name in target.fields():
+        field = target.get_field(name)
+        if isinstance(field, SegmentationMask):
+            record["masks"] = {
+                "name": name,
+                "coords": field.coords.tolist(),
+                "poly_offsets": field.poly_offsets.tolist(),
+                "instance_offsets": field.instance_offsets.tolist(),
+            }
+        elif isinstance(field, torch.Tensor):
+            record["fields"][name] = {
+                "dtype": field.numpy().dtype.str,
+                "shape": list(field.shape),
+                "data": field.tolist(),
+            }
+    return record
+
+
+def record_to_target(record):
+    size = (record["width"], record["height"])
+    boxes = torch.tensor(record["boxes"], dtype=torch.float32).reshape(-1, 4)
+    target = BoxList(boxes, size, mode="xyxy")
+    for name, field in record["fields"].items():
+        data = np.array(field["data"], dtype=np.dtype(field["dtype"]))
+        target.add_field(name, torch.from_numpy(data.reshape(field["shape"])))
+    masks = record.get("masks")
+    if masks is not None:
+        masks = SegmentationMask.from_packed(
+            torch.tensor(masks["coords"], dtype=torch.float32),
+            torch.tensor(masks["poly_offsets"], dtype=torch.int64),
+            torch.tensor(masks["instance_offsets"], dtype=torch.int64),
+            size,
+        )
+        target.add_field(record["masks"]["name"], masks)
+    return target
+
+
+def _add_member(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = time.time()
+    tar.addfile(info, io.BytesIO(data))
+
+
+def write_tar_shards(output_dir, samples, samples_per_shard=1000):
+    """
+    Packs samples into tar shards.
+
+    Arguments:
+        output_dir (str): directory where the shards and index are written
+        samples (iterable[tuple[int, str, BoxList]]): index in the dataset,
+            path of the image file, and target of each sample
+        samples_per_shard (int): a new shard is started every
+            samples_per_shard samples. Training processes stream distinct
+            shards, so there should be more shards than data loading
+            processes
+
+    Returns:
+        shards (list[dict]): the file, number of samples and number of
+            portrait images of each shard
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    shards = []
+    tar = None
+    try:
+        for index, path, target in samples:
+            if tar is None or shards[-1]["num_samples"] == samples_per_shard:
+                if tar is not None:
+                    tar.close()
+                shards.append(
+                    {
+                        "file": SHARD_FILE.format(len(shards)),
+                        "num_samples": 0,
+                        "num_portrait": 0,
+                    }
+                )
+                tar = tarfile.open(os.path.join(output_dir, shards[-1]["file"]), "w")
+            record = target_to_record(target, index)
+            key = "{:09d}".format(index)
+            _add_member(tar, key + ".json", json.dumps(record).encode("utf-8"))
+            with open(path, "rb") as f:
+                _add_member(tar, key + os.path.splitext(path)[1].lower(), f.read())
+            shards[-1]["num_samples"] += 1
+            shards[-1]["num_portrait"] += int(
+                _is_portrait(record["height"], record["width"])
+            )
+    finally:
+        if tar is not None:
+            tar.close()
+
+    with open(os.path.join(output_dir, INDEX_FILE), "w") as f:
+        json.dump({"shards": shards}, f)
+    return shards
+
+
+def iter_tar_shard(path):
+    """
+    Yields the (record, encoded image) of the samples of a shard, in order,
+    reading the file sequentially
+    """
+    with tarfile.open(path, "r|") as tar:
+        key, record, image_data = None, None, None
+        for member in tar:
+            if not member.isfile():
+                continue
+            member_key, ext = os.path.splitext(member.name)
+            if member_key != key:
+                key, record, image_data = member_key, None, None
+            data = tar.extractfile(member).read()
+            if ext == ".json":
+                record = json.loads(data.decode("utf-8"))
+            else:
+                image_data = data
+            if record is not None and image_data is not None:
+                yield record, image_data
+                key, record, image_data = None, None, None
+
+
+class TarShardDataset(torch.utils.data.IterableDataset):
+    """
+    Streams batches of training samples from the tar shards written by
+    write_tar_shards, for num_iterations iterations like
+    IterationBasedBatchSampler.
+
+    Every epoch, the shards are shuffled, and each data loading process
+    (over all the ranks) reads a distinct subset of them. The samples it
+    reads are shuffled with a buffer of shuffle_buffer_size samples, and
+    grouped into batches of batch_size images of the same orientation if
+    aspect_grouping is set. Only the samples of the returned batches are
+    decoded.
+
+    The batches are yielded already batched (use batch_size=None in the
+    DataLoader), so that the DataLoader, which takes a batch from each worker
+    in turn, always returns iteration i from the same stream. Given the
+    same seed, number of ranks and of workers, resuming at start_iter
+    returns the same batches as an uninterrupted run, and the epochs before
+    it are skipped without reading them.
+    """
+
+    def __init__(
+        self, shard_dirs, batch_size, num_iterations, start_iter=0, transforms=None,
+        aspect_grouping=True, shuffle_buffer_size=1000, seed=0, rank=0,
+        world_size=1, draft_decoding=False
+    ):
+        self.shards = []
+        for shard_dir in shard_dirs:
+            with open(os.path.join(shard_dir, INDEX_FILE)) as f:
+                for shard in json.load(f)["shards"]:
+                    shard = dict(shard, file=os.path.join(shard_dir, shard["file"]))
+                    self.shards.append(shard)
+        self.batch_size = batch_size
+        self.num_iterations = num_iterations
+        self.start_iter = start_iter
+        self.transforms = transforms
+        self.aspect_grouping = aspect_grouping
+        self.shuffle_buffer_size = shuffle_buffer_size
+        self.seed = seed
+        self.rank = rank
+        self.world_size = world_size
+        # decode large JPEG images at a reduced scale, see load_image
+        self.draft_decoding = draft_decoding
+
+    def __len__(self):
+        return self.num_iterations
+
+    def _get_shards(self, epoch, stream, num_streams):
+        # all the processes agree on the order of the shards of an epoch
+        order = np.random.RandomState([self.seed, epoch]).permutation(len(self.shards))
+        return [self.shards[i] for i in order[stream::num_streams]]
+
+    def _num_batches(self, shards):
+        num_samples = sum(shard["num_samples"] for shard in shards)
+        if not self.aspect_grouping:
+            return -(-num_samples // self.batch_size)
+        num_portrait = sum(shard["num_portrait"] for shard in shards)
+        num_landscape = num_samples - num_portrait
+        return -(-num_portrait // self.batch_size) - (-num_landscape // self.batch_size)
+
+    def _iter_samples(self, shards, rng):
+        buffer = []
+        for shard in shards:
+            for sample in iter_tar_shard(shard["file"]):
+                if self.shuffle_buffer_size <= 1:
+                    yield sample
+                    continue
+                if len(buffer) < self.shuffle_buffer_size:
+                    buffer.append(sample)
+                    continue
+                i = rng.randint(len(buffer))
+                sample, buffer[i] = buffer[i], sample
+                yield sample
+        rng.shuffle(buffer)
+        for sample in buffer:
+            yield sample
+
+    def _iter_batches(self, shards, rng):
+        """
+        Batches of undecoded samples of an epoch. The incomplete batches are
+        returned at the end, as with GroupedBatchSampler, so that the number
+        of batches only depends on the shards
+        """
+        pending = {}
+        for sample in self._iter_samples(shards, rng):
+            group = 0
+            if self.aspect_grouping:
+                group = int(_is_portrait(sample[0]["height"], sample[0]["width"]))
+            batch = pending.setdefault(group, [])
+            batch.append(sample)
+            if len(batch) == self.batch_size:
+                yield pending.pop(group)
+        for group in sorted(pending):
+            yield pending[group]
+
+    def _decode(self, record, image_data):
+        resize = None
+        if self.draft_decoding:
+            resize = find_resize_transform(self.transforms)
+        img, _ = load_image(io.BytesIO(image_data), resize)
+        target = record_to_target(record)
+        target = target.clip_to_image(remove_empty=True)
+        if img.size != target.size:
+            target = target.resize(img.size)
+        if self.transforms is not None:
+            img, target = self.transforms(img, target)
+        return img, target, record["index"]
+
+    def __iter__(self):
+        worker_info = torch.utils.data.get_worker_info()
+        worker_id, num_workers = 0, 1
+        if worker_info is not None:
+            worker_id, num_workers = worker_info.id, worker_info.num_workers
+        # the DataLoader starts with its first worker: shift the workers so
+        # that iteration i always comes from stream i % num_workers
+        stream = (worker_id + self.start_iter) % num_workers
+        num_streams = self.world_size * num_workers
+        if len(self.shards) < num_streams:
+            raise ValueError(
+                "{} tar shards for {} data loading processes, convert the "
+                "datasets with fewer samples per shard".format(
+                    len(self.shards), num_streams
+                )
+            )
+
+        def num_iterations_before(iteration):
+            return (iteration - stream + num_workers - 1) // num_workers
+
+        to_skip = num_iterations_before(self.start_iter)
+        to_yield = num_iterations_before(self.num_iterations) - to_skip
+        global_stream = self.rank * num_workers + stream
+
+        # skip the epochs before start_iter without reading them
+        epoch = 0
+        while True:
+            shards = self._get_shards(epoch, global_stream, num_streams)
+            num_batches = self._num_batches(shards)
+            if num_batches > to_skip:
+                break
+            if num_batches == 0:
+                raise ValueError("empty tar shards")
+            to_skip -= num_batches
+            epoch += 1
+
+        while to_yield > 0:
+            rng = np.random.RandomState([self.seed, epoch, global_stream])
+            shards = self._get_shards(epoch, global_stream, num_streams)
+            for batch in self._iter_batches(shards, rng):
+                if to_skip > 0:
+                    to_skip -= 1
+                    continue
+                yield [self._decode(record, data) for record, data in batch]
+                to_yield -= 1
+                if to_yield == 0:
+                    return
+            epoch += 1
@@ -1,18 +1,18 @@
+import hashlib
+import multiprocessing
 import os
 
 import torch
 import torch.utils.data
-from PIL import Image
-import sys
-
-if sys.version_info[0] == 2:
-    import xml.etree.cElementTree as ET
-else:
-    import xml.etree.ElementTree as ET
-
 
+from maskrcnn_benchmark.data.image_io import find_resize_transform
+from maskrcnn_benchmark.data.image_io import load_image
 from maskrcnn_benchmark.structures.bounding_box import BoxList
 
+from .coco_annotation_index import file_fingerprint
+from .coco_annotation_index import files_fingerprint
+from .voc_annotation_index import VocAnnotationIndex
+
 
 class PascalVOCDataset(torch.utils.data.Dataset):
 
@@ -40,11 +40,18 @@ class PascalVOCDataset(torch.utils.data.Dataset):
         "tvmonitor",
     )
 
-    def __init__(self, data_dir, split, use_difficult=False, transforms=None):
+    def __init__(
+        self, data_dir, split, use_difficult=False, transforms=None, ann_cache_dir=None,
+        draft_decoding=False
+    ):
         self.root = data_dir
         self.image_set = split
         self.keep_difficult = use_difficult
         self.transforms = transforms
+        # decode large JPEG images at a reduced scale, see load_image
+        self.draft_decoding = draft_decoding
+        # encoded image files shared by the workers, see SharedImageCache
+        self.image_cache = None
 
         self._annopath = os.path.join(self.root, "Annotations", "%s.xml")
         self._imgpath = os.path.join(self.root, "JPEGImages", "%s.jpg")
@@ -58,12 +65,40 @@ class PascalVOCDataset(torch.utils.data.Dataset):
         cls = PascalVOCDataset.CLASSES
         self.class_to_ind = dict(zip(cls, range(len(cls))))
 
+        # parse all the annotations once, in parallel, and serve the targets
+        # and image sizes from the packed arrays
+        self.ann_index = self._load_annotation_index(ann_cache_dir)
+
+    def _load_annotation_index(self, ann_cache_dir):
+        paths = [self._annopath % img_id for img_id in self.ids]
+        num_workers = min(8, multiprocessing.cpu_count())
+        if not ann_cache_dir:
+            return VocAnnotationIndex.from_xml_files(
+                paths, self.class_to_ind, num_workers
+            )
+        path = VocAnnotationIndex.cache_path(
+            self._imgsetpath % self.image_set, paths, self.ids, ann_cache_dir
+        )
+        if not os.path.exists(path):
+            VocAnnotationIndex.from_xml_files(
+                paths, self.class_to_ind, num_workers
+            ).save(path)
+        return VocAnnotationIndex.load(path)
+
     def __getitem__(self, index):
-        img_id = self.ids[index]
-        img = Image.open(self._imgpath % img_id).convert("RGB")
+        resize = None
+        if self.draft_decoding:
+            resize = find_resize_transform(self.transforms)
+        path = self.get_image_path(index)
+        if self.image_cache is not None:
+            path = self.image_cache.open(index, path)
+        img, original_size = load_image(path, resize)
 
         target = self.get_groundtruth(index)
         target = target.clip_to_image(remove_empty=True)
+        # draft decoded images are smaller than the annotated image
+        if img.size != original_size:
+            target = target.resize(img.size)
 
         if self.transforms is not None:
             img, target = self.transforms(img, target)
@@ -73,62 +108,40 @@ class PascalVOCDataset(torch.utils.data.Dataset):
     def __len__(self):
         return len(self.ids)
 
+    def get_image_path(self, index):
+        return self._imgpath % self.ids[index]
+
     def get_groundtruth(self, index):
-        img_id = self.ids[index]
-        anno = ET.parse(self._annopath % img_id).getroot()
-        anno = self._preprocess_annotation(anno)
-
-        height, width = anno["im_info"]
-        target = BoxList(anno["boxes"], (width, height), mode="xyxy")
-        target.add_field("labels", anno["labels"])
-        target.add_field("difficult", anno["difficult"])
+        boxes, labels, difficult = self.ann_index.get_annotations(
+            index, self.keep_difficult
+        )
+        height, width = self.ann_index.image_sizes[index].tolist()
+        target = BoxList(torch.from_numpy(boxes), (width, height), mode="xyxy")
+        target.add_field("labels", torch.from_numpy(labels))
+        target.add_field("difficult", torch.from_numpy(difficult))
         return target
 
-    def _preprocess_annotation(self, target):
-        boxes = []
-        gt_classes = []
-        difficult_boxes = []
-        TO_REMOVE = 1
-        
-        for obj in target.iter("object"):
-            difficult = int(obj.find("difficult").text) == 1
-            if not self.keep_difficult and difficult:
-                continue
-            name = obj.find("name").text.lower().strip()
-            bb = obj.find("bndbox")
-            # Make pixel indexes 0-based
-            # Refer to "https://github.com/rbgirshick/py-faster-rcnn/blob/master/lib/datasets/pascal_voc.py#L208-L211"
-            box = [
-                bb.find("xmin").text, 
-                bb.find("ymin").text, 
-                bb.find("xmax").text, 
-                bb.find("ymax").text,
-            ]
-            bndbox = tuple(
-                map(lambda x: x - TO_REMOVE, list(map(int, box)))
-            )
-
-            boxes.append(bndbox)
-            gt_classes.append(self.class_to_ind[name])
-            difficult_boxes.append(difficult)
-
-        size = target.find("size")
-        im_info = tuple(map(int, (size.find("height").text, size.find("width").text)))
-
-        res = {
-            "boxes": torch.tensor(boxes, dtype=torch.float32),
-            "labels": torch.tensor(gt_classes),
-            "difficult": torch.tensor(difficult_boxes),
-            "im_info": im_info,
-        }
-        return res
-
     def get_img_info(self, index):
-        img_id = self.ids[index]
-        anno = ET.parse(self._annopath % img_id).getroot()
-        size = anno.find("size")
-        im_info = tuple(map(int, (size.find("height").text, size.find("width").text)))
-        return {"height": im_info[0], "width": im_info[1]}
+        height, width = self.ann_index.image_sizes[index].tolist()
+        return {"height": height, "width": width}
+
+    def get_num_annotations(self, index):
+        start, end = self.ann_index.ann_offsets[index : index + 2]
+        if self.keep_difficult:
+            return int(end - start)
+        return int((self.ann_index.difficult[start:end] == 0).sum())
+
+    def get_cache_key(self):
+        """
+        Identifies the image set, the annotations and whether difficult
+        objects are kept
+        """
+        ann_files = [self._annopath % img_id for img_id in self.ids]
+        key = hashlib.sha1("\n".join(self.ids).encode("utf-8"))
+        key.update(file_fingerprint(self._imgsetpath % self.image_set).encode("utf-8"))
+        key.update(files_fingerprint(ann_files).encode("utf-8"))
+        key.update(str(self.keep_difficult).encode("utf-8"))
+        return key.hexdigest()[:16]
 
     def map_class_id_to_class_name(self, class_id):
         return PascalVOCDataset.CLASSES[class_id]
@@ -0,0 +1,136 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Packed annotations of a Pascal VOC image set.
+
+The xml file of every image is parsed once (in parallel), and the objects
+are flattened into a few arrays plus per-image offsets, which can be saved
+as .npy files and memory-mapped, like CocoAnnotationIndex.
+"""
+import hashlib
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+
+if sys.version_info[0] == 2:
+    import xml.etree.cElementTree as ET
+else:
+    import xml.etree.ElementTree as ET
+
+from .coco_annotation_index import file_fingerprint
+from .coco_annotation_index import files_fingerprint
+from .coco_annotation_index import load_arrays
+from .coco_annotation_index import save_arrays
+
+
+def parse_voc_annotation(path):
+    """
+    Returns the (height, width) of the image and a list with the class name,
+    0-based (xmin, ymin, xmax, ymax) box and difficult flag of each object
+    """
+    anno = ET.parse(path).getroot()
+    objects = []
+    TO_REMOVE = 1
+    for obj in anno.iter("object"):
+        difficult = int(obj.find("difficult").text) == 1
+        name = obj.find("name").text.lower().strip()
+        bb = obj.find("bndbox")
+        # Make pixel indexes 0-based
+        box = [
+            int(bb.find(k).text) - TO_REMOVE for k in ("xmin", "ymin", "xmax", "ymax")
+        ]
+        objects.append((name, box, difficult))
+    size = anno.find("size")
+    im_info = tuple(map(int, (size.find("height").text, size.find("width").text)))
+    return im_info, objects
+
+
+class VocAnnotationIndex(object):
+    """
+    Arrays:
+        image_sizes (int64[I, 2]): (height, width) of each image
+        ann_offsets (int64[I + 1]): objects of image i are in
+            [ann_offsets[i], ann_offsets[i + 1])
+        boxes (float32[A, 4]): 0-based boxes in xyxy format
+        labels (int64[A]): class index of each object
+        difficult (uint8[A]): difficult flag of each object
+    """
+
+    ARRAYS = ("image_sizes", "ann_offsets", "boxes", "labels", "difficult")
+
+    def __init__(self, **arrays):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+    def __len__(self):
+        return len(self.image_sizes)
+
+    @classmethod
+    def from_xml_files(cls, paths, class_to_ind, num_workers=0):
+        """
+        Parses the xml files, with a pool of num_workers processes if > 1
+        """
+        if num_workers > 1:
+            pool = multiprocessing.Pool(num_workers)
+            try:
+                annotations = pool.map(parse_voc_annotation, paths, chunksize=64)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            annotations = [parse_voc_annotation(p) for p in paths]
+
+        image_sizes = np.zeros((len(paths), 2), dtype=np.int64)
+        ann_offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+        boxes = []
+        labels = []
+        difficult = []
+        for i, (im_info, objects) in enumerate(annotations):
+            image_sizes[i] = im_info
+            ann_offsets[i + 1] = ann_offsets[i] + len(objects)
+            for name, box, is_difficult in objects:
+                boxes.append(box)
+                labels.append(class_to_ind[name])
+                difficult.append(is_difficult)
+
+        return cls(
+            image_sizes=image_sizes,
+            ann_offsets=ann_offsets,
+            boxes=np.array(boxes, dtype=np.float32).reshape(-1, 4),
+            labels=np.array(labels, dtype=np.int64),
+            difficult=np.array(difficult, dtype=np.uint8),
+        )
+
+    def save(self, cache_dir):
+        save_arrays(cache_dir, {name: getattr(self, name) for name in self.ARRAYS})
+
+    @classmethod
+    def load(cls, cache_dir):
+        return cls(**load_arrays(cache_dir, cls.ARRAYS))
+
+    @staticmethod
+    def cache_path(imageset_file, ann_files, ids, cache_dir):
+        """
+        The index changes with the image set, and with the annotation file
+        of each image
+        """
+        key = hashlib.sha1("\n".join(ids).encode("utf-8"))
+        key.update(file_fingerprint(imageset_file).encode("utf-8"))
+        key.update(files_fingerprint(ann_files).encode("utf-8"))
+        name = os.path.splitext(os.path.basename(imageset_file))[0]
+        return os.path.join(cache_dir, "voc-{}-{}".format(name, key.hexdigest()[:16]))
+
+    def get_annotations(self, row, keep_difficult=True):
+        """
+        Returns copies of the boxes, labels and difficult flags of the
+        objects of the image in `row`
+        """
+        start, end = self.ann_offsets[row], self.ann_offsets[row + 1]
+        boxes = np.array(self.boxes[start:end])
+        labels = np.array(self.labels[start:end])
+        difficult = np.array(self.difficult[start:end]).astype(np.bool_)
+        if not keep_difficult:
+            keep = ~difficult
+            boxes, labels, difficult = boxes[keep], labels[keep], difficult[keep]
+        return boxes, labels, difficult
@@ -0,0 +1,245 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Cache of the encoded image files of a dataset in shared memory, so that
+the DataLoader workers read each file from the storage once instead of
+every epoch.
+"""
+import io
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+import torch
+
+# columns of the entries table
+_OFFSET, _LENGTH, _REFERENCED = range(3)
+# slots of the state table
+_HEAD, _HITS, _MISSES, _USED_BYTES, _NUM_IMAGES = range(5)
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class SharedImageCache(object):
+    """
+    Holds the bytes of up to capacity_bytes of image files in a single
+    arena of shared memory, split in blocks of block_size bytes. Each
+    image is a contiguous run of blocks.
+
+    The arena is filled as a circular log: a new image goes at the head,
+    which then moves past it. When the blocks at the head are taken, the
+    images there are evicted, except the ones read since the head last
+    went past them (CLOCK, an approximation of LRU eviction), which the
+    head skips. Only the images in the run of blocks the new image takes
+    are evicted, and finding it costs the number of images skipped, not
+    a scan of the whole arena.
+
+    The cache must be created in the main process, before the DataLoader
+    workers are started: they all share the arena, the tables and the
+    lock. The hit and miss counters are shared as well, and can be read
+    from the main process.
+
+    Images are identified by an integer key in [0, num_images), e.g., the
+    index of the image in the dataset (see view).
+    """
+
+    def __init__(self, num_images, capacity_bytes, block_size=16 * 1024):
+        self.block_size = block_size
+        num_blocks = max(capacity_bytes // block_size, 1)
+        self.arena = torch.empty(num_blocks * block_size, dtype=torch.uint8)
+        self.block_owner = torch.full((num_blocks,), -1, dtype=torch.int64)
+        self.entries = torch.full((num_images, 3), -1, dtype=torch.int64)
+        self.state = torch.zeros(5, dtype=torch.int64)
+        for tensor in (self.arena, self.block_owner, self.entries, self.state):
+            tensor.share_memory_()
+        self.lock = multiprocessing.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def capacity_bytes(self):
+        return self.arena.numel()
+
+    def _num_blocks(self, length):
+        return max(-(-length // self.block_size), 1)
+
+    def _evict(self, key):
+        entries = self.entries.numpy()
+        offset, length = entries[key, _OFFSET], entries[key, _LENGTH]
+        first = offset // self.block_size
+        self.block_owner.numpy()[first : first + self._num_blocks(length)] = -1
+        entries[key] = -1
+        state = self.state.numpy()
+        state[_USED_BYTES] -= length
+        state[_NUM_IMAGES] -= 1
+
+    def _allocate(self, length, evict):
+        """
+        Returns the first block of a run of blocks for length bytes, freed
+        by evicting the images in it, or -1
+        """
+        num_blocks = self._num_blocks(length)
+        total_blocks = len(self.block_owner)
+        if num_blocks > total_blocks:
+            return -1
+        block_owner = self.block_owner.numpy()
+        entries = self.entries.numpy()
+        state = self.state.numpy()
+
+        # the run being built is [start, end): it only has free blocks and
+        # images that can be evicted
+        start = end = int(state[_HEAD])
+        num_wraps = 0
+        # after two wraps, all the images were skipped once, and can be
+        # evicted. Without eviction, one wrap went through all the blocks
+        max_wraps = 2 if evict else 1
+        while end - start < num_blocks:
+            if start + num_blocks > total_blocks:
+                num_wraps += 1
+                if num_wraps > max_wraps:
+                    return -1
+                start = end = 0
+                continue
+            key = block_owner[end]
+            if key < 0:
+                end += 1
+                continue
+            entry_end = entries[key, _OFFSET] // self.block_size + self._num_blocks(
+                entries[key, _LENGTH]
+            )
+            if evict and not entries[key, _REFERENCED]:
+                end = entry_end
+                continue
+            # the run can't go through this image: start after it
+            if evict:
+                entries[key, _REFERENCED] = 0
+            start = end = entry_end
+
+        for key in np.unique(block_owner[start : start + num_blocks]):
+            if key >= 0:
+                self._evict(key)
+        state[_HEAD] = start + num_blocks
+        return start
+
+    def _insert(self, key, data, evict=True):
+        # called with the lock held, returns whether the image is cached
+        entries = self.entries.numpy()
+        if entries[key, _OFFSET] >= 0:
+            return True
+        first = self._allocate(len(data), evict)
+        if first < 0:
+            return False
+        self.block_owner.numpy()[first : first + self._num_blocks(len(data))] = key
+        offset = first * self.block_size
+        self.arena.numpy()[offset : offset + len(data)] = np.frombuffer(
+            data, dtype=np.uint8
+        )
+        entries[key] = (offset, len(data), 0)
+        state = self.state.numpy()
+        state[_USED_BYTES] += len(data)
+        state[_NUM_IMAGES] += 1
+        return True
+
+    def read(self, key, path):
+        """
+        Returns the bytes of the file of image `key`, from the cache if it
+        is there, or else from `path`, adding it to the cache
+        """
+        with self.lock:
+            entries = self.entries.numpy()
+            state = self.state.numpy()
+            offset, length = entries[key, _OFFSET], entries[key, _LENGTH]
+            if offset >= 0:
+                state[_HITS] += 1
+                entries[key, _REFERENCED] = 1
+                return self.arena.numpy()[offset : offset + length].tobytes()
+            state[_MISSES] += 1
+
+        # read the file without holding the lock
+        data = _read_file(path)
+        with self.lock:
+            self._insert(key, data)
+        return data
+
+    def open(self, key, path):
+        """
+        Same as read, as a file object
+        """
+        return io.BytesIO(self.read(key, path))
+
+    def preload(self, keys, paths, num_threads=16):
+        """
+        Fills the cache with the files of the given images, read from a
+        pool of threads, until it is full. Nothing is evicted
+        """
+        pool = ThreadPool(num_threads)
+        try:
+            for key, data in zip(keys, pool.imap(_read_file, paths, chunksize=16)):
+                with self.lock:
+                    if not self._insert(key, data, evict=False):
+                        break
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def stats(self):
+        """
+        Returns the number of hits, misses, cached images and cached bytes
+        """
+        with self.lock:
+            hits, misses, used_bytes, num_cached = self.state[
+                [_HITS, _MISSES, _USED_BYTES, _NUM_IMAGES]
+            ].tolist()
+        return {
+            "hits": hits,
+            "misses": misses,
+            "num_images": num_cached,
+            "bytes": used_bytes,
+        }
+
+    def view(self, key_offset):
+        return ImageCacheView(self, key_offset)
+
+
+class ImageCacheView(object):
+    """
+    The images of a dataset in a cache shared by several datasets, whose
+    keys start at key_offset
+    """
+
+    def __init__(self, cache, key_offset):
+        self.cache = cache
+        self.key_offset = key_offset
+
+    def read(self, index, path):
+        return self.cache.read(self.key_offset + index, path)
+
+    def open(self, index, path):
+        return self.cache.open(self.key_offset + index, path)
+
+
+def attach_image_cache(datasets, cache):
+    """
+    Makes the datasets (possibly ConcatDatasets) read their image files
+    through the cache, each with its own range of keys
+
+    Returns:
+        keys (list[int]), paths (list[str]): key and path of every image
+    """
+    keys = []
+    paths = []
+    stack = list(reversed(datasets))
+    while stack:
+        dataset = stack.pop()
+        if hasattr(dataset, "datasets"):
+            stack.extend(reversed(dataset.datasets))
+            continue
+        key_offset = len(keys)
+        dataset.image_cache = cache.view(key_offset)
+        for index in range(len(dataset)):
+            keys.append(key_offset + index)
+            paths.append(dataset.get_image_path(index))
+    return keys, paths
@@ -0,0 +1,126 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Reading image sizes from the file headers only, without decoding the pixels,
+and decoding JPEG images directly at a reduced resolution.
+"""
+import struct
+from multiprocessing.pool import ThreadPool
+
+from PIL import Image
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# start of frame markers, which hold the size of a JPEG image (DHT, JPG and
+# DAC share the range but are not frames)
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _read_png_size(f):
+    # the IHDR chunk always comes first, right after the signature
+    header = f.read(24)
+    if len(header) < 24 or header[12:16] != b"IHDR":
+        return None
+    width, height = struct.unpack(">II", header[16:24])
+    return width, height
+
+
+def _read_jpeg_size(f):
+    f.read(2)  # SOI
+    while True:
+        byte = f.read(1)
+        # skip the padding up to the next marker
+        while byte and byte != b"\xff":
+            byte = f.read(1)
+        while byte == b"\xff":
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = ord(byte)
+        # markers without a segment
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            continue
+        if marker in (0x00, 0xD9, 0xDA):
+            # no frame header before the end of the image or the scan data
+            return None
+        length = f.read(2)
+        if len(length) < 2:
+            return None
+        length = struct.unpack(">H", length)[0]
+        if marker in _JPEG_SOF_MARKERS:
+            segment = f.read(5)
+            if len(segment) < 5:
+                return None
+            height, width = struct.unpack(">HH", segment[1:5])
+            return width, height
+        f.seek(length - 2, 1)
+
+
+def read_image_size(path):
+    """
+    Returns the (width, height) of an image, parsing only the header of
+    JPEG and PNG files, and falling back to PIL (which also reads only the
+    header, but is slower) for other formats
+    """
+    with open(path, "rb") as f:
+        signature = f.read(8)
+        f.seek(0)
+        size = None
+        if signature[:2] == b"\xff\xd8":
+            size = _read_jpeg_size(f)
+        elif signature == _PNG_SIGNATURE:
+            size = _read_png_size(f)
+        if size is not None:
+            return size
+    with Image.open(path) as img:
+        return img.size
+
+
+def read_image_sizes(paths, num_threads=16):
+    """
+    Same as read_image_size for many files, reading the headers from a pool
+    of threads since the work is mostly waiting for the storage
+    """
+    if num_threads <= 1 or len(paths) <= 1:
+        return [read_image_size(p) for p in paths]
+    pool = ThreadPool(num_threads)
+    try:
+        return pool.map(read_image_size, paths, chunksize=64)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def find_resize_transform(transforms):
+    """
+    Returns the first transform of a Compose that has a get_size method,
+    like Resize, or None
+    """
+    for t in getattr(transforms, "transforms", [transforms]):
+        if hasattr(t, "get_size"):
+            return t
+    return None
+
+
+def load_image(path, resize=None):
+    """
+    Loads an image as RGB.
+
+    If resize is given (e.g., a Resize transform), the size the image will be
+    resized to is computed from the header, and JPEG images are decoded in
+    the DCT domain at the largest scale (1/2, 1/4 or 1/8) that is still at
+    least that size, which is much faster than decoding the full image,
+    and then resized to that size. Applying the resize to the returned
+    image then leaves it unchanged.
+
+    Returns:
+        img (PIL.Image)
+        original_size (tuple[int, int]): (width, height) of the full image
+    """
+    img = Image.open(path)
+    original_size = img.size
+    if resize is not None and img.format == "JPEG":
+        height, width = resize.get_size(original_size)
+        img.draft("RGB", (width, height))
+        if img.size != original_size:
+            img = img.convert("RGB").resize((width, height), Image.BILINEAR)
+            return img, original_size
+    return img.convert("RGB"), original_size
@@ -0,0 +1,116 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import sys
+import threading
+import time
+
+import torch
+
+if sys.version_info[0] == 2:
+    import Queue as queue
+else:
+    import queue
+
+
+class _ExceptionWrapper(object):
+    def __init__(self, exception):
+        self.exception = exception
+
+
+class DataPrefetcher(object):
+    """
+    Iterates over a data loader in a background thread, and moves the images
+    and targets of up to num_prefetch batches ahead to the device, so that
+    loading and copying the next batches overlaps with the computation on
+    the current one.
+    On CUDA devices, the images are pinned and copied with non-blocking
+    copies on a separate stream.
+
+    After each batch, queue_depth is the number of batches that were ready,
+    and stall_time is the time spent waiting for the batch, i.e., the time
+    the data pipeline held back the model.
+    """
+
+    _END = object()
+
+    def __init__(self, data_loader, device, num_prefetch=1):
+        self.data_loader = data_loader
+        self.device = torch.device(device)
+        self.num_prefetch = max(num_prefetch, 1)
+        self.stream = None
+        if self.device.type == "cuda":
+            self.stream = torch.cuda.Stream(self.device)
+        self.queue_depth = 0
+        self.stall_time = 0.0
+
+    def __len__(self):
+        return len(self.data_loader)
+
+    def _to_device(self, images, targets):
+        if self.stream is None:
+            return images.to(self.device), [t.to(self.device) for t in targets]
+
+        if not images.tensors.is_pinned():
+            images.tensors = images.tensors.pin_memory()
+        with torch.cuda.stream(self.stream):
+            images = images.to(self.device, non_blocking=True)
+            targets = [t.to(self.device, non_blocking=True) for t in targets]
+        return images, targets
+
+    def _worker(self, batch_queue, stop_event):
+        if self.stream is not None:
+            torch.cuda.set_device(self.device)
+        try:
+            for images, targets, idxs in self.data_loader:
+                images, targets = self._to_device(images, targets)
+                event = None
+                if self.stream is not None:
+                    event = torch.cuda.Event()
+                    event.record(self.stream)
+                batch_queue.put((images, targets, idxs, event))
+                if stop_event.is_set():
+                    return
+        except Exception as e:
+            batch_queue.put(_ExceptionWrapper(e))
+            return
+        batch_queue.put(self._END)
+
+    def _record_stream(self, images, targets):
+        # the tensors were allocated on self.stream, but are used on the
+        # current stream: don't let the allocator reuse them too early
+        stream = torch.cuda.current_stream(self.device)
+        images.tensors.record_stream(stream)
+        for target in targets:
+            target.bbox.record_stream(stream)
+            for v in target.extra_fields.values():
+                if isinstance(v, torch.Tensor) and v.is_cuda:
+                    v.record_stream(stream)
+
+    def __iter__(self):
+        batch_queue = queue.Queue(maxsize=self.num_prefetch)
+        stop_event = threading.Event()
+        thread = threading.Thread(target=self._worker, args=(batch_queue, stop_event))
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                self.queue_depth = batch_queue.qsize()
+                start = time.time()
+                batch = batch_queue.get()
+                if batch is self._END:
+                    break
+                if isinstance(batch, _ExceptionWrapper):
+                    raise batch.exception
+                images, targets, idxs, event = batch
+                if event is not None:
+                    torch.cuda.current_stream(self.device).wait_event(event)
+                    self._record_stream(images, targets)
+                self.stall_time = time.time() - start
+                yield images, targets, idxs
+        finally:
+            # unblock the thread if the iteration was interrupted
+            stop_event.set()
+            while thread.is_alive():
+                try:
+                    batch_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
@@ -0,0 +1,249 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Recorded batches, replayed in place of the real data loader to measure the
+throughput of the model alone (see tools/record_batches.py).
+
+All the batches are packed in a single file: a json header giving the
+dtype, shape and offset of each array, followed by the arrays. The file
+is memory-mapped and the batches are served as tensors sharing its memory.
+"""
+import json
+import os
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+import torch
+
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.image_list import ImageList
+from maskrcnn_benchmark.structures.segmentation_mask import SegmentationMask
+
+_MAGIC = b"MRCNNRPL"
+_ALIGNMENT = 64
+
+
+def write_replay_batches(path, batches, images_per_gpu=None, world_size=1):
+    """
+    Arguments:
+        path (str): file to write
+        batches (iterable[tuple[ImageList, list[BoxList], tuple[int]]]):
+            batches, as returned by the data loader
+        images_per_gpu (int): number of images of a batch of a rank, by
+            default the number of images of the largest batch
+        world_size (int): number of ranks the batches are replayed on, each
+            rank getting every world_size-th batch
+    """
+    arrays = {}
+    batch_shapes = []
+    image_sizes = []
+    target_sizes = []
+    image_idxs = []
+    box_counts = []
+    boxes = []
+    fields = {}
+    modes = set()
+    coords = []
+    poly_lengths = []
+    instance_lengths = []
+    has_masks = None
+    image_dtype = None
+
+    # the images are large: write them to a temporary file as they come
+    parent = os.path.dirname(os.path.abspath(path))
+    with tempfile.TemporaryFile(dir=parent) as image_file:
+        for images, targets, idxs in batches:
+            tensors = images.tensors.cpu().contiguous()
+            image_dtype = tensors.numpy().dtype
+            image_file.write(tensors.numpy().tobytes())
+            batch_shapes.append(tuple(tensors.shape))
+            image_sizes.extend(tuple(s) for s in images.image_sizes)
+            image_idxs.extend(idxs)
+            for target in targets:
+                modes.add(target.mode)
+                target_sizes.append(tuple(target.size))
+                box_counts.append(len(target))
+                boxes.append(target.bbox.cpu().numpy().reshape(-1, 4))
+                if has_masks is None:
+                    has_masks = target.has_field("masks")
+                for name in target.fields():
+                    field = target.get_field(name)
+                    if isinstance(field, torch.Tensor):
+                        fields.setdefault(name, []).append(field.cpu().numpy())
+                if has_masks:
+                    masks = target.get_field("masks")
+                    coords.append(masks.coords.numpy())
+                    poly_lengths.append(np.diff(masks.poly_offsets.numpy()))
+                    instance_lengths.append(np.diff(masks.instance_offsets.numpy()))
+        assert len(modes) <= 1, "all the targets should have the same mode"
+
+        def offsets(lengths):
+            return np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+        batch_shapes = np.array(batch_shapes, dtype=np.int64).reshape(-1, 4)
+        arrays["batch_shapes"] = batch_shapes
+        arrays["batch_offsets"] = offsets(batch_shapes[:, 0])
+        arrays["image_sizes"] = np.array(image_sizes, dtype=np.int64).reshape(-1, 2)
+        arrays["target_sizes"] = np.array(target_sizes, dtype=np.int64).reshape(-1, 2)
+        arrays["image_idxs"] = np.array(image_idxs, dtype=np.int64)
+        arrays["box_offsets"] = offsets(box_counts)
+        arrays["boxes"] = np.concatenate(boxes or [np.zeros((0, 4))]).astype(
+            np.float32
+        )
+        for name, values in fields.items():
+            arrays["field_" + name] = np.concatenate(values)
+        if has_masks:
+            arrays["mask_coords"] = np.concatenate(coords).astype(np.float32)
+            arrays["mask_poly_offsets"] = offsets(np.concatenate(poly_lengths))
+            arrays["mask_instance_offsets"] = offsets(
+                np.concatenate(instance_lengths)
+            )
+
+        # layout of the file
+        image_dtype = np.dtype(image_dtype or np.uint8)
+        arrays["images"] = None
+        if images_per_gpu is None:
+            images_per_gpu = int(batch_shapes[:, 0].max()) if len(batch_shapes) else 0
+        header = {
+            "mode": modes.pop() if modes else "xyxy",
+            "images_per_gpu": images_per_gpu,
+            "world_size": world_size,
+            "arrays": {},
+        }
+        offset = 0
+        for name, array in arrays.items():
+            if array is None:
+                dtype, shape = image_dtype, (image_file.tell() // image_dtype.itemsize,)
+            else:
+                dtype, shape = array.dtype, array.shape
+            header["arrays"][name] = {
+                "dtype": dtype.str, "shape": shape, "offset": offset
+            }
+            offset += -(-int(np.prod(shape)) * dtype.itemsize // _ALIGNMENT) * _ALIGNMENT
+        header = json.dumps(header).encode("utf-8")
+        data_start = len(_MAGIC) + 8 + len(header)
+        data_start = -(-data_start // _ALIGNMENT) * _ALIGNMENT
+        header_arrays = json.loads(header.decode("utf-8"))["arrays"]
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(data_start + header_arrays[name]["offset"])
+                if array is None:
+                    image_file.seek(0)
+                    shutil.copyfileobj(image_file, f)
+                else:
+                    f.write(np.ascontiguousarray(array).tobytes())
+        os.rename(tmp_path, path)
+
+
+class ReplayBatches(object):
+    """
+    Batches written by write_replay_batches. Indexing returns the batch as
+    (ImageList, list[BoxList], tuple[int]) like the data loader, where the
+    images and boxes share the memory of the file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic = f.read(len(_MAGIC))
+            if magic != _MAGIC:
+                raise ValueError("{} is not a file of recorded batches".format(path))
+            header_size = struct.unpack("<Q", f.read(8))[0]
+            header = json.loads(f.read(header_size).decode("utf-8"))
+        data_start = len(_MAGIC) + 8 + header_size
+        data_start = -(-data_start // _ALIGNMENT) * _ALIGNMENT
+        self.mode = header["mode"]
+        # None for the files recorded before they were stored
+        self.images_per_gpu = header.get("images_per_gpu")
+        self.world_size = header.get("world_size")
+
+        # copy-on-write, so that the tensors are writable without copying
+        data = np.memmap(path, dtype=np.uint8, mode="c")
+        self.arrays = {}
+        for name, info in header["arrays"].items():
+            dtype = np.dtype(info["dtype"])
+            count = int(np.prod(info["shape"]))
+            start = data_start + info["offset"]
+            array = data[start : start + count * dtype.itemsize].view(dtype)
+            self.arrays[name] = torch.from_numpy(array.reshape(info["shape"]))
+        self.field_names = [
+            name[len("field_"):] for name in self.arrays if name.startswith("field_")
+        ]
+        self.batch_shapes = self.arrays["batch_shapes"].tolist()
+        self.batch_offsets = self.arrays["batch_offsets"].tolist()
+        self.box_offsets = self.arrays["box_offsets"].tolist()
+        # start of each batch in the flat images array
+        self.image_offsets = [0]
+        for shape in self.batch_shapes:
+            self.image_offsets.append(self.image_offsets[-1] + int(np.prod(shape)))
+
+    def __len__(self):
+        return len(self.batch_shapes)
+
+    def _get_target(self, image):
+        width, height = self.arrays["target_sizes"][image].tolist()
+        start, end = self.box_offsets[image], self.box_offsets[image + 1]
+        target = BoxList(self.arrays["boxes"][start:end], (width, height), self.mode)
+        for name in self.field_names:
+            target.add_field(name, self.arrays["field_" + name][start:end])
+        if "mask_coords" in self.arrays:
+            instance_offsets = self.arrays["mask_instance_offsets"][start : end + 1]
+            poly_start, poly_end = instance_offsets[[0, -1]].tolist()
+            poly_offsets = self.arrays["mask_poly_offsets"][poly_start : poly_end + 1]
+            coord_start, coord_end = poly_offsets[[0, -1]].tolist()
+            masks = SegmentationMask.from_packed(
+                self.arrays["mask_coords"][coord_start:coord_end],
+                poly_offsets - coord_start,
+                instance_offsets - poly_start,
+                (width, height),
+            )
+            target.add_field("masks", masks)
+        return target
+
+    def __getitem__(self, idx):
+        shape = self.batch_shapes[idx]
+        images = self.arrays["images"][
+            self.image_offsets[idx] : self.image_offsets[idx + 1]
+        ].view(shape)
+        first, last = self.batch_offsets[idx], self.batch_offsets[idx + 1]
+        image_sizes = [
+            tuple(s) for s in self.arrays["image_sizes"][first:last].tolist()
+        ]
+        targets = [self._get_target(i) for i in range(first, last)]
+        idxs = tuple(self.arrays["image_idxs"][first:last].tolist())
+        return ImageList(images, image_sizes), targets, idxs
+
+
+class ReplayDataLoader(object):
+    """
+    Replaces the training data loader: cycles over recorded batches until
+    num_iterations batches have been returned, without ever loading the
+    dataset. Rank r of world_size ranks replays the batches r,
+    r + world_size, r + 2 * world_size, ...
+    """
+
+    def __init__(self, replay_batches, num_iterations, start_iter=0, rank=0, world_size=1):
+        if len(replay_batches) < world_size:
+            raise ValueError(
+                "{} recorded batches can't be split between {} ranks".format(
+                    len(replay_batches), world_size
+                )
+            )
+        self.replay_batches = replay_batches
+        self.num_iterations = num_iterations
+        self.start_iter = start_iter
+        self.batch_idxs = list(range(rank, len(replay_batches), world_size))
+
+    def __iter__(self):
+        batch_idxs = self.batch_idxs
+        for iteration in range(self.start_iter, self.num_iterations):
+            yield self.replay_batches[batch_idxs[iteration % len(batch_idxs)]]
+
+    def __len__(self):
+        return self.num_iterations
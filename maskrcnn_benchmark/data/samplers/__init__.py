@@ -1,6 +1,16 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+from .cost_balanced_batch_sampler import CostBalancedBatchSampler
 from .distributed import DistributedSampler
 from .grouped_batch_sampler import GroupedBatchSampler
 from .iteration_based_batch_sampler import IterationBasedBatchSampler
+from .read_ahead_batch_sampler import ReadAheadBatchSampler
+from .shape_bucketed_batch_sampler import ShapeBucketedBatchSampler
 
-__all__ = ["DistributedSampler", "GroupedBatchSampler", "IterationBasedBatchSampler"]
+__all__ = [
+    "CostBalancedBatchSampler",
+    "DistributedSampler",
+    "GroupedBatchSampler",
+    "IterationBasedBatchSampler",
+    "ReadAheadBatchSampler",
+    "ShapeBucketedBatchSampler",
+]
@@ -0,0 +1,101 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import itertools
+import logging
+
+import numpy as np
+from torch.utils.data.sampler import BatchSampler
+
+
+def balance_batch(costs, num_replicas):
+    """
+    Splits the images of a global batch into num_replicas batches of the
+    same size, with close total costs: the images are assigned from the
+    most to the least expensive, each to the rank with the lowest total
+    cost so far among those that are not full (longest processing time
+    first).
+
+    Arguments:
+        costs (float[N]): cost of each image, N divisible by num_replicas
+
+    Returns:
+        ranks (int[N]): rank each image is assigned to
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    assert len(costs) % num_replicas == 0
+    capacity = len(costs) // num_replicas
+    loads = np.zeros(num_replicas)
+    counts = np.zeros(num_replicas, dtype=np.int64)
+    ranks = np.zeros(len(costs), dtype=np.int64)
+    for i in np.argsort(-costs, kind="stable").tolist():
+        rank = int(np.argmin(np.where(counts < capacity, loads, np.inf)))
+        ranks[i] = rank
+        loads[rank] += costs[i]
+        counts[rank] += 1
+    return ranks
+
+
+class CostBalancedBatchSampler(BatchSampler):
+    """
+    Wraps a BatchSampler that yields the same global batches of
+    batch_size * num_replicas images on every rank (e.g., a
+    GroupedBatchSampler over a sampler that doesn't depend on the rank),
+    and yields this rank's batch_size images of each, chosen so that the
+    estimated cost of every rank is about the same (see balance_batch).
+
+    At the end of each pass over the wrapped sampler, the variance of the
+    cost of the ranks, averaged over the batches, is logged and compared
+    with the variance of splitting the global batches in contiguous slices.
+
+    Arguments:
+        batch_sampler (BatchSampler): yields the global batches
+        costs (float[N]): estimated cost of each image of the dataset, e.g.,
+            from its size and number of annotations
+        num_replicas (int): number of ranks
+        rank (int): rank of the current process
+    """
+
+    def __init__(self, batch_sampler, costs, num_replicas, rank):
+        self.batch_sampler = batch_sampler
+        # IterationBasedBatchSampler calls sampler.set_epoch
+        self.sampler = batch_sampler.sampler
+        self.costs = np.asarray(costs, dtype=np.float64)
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.cost_variance = None
+
+    def __iter__(self):
+        return self._split_batches(iter(self.batch_sampler))
+
+    def iter_from(self, start):
+        """
+        Same as __iter__, skipping the first start batches
+        """
+        if hasattr(self.batch_sampler, "iter_from"):
+            return self._split_batches(self.batch_sampler.iter_from(start))
+        return self._split_batches(itertools.islice(self.batch_sampler, start, None))
+
+    def _split_batches(self, batches):
+        variances = []
+        unbalanced_variances = []
+        for batch in batches:
+            batch = np.asarray(batch, dtype=np.int64)
+            costs = self.costs[batch]
+            ranks = balance_batch(costs, self.num_replicas)
+            loads = np.bincount(ranks, costs, minlength=self.num_replicas)
+            variances.append(loads.var())
+            unbalanced_variances.append(
+                costs.reshape(self.num_replicas, -1).sum(axis=1).var()
+            )
+            yield batch[ranks == self.rank].tolist()
+        if variances:
+            self.cost_variance = float(np.mean(variances))
+            logger = logging.getLogger(__name__)
+            logger.info(
+                "Per-rank cost variance over {} batches: {:.4f} "
+                "(unbalanced: {:.4f})".format(
+                    len(variances), self.cost_variance, np.mean(unbalanced_variances)
+                )
+            )
+
+    def __len__(self):
+        return len(self.batch_sampler)
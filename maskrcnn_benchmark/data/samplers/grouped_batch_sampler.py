@@ -1,11 +1,34 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
-import itertools
-
+import numpy as np
 import torch
 from torch.utils.data.sampler import BatchSampler
 from torch.utils.data.sampler import Sampler
 
 
+class _Batches(object):
+    """
+    Sequence of batches, stored as the concatenation of their elements and
+    the boundaries of each batch. Each batch is converted to a list when
+    it is accessed, instead of converting all of them at the start of the
+    epoch.
+    """
+
+    def __init__(self, elements, starts, ends):
+        self.elements = elements
+        self.starts = starts.tolist()
+        self.ends = ends.tolist()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, idx):
+        return self.elements[self.starts[idx] : self.ends[idx]].tolist()
+
+    def __iter__(self):
+        for start, end in zip(self.starts, self.ends):
+            yield self.elements[start:end].tolist()
+
+
 class GroupedBatchSampler(BatchSampler):
     """
     Wraps another sampler to yield a mini-batch of indices.
@@ -30,6 +53,7 @@ class GroupedBatchSampler(BatchSampler):
         self.sampler = sampler
         self.group_ids = torch.as_tensor(group_ids)
         assert self.group_ids.dim() == 1
+        self._group_ids = self.group_ids.numpy()
         self.batch_size = batch_size
         self.drop_uneven = drop_uneven
 
@@ -40,35 +64,44 @@ class GroupedBatchSampler(BatchSampler):
     def _prepare_batches(self):
         dataset_size = len(self.group_ids)
         # get the sampled indices from the sampler
-        sampled_ids = torch.as_tensor(list(self.sampler))
+        sampled_ids = np.fromiter(iter(self.sampler), dtype=np.int64)
+        if len(sampled_ids) == 0:
+            return _Batches(sampled_ids, sampled_ids, sampled_ids)
         # potentially not all elements of the dataset were sampled
         # by the sampler (e.g., DistributedSampler).
-        # construct a tensor which contains -1 if the element was
+        # construct an array which contains -1 if the element was
         # not sampled, and a non-negative number indicating the
         # order where the element was sampled.
         # for example. if sampled_ids = [3, 1] and dataset_size = 5,
         # the order is [-1, 1, -1, 0, -1]
-        order = torch.full((dataset_size,), -1, dtype=torch.int64)
-        order[sampled_ids] = torch.arange(len(sampled_ids))
-
-        # get a mask with the elements that were sampled
-        mask = order >= 0
-
-        # find the elements that belong to each individual cluster
-        clusters = [(self.group_ids == i) & mask for i in self.groups]
-        # get relative order of the elements inside each cluster
-        # that follows the order from the sampler
-        relative_order = [order[cluster] for cluster in clusters]
-        # with the relative order, find the absolute order in the
-        # sampled space
-        permutation_ids = [s[s.sort()[1]] for s in relative_order]
-        # permute each cluster so that they follow the order from
-        # the sampler
-        permuted_clusters = [sampled_ids[idx] for idx in permutation_ids]
-
-        # splits each cluster in batch_size, and merge as a list of tensors
-        splits = [c.split(self.batch_size) for c in permuted_clusters]
-        merged = tuple(itertools.chain.from_iterable(splits))
+        order = np.full(dataset_size, -1, dtype=np.int64)
+        order[sampled_ids] = np.arange(len(sampled_ids))
+
+        # positions (in the sampled space) of the elements that were sampled,
+        # keeping the last position of the elements sampled more than once
+        positions = np.sort(order[order >= 0])
+        elements = sampled_ids[positions]
+
+        # group the elements by cluster, keeping the order from the sampler
+        # inside each cluster
+        groups = self._group_ids[elements]
+        permutation = np.argsort(groups, kind="stable")
+        elements = elements[permutation]
+        positions = positions[permutation]
+        groups = groups[permutation]
+
+        # split each cluster in batch_size: a batch starts at every
+        # batch_size-th element of a cluster
+        num_elements = len(elements)
+        cluster_starts = np.flatnonzero(
+            np.concatenate(([True], groups[1:] != groups[:-1]))
+        )
+        cluster_sizes = np.diff(np.append(cluster_starts, num_elements))
+        rank_in_cluster = np.arange(num_elements) - np.repeat(
+            cluster_starts, cluster_sizes
+        )
+        batch_starts = np.flatnonzero(rank_in_cluster % self.batch_size == 0)
+        batch_ends = np.append(batch_starts[1:], num_elements)
 
         # now each batch internally has the right order, but
         # they are grouped by clusters. Find the permutation between
@@ -76,37 +109,36 @@ class GroupedBatchSampler(BatchSampler):
         # the order that we have in the sampler. For that, we will consider the
         # ordering as coming from the first element of each batch, and sort
         # correspondingly
-        first_element_of_batch = [t[0].item() for t in merged]
-        # get and inverse mapping from sampled indices and the position where
-        # they occur (as returned by the sampler)
-        inv_sampled_ids_map = {v: k for k, v in enumerate(sampled_ids.tolist())}
-        # from the first element in each batch, get a relative ordering
-        first_index_of_batch = torch.as_tensor(
-            [inv_sampled_ids_map[s] for s in first_element_of_batch]
-        )
+        permutation_order = np.argsort(positions[batch_starts], kind="stable")
+        if self.drop_uneven:
+            batch_sizes = batch_ends - batch_starts
+            permutation_order = permutation_order[
+                batch_sizes[permutation_order] == self.batch_size
+            ]
 
-        # permute the batches so that they approximately follow the order
-        # from the sampler
-        permutation_order = first_index_of_batch.sort(0)[1].tolist()
         # finally, permute the batches
-        batches = [merged[i].tolist() for i in permutation_order]
-
-        if self.drop_uneven:
-            kept = []
-            for batch in batches:
-                if len(batch) == self.batch_size:
-                    kept.append(batch)
-            batches = kept
-        return batches
+        return _Batches(
+            elements, batch_starts[permutation_order], batch_ends[permutation_order]
+        )
 
-    def __iter__(self):
+    def _get_batches(self):
         if self._can_reuse_batches:
             batches = self._batches
             self._can_reuse_batches = False
         else:
             batches = self._prepare_batches()
         self._batches = batches
-        return iter(batches)
+        return batches
+
+    def __iter__(self):
+        return iter(self._get_batches())
+
+    def iter_from(self, start):
+        """
+        Same as __iter__, skipping the first start batches
+        """
+        batches = self._get_batches()
+        return (batches[i] for i in range(start, len(batches)))
 
     def __len__(self):
         if not hasattr(self, "_batches"):
@@ -1,27 +1,56 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import itertools
+
 from torch.utils.data.sampler import BatchSampler
 
 
+def _iter_from(batch_sampler, start):
+    if start == 0:
+        return iter(batch_sampler)
+    if hasattr(batch_sampler, "iter_from"):
+        return batch_sampler.iter_from(start)
+    # the batches before start have to be drawn
+    return itertools.islice(iter(batch_sampler), start, None)
+
+
 class IterationBasedBatchSampler(BatchSampler):
     """
     Wraps a BatchSampler, resampling from it until
-    a specified number of iterations have been sampled
+    a specified number of iterations have been sampled.
+
+    Each pass over the wrapped sampler is seeded with the iteration it
+    starts at (through set_epoch), on top of the seed of the sampler, if any. The passes are recorded, so that
+    state_dict can tell which batch of which pass comes at a given
+    iteration, and load_state_dict resumes from there with exactly the
+    same batches as an uninterrupted run.
     """
 
     def __init__(self, batch_sampler, num_iterations, start_iter=0):
         self.batch_sampler = batch_sampler
         self.num_iterations = num_iterations
         self.start_iter = start_iter
+        # (epoch, position) of the batch at start_iter, set by load_state_dict
+        self._resume_from = None
+        # (iteration, epoch, position) at the start of each pass
+        self._passes = []
 
     def __iter__(self):
         iteration = self.start_iter
+        resume_from = self._resume_from
+        self._passes = []
         while iteration <= self.num_iterations:
+            if resume_from is not None:
+                epoch, position = resume_from
+                resume_from = None
+            else:
+                epoch, position = iteration, 0
             # if the underlying sampler has a set_epoch method, like
             # DistributedSampler, used for making each process see
             # a different split of the dataset, then set it
             if hasattr(self.batch_sampler.sampler, "set_epoch"):
-                self.batch_sampler.sampler.set_epoch(iteration)
-            for batch in self.batch_sampler:
+                self.batch_sampler.sampler.set_epoch(epoch)
+            self._passes.append((iteration, epoch, position))
+            for batch in _iter_from(self.batch_sampler, position):
                 iteration += 1
                 if iteration > self.num_iterations:
                     break
@@ -29,3 +58,36 @@ class IterationBasedBatchSampler(BatchSampler):
 
     def __len__(self):
         return self.num_iterations
+
+    def state_dict(self, iteration):
+        """
+        Returns the state to resume from after `iteration` batches were
+        consumed. It can be behind the batches already sampled, which the
+        DataLoader requests ahead of time.
+        """
+        passes = self._passes
+        if not passes:
+            # not iterated yet
+            epoch, position = self._resume_from or (self.start_iter, 0)
+            passes = [(self.start_iter, epoch, position)]
+        start, epoch, position = passes[0]
+        for pass_start, pass_epoch, pass_position in passes:
+            if pass_start > iteration:
+                break
+            start, epoch, position = pass_start, pass_epoch, pass_position
+        state_dict = {
+            "iteration": iteration,
+            "epoch": epoch,
+            "position": position + iteration - start,
+        }
+        # the base seed of the passes, see DistributedSampler
+        seed = getattr(self.batch_sampler.sampler, "seed", None)
+        if seed is not None:
+            state_dict["seed"] = seed
+        return state_dict
+
+    def load_state_dict(self, state_dict):
+        self.start_iter = state_dict["iteration"]
+        self._resume_from = (state_dict["epoch"], state_dict["position"])
+        if "seed" in state_dict:
+            self.batch_sampler.sampler.seed = state_dict["seed"]
@@ -0,0 +1,80 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import collections
+import os
+from multiprocessing.pool import ThreadPool
+
+from torch.utils.data.sampler import BatchSampler
+
+_CHUNK_SIZE = 1 << 20
+
+
+def read_ahead(path):
+    """
+    Brings a file into the page cache without waiting for it: hints the
+    kernel to read it asynchronously when posix_fadvise is available, and
+    reads it otherwise
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        # the dataset will report it
+        return
+    try:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        else:
+            while os.read(fd, _CHUNK_SIZE):
+                pass
+    finally:
+        os.close(fd)
+
+
+class ReadAheadBatchSampler(BatchSampler):
+    """
+    Wraps a BatchSampler, and reads ahead the image files of the next
+    num_batches_ahead batches from a pool of threads, so that they are
+    in the page cache when the workers load them.
+
+    The DataLoader already requests the batches of indices a few batches
+    before they are loaded (2 per worker), so the files are read
+    num_batches_ahead batches before that.
+
+    Arguments:
+        batch_sampler (BatchSampler): the sampler, e.g.,
+            IterationBasedBatchSampler
+        get_image_path (callable): returns the path of the image file of an
+            index of the dataset
+        num_batches_ahead (int): lookahead depth, in batches
+        num_threads (int): number of threads reading the files
+    """
+
+    def __init__(self, batch_sampler, get_image_path, num_batches_ahead, num_threads=8):
+        self.batch_sampler = batch_sampler
+        self.get_image_path = get_image_path
+        self.num_batches_ahead = num_batches_ahead
+        self.num_threads = num_threads
+
+    def __iter__(self):
+        pool = ThreadPool(self.num_threads)
+        try:
+            upcoming = collections.deque()
+            for batch in self.batch_sampler:
+                paths = [self.get_image_path(idx) for idx in batch]
+                pool.map_async(read_ahead, paths)
+                upcoming.append(batch)
+                if len(upcoming) > self.num_batches_ahead:
+                    yield upcoming.popleft()
+            while upcoming:
+                yield upcoming.popleft()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def __len__(self):
+        return len(self.batch_sampler)
+
+    def state_dict(self, iteration):
+        return self.batch_sampler.state_dict(iteration)
+
+    def load_state_dict(self, state_dict):
+        self.batch_sampler.load_state_dict(state_dict)
@@ -0,0 +1,169 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import logging
+
+import numpy as np
+
+from .grouped_batch_sampler import GroupedBatchSampler
+
+
+def pad_shapes(image_shapes, size_divisible=0):
+    """
+    Shapes of the images once padded to a multiple of size_divisible,
+    as done by to_image_list
+    """
+    image_shapes = np.asarray(image_shapes, dtype=np.int64).reshape(-1, 2)
+    if size_divisible > 0:
+        image_shapes = -(-image_shapes // size_divisible) * size_divisible
+    return image_shapes
+
+
+def compute_shape_buckets(padded_shapes, min_bucket_size):
+    """
+    Assigns each image to a bucket of images with close padded shapes.
+    Landscape and portrait images are never put in the same bucket. Shapes
+    are sorted by (height, width), and runs of consecutive shapes are merged
+    until each bucket has at least min_bucket_size images.
+
+    Arguments:
+        padded_shapes (int[N, 2]): (height, width) of each padded image
+        min_bucket_size (int)
+
+    Returns:
+        bucket_ids (int[N])
+    """
+    padded_shapes = np.asarray(padded_shapes, dtype=np.int64).reshape(-1, 2)
+    # same split as aspect ratio grouping with the [1] bin
+    portrait = (padded_shapes[:, 0] >= padded_shapes[:, 1]).astype(np.int64)
+    keys = np.stack([portrait, padded_shapes[:, 0], padded_shapes[:, 1]], axis=1)
+    unique_keys, shape_ids, counts = np.unique(
+        keys, axis=0, return_inverse=True, return_counts=True
+    )
+
+    # sizes and orientations of the buckets, in the order of the shapes
+    bucket_sizes = []
+    bucket_orientations = []
+    shape_to_bucket = np.zeros(len(unique_keys), dtype=np.int64)
+
+    def merge_last_bucket_if_too_small():
+        # the last bucket of an orientation can be too small: merge it with
+        # the previous one
+        if (
+            len(bucket_sizes) > 1
+            and bucket_sizes[-1] < min_bucket_size
+            and bucket_orientations[-1] == bucket_orientations[-2]
+        ):
+            shape_to_bucket[shape_to_bucket == len(bucket_sizes) - 1] -= 1
+            size = bucket_sizes.pop()
+            bucket_orientations.pop()
+            bucket_sizes[-1] += size
+
+    for i, (orientation, count) in enumerate(
+        zip(unique_keys[:, 0].tolist(), counts.tolist())
+    ):
+        if not bucket_sizes or orientation != bucket_orientations[-1]:
+            merge_last_bucket_if_too_small()
+            bucket_sizes.append(0)
+            bucket_orientations.append(orientation)
+        elif bucket_sizes[-1] >= min_bucket_size:
+            bucket_sizes.append(0)
+            bucket_orientations.append(orientation)
+        shape_to_bucket[i] = len(bucket_sizes) - 1
+        bucket_sizes[-1] += count
+    merge_last_bucket_if_too_small()
+
+    return shape_to_bucket[shape_ids.reshape(-1)]
+
+
+def _padding_waste(image_shapes, elements, starts, ends, size_divisible):
+    if len(starts) == 0:
+        return 0.0
+    order = np.argsort(starts)
+    starts = np.asarray(starts)[order]
+    ends = np.asarray(ends)[order]
+    # each batch is a contiguous segment of elements: reduce the segments
+    # [start, end), and drop the [end, next start) gaps in between
+    shapes = np.concatenate([image_shapes[elements], np.zeros((1, 2), np.int64)])
+    boundaries = np.stack([starts, ends], axis=1).reshape(-1)
+    batch_shapes = np.maximum.reduceat(shapes, boundaries)[::2]
+    image_pixels = np.add.reduceat(shapes.prod(axis=1), boundaries)[::2].sum()
+    batch_pixels = (
+        (ends - starts) * pad_shapes(batch_shapes, size_divisible).prod(axis=1)
+    ).sum()
+    return 1.0 - float(image_pixels) / float(batch_pixels)
+
+
+def compute_padding_waste(image_shapes, batches, size_divisible=0):
+    """
+    Fraction of the pixels of the padded batches that are padding
+
+    Arguments:
+        image_shapes (int[N, 2]): (height, width) of each image, before padding
+        batches (iterable[list[int]]): indices of the images of each batch
+    """
+    image_shapes = np.asarray(image_shapes, dtype=np.int64).reshape(-1, 2)
+    batches = [batch for batch in batches if len(batch) > 0]
+    sizes = np.array([len(batch) for batch in batches], dtype=np.int64)
+    ends = np.cumsum(sizes)
+    elements = np.concatenate([np.asarray(b, dtype=np.int64) for b in batches] or [[]])
+    return _padding_waste(
+        image_shapes, elements.astype(np.int64), ends - sizes, ends, size_divisible
+    )
+
+
+class ShapeBucketedBatchSampler(GroupedBatchSampler):
+    """
+    GroupedBatchSampler whose groups are buckets of images with close
+    shapes after resizing and padding, so that little of each batch is
+    padding. The order of the sampler is kept as much as possible, as in
+    GroupedBatchSampler, unless sort_by_shape is set, in which case the
+    batches are ordered by bucket (e.g., for inference, where the order
+    doesn't matter).
+
+    Arguments:
+        sampler (Sampler): Base sampler.
+        image_shapes (int[N, 2]): (height, width) of each image of the
+            dataset, after resizing
+        batch_size (int): Size of mini-batch.
+        size_divisible (int): batches are padded to a multiple of it
+        min_bucket_size (int): minimum number of images of a bucket. Larger
+            buckets mix more images of different shapes in a batch, but
+            shuffle them better
+        drop_uneven (bool): If ``True``, the sampler will drop the batches whose
+            size is less than ``batch_size``
+        sort_by_shape (bool): If ``True``, the batches are ordered by bucket
+    """
+
+    def __init__(
+        self, sampler, image_shapes, batch_size, size_divisible=0,
+        min_bucket_size=1, drop_uneven=False, sort_by_shape=False
+    ):
+        self.image_shapes = np.asarray(image_shapes, dtype=np.int64).reshape(-1, 2)
+        self.size_divisible = size_divisible
+        self.sort_by_shape = sort_by_shape
+        bucket_ids = compute_shape_buckets(
+            pad_shapes(self.image_shapes, size_divisible), min_bucket_size
+        )
+        super(ShapeBucketedBatchSampler, self).__init__(
+            sampler, bucket_ids, batch_size, drop_uneven
+        )
+        self.padding_waste = None
+
+    def _prepare_batches(self):
+        batches = super(ShapeBucketedBatchSampler, self)._prepare_batches()
+        if self.sort_by_shape and len(batches) > 0:
+            first_elements = batches.elements[np.asarray(batches.starts)]
+            order = np.argsort(self._group_ids[first_elements], kind="stable")
+            batches.starts = np.asarray(batches.starts)[order].tolist()
+            batches.ends = np.asarray(batches.ends)[order].tolist()
+
+        self.padding_waste = _padding_waste(
+            self.image_shapes, batches.elements, batches.starts, batches.ends,
+            self.size_divisible,
+        )
+        logger = logging.getLogger(__name__)
+        logger.info(
+            "{} batches in {} shape buckets, {:.1f}% of padding".format(
+                len(batches), len(self.groups), 100 * self.padding_waste
+            )
+        )
+        return batches
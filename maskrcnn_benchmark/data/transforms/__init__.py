@@ -1,8 +1,10 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
 from .transforms import Compose
+from .transforms import DeferTargetTransforms
 from .transforms import Resize
 from .transforms import RandomHorizontalFlip
 from .transforms import ToTensor
 from .transforms import Normalize
+from .transforms import ToNormalizedTensor
 
 from .build import build_transforms
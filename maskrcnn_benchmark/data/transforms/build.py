@@ -13,12 +13,32 @@ def build_transforms(cfg, is_train=True):
         flip_prob = 0
 
     to_bgr255 = cfg.INPUT.TO_BGR255
+    # the targets are resized and flipped by the collator
+    defer = [T.DeferTargetTransforms()] if cfg.INPUT.DEFER_TARGET_TRANSFORMS else []
+    if cfg.INPUT.FUSED_TRANSFORMS or cfg.INPUT.NORMALIZE_ON_DEVICE:
+        # resize and flip on the uint8 image, then convert and normalize
+        # in a single pass, or leave the normalization to the model
+        return T.Compose(
+            defer
+            + [
+                T.Resize(min_size, max_size),
+                T.RandomHorizontalFlip(flip_prob),
+                T.ToNormalizedTensor(
+                    mean=cfg.INPUT.PIXEL_MEAN,
+                    std=cfg.INPUT.PIXEL_STD,
+                    to_bgr255=to_bgr255,
+                    normalize=not cfg.INPUT.NORMALIZE_ON_DEVICE,
+                ),
+            ]
+        )
+
     normalize_transform = T.Normalize(
         mean=cfg.INPUT.PIXEL_MEAN, std=cfg.INPUT.PIXEL_STD, to_bgr255=to_bgr255
     )
 
     transform = T.Compose(
-        [
+        defer
+        + [
             T.Resize(min_size, max_size),
             T.RandomHorizontalFlip(flip_prob),
             T.ToTensor(),
@@ -1,10 +1,13 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
 import random
 
+import numpy
 import torch
 import torchvision
 from torchvision.transforms import functional as F
 
+from maskrcnn_benchmark.structures.deferred_box_list import DeferredBoxList
+
 
 class Compose(object):
     def __init__(self, transforms):
@@ -24,6 +27,17 @@ class Compose(object):
         return format_string
 
 
+class DeferTargetTransforms(object):
+    """
+    Makes the transforms that follow only record the resize and the flip of
+    the target, which BatchCollator then applies to all the targets of the
+    batch at once (see DeferredBoxList)
+    """
+
+    def __call__(self, image, target):
+        return image, DeferredBoxList(target)
+
+
 class Resize(object):
     def __init__(self, min_size, max_size):
         self.min_size = min_size
@@ -86,3 +100,42 @@ class Normalize(object):
             image = image[[2, 1, 0]] * 255
         image = F.normalize(image, mean=self.mean, std=self.std)
         return image, target
+
+
+class ToNormalizedTensor(object):
+    """
+    Replaces ToTensor followed by Normalize. The uint8 image is converted
+    to a CHW float tensor, reordered to BGR and normalized in a single pass,
+    instead of materializing a float copy of the image for each step.
+
+    If normalize is False, the image is returned as a CHW uint8 tensor in
+    RGB order and the normalization is left to the consumer of the batch.
+    """
+
+    def __init__(self, mean, std, to_bgr255=True, normalize=True):
+        self.to_bgr255 = to_bgr255
+        self.normalize = normalize
+        # without to_bgr255, mean and std are given for images in [0, 1]
+        self.scale = 1.0 if to_bgr255 else 255.0
+        self.mean = torch.tensor(mean, dtype=torch.float32).view(-1, 1, 1)
+        self.std = torch.tensor(std, dtype=torch.float32).view(-1, 1, 1)
+
+    def __call__(self, image, target):
+        if not isinstance(image, numpy.ndarray):
+            image = numpy.array(image, dtype=numpy.uint8)
+        image = torch.from_numpy(image).permute(2, 0, 1)
+        if not self.normalize:
+            return image, target
+
+        if self.to_bgr255:
+            image = image[[2, 1, 0]]
+        image = image.to(torch.float32)
+        if self.scale != 1.0:
+            image.div_(self.scale)
+        image.sub_(self.mean).div_(self.std)
+        return image, target
+
+    def __repr__(self):
+        return "{}(to_bgr255={}, normalize={})".format(
+            self.__class__.__name__, self.to_bgr255, self.normalize
+        )
@@ -8,15 +8,18 @@ import torch
 from tqdm import tqdm
 
 from maskrcnn_benchmark.data.datasets.evaluation import evaluate
+from maskrcnn_benchmark.data.prefetcher import DataPrefetcher
 from ..utils.comm import is_main_process
 from ..utils.comm import scatter_gather
 from ..utils.comm import synchronize
 
 
-def compute_on_dataset(model, data_loader, device):
+def compute_on_dataset(model, data_loader, device, prefetch_batches=0):
     model.eval()
     results_dict = {}
     cpu_device = torch.device("cpu")
+    if prefetch_batches > 0:
+        data_loader = DataPrefetcher(data_loader, device, prefetch_batches)
     for i, batch in enumerate(tqdm(data_loader)):
         images, targets, image_ids = batch
         images = images.to(device)
@@ -61,6 +64,7 @@ def inference(
         expected_results=(),
         expected_results_sigma_tol=4,
         output_folder=None,
+        prefetch_batches=0,
 ):
     # convert to a torch.device for efficiency
     device = torch.device(device)
@@ -73,7 +77,7 @@ def inference(
     dataset = data_loader.dataset
     logger.info("Start evaluation on {} dataset({} images).".format(dataset_name, len(dataset)))
     start_time = time.time()
-    predictions = compute_on_dataset(model, data_loader, device)
+    predictions = compute_on_dataset(model, data_loader, device, prefetch_batches)
     # wait for all processes to complete before measuring the time
     synchronize()
     total_time = time.time() - start_time
@@ -9,6 +9,7 @@ import torch
 import torch.distributed as dist
 
 import maskrcnn_benchmark
+from maskrcnn_benchmark.data.prefetcher import DataPrefetcher
 from maskrcnn_benchmark.utils.comm import get_world_size
 from maskrcnn_benchmark.utils.metric_logger import MetricLogger
 from maskrcnn_benchmark.structures.bounding_box import BoxList
@@ -48,6 +49,21 @@ def reduce_loss_dict(loss_dict):
     return reduced_losses
 
 
+def gather_sampler_states(state, device):
+    """
+    Returns the states of the batch samplers of all the ranks, which can be
+    at different points of a pass
+    """
+    world_size = get_world_size()
+    if world_size < 2:
+        return [state]
+    keys = sorted(state.keys())
+    tensor = torch.tensor([state[k] for k in keys], device=device)
+    tensors = [torch.empty_like(tensor) for _ in range(world_size)]
+    dist.all_gather(tensors, tensor)
+    return [dict(zip(keys, t.tolist())) for t in tensors]
+
+
 def do_train(
     cfg,
     model,
@@ -71,8 +87,42 @@ def do_train(
     create_tensor_saver('fwbw_tensor_dump', start_iter, start_iter + 3)
     register_param_grad_hook(model)
 
+    fake_image_dir = cfg.DATALOADER.FAKE_IMAGE_DATA_PATH
+    use_fake_images = bool(fake_image_dir) and os.path.exists(fake_image_dir)
+
+    image_cache = getattr(data_loader, "image_cache", None)
+    if image_cache is not None:
+        cache_lookups = (0, 0)
+
+    # saved with the checkpoints to resume on the same batches, when the
+    # data loader has a resumable batch sampler (the replay and tar shards
+    # loaders have none)
+    batch_sampler = getattr(data_loader, "batch_sampler", None)
+    if not hasattr(batch_sampler, "state_dict"):
+        batch_sampler = None
+
+    prefetcher = None
+    if cfg.DATALOADER.PREFETCH_BATCHES > 0:
+        prefetcher = DataPrefetcher(
+            data_loader, device, cfg.DATALOADER.PREFETCH_BATCHES
+        )
+        data_loader = prefetcher
+
     for iteration, (images, targets, _) in enumerate(data_loader, start_iter):
         data_time = time.time() - end
+        if prefetcher is not None:
+            # only the time the model actually waited for the batch
+            data_time = prefetcher.stall_time
+            meters.update(queue=prefetcher.queue_depth)
+        if image_cache is not None:
+            # fraction of the images read since the last batch that were
+            # found in the cache
+            cache_stats = image_cache.stats()
+            hits = cache_stats["hits"] - cache_lookups[0]
+            misses = cache_stats["misses"] - cache_lookups[1]
+            cache_lookups = (cache_stats["hits"], cache_stats["misses"])
+            if hits + misses > 0:
+                meters.update(cache_hit=float(hits) / (hits + misses))
 
         iteration = iteration + 1
         arguments["iteration"] = iteration
@@ -80,8 +130,8 @@ def do_train(
 
         scheduler.step()
 
-        if os.path.exists(cfg.DATALOADER.FAKE_IMAGE_DATA_PATH):
-            fake_image_path = os.path.join(cfg.DATALOADER.FAKE_IMAGE_DATA_PATH, 'image_{}.npy'.format(iteration))
+        if use_fake_images:
+            fake_image_path = os.path.join(fake_image_dir, 'image_{}.npy'.format(iteration))
             fake_images = numpy.load(fake_image_path)
             fake_images = numpy.transpose(fake_images, (0, 3, 1, 2))
             images.tensors = torch.tensor(fake_images)
@@ -141,6 +191,19 @@ def do_train(
                     memory=torch.cuda.max_memory_allocated() / 1024.0 / 1024.0,
                 )
             )
+            if image_cache is not None:
+                logger.info(
+                    "image cache: {hits} hits, {misses} misses, {num_images} "
+                    "images ({mb:.0f} MB)".format(
+                        mb=cache_stats["bytes"] / 1024.0 / 1024.0, **cache_stats
+                    )
+                )
+        if batch_sampler is not None and (
+            iteration % checkpoint_period == 0 or iteration == max_iter
+        ):
+            arguments["sampler_states"] = gather_sampler_states(
+                batch_sampler.state_dict(iteration), device
+            )
         if iteration % checkpoint_period == 0:
             checkpointer.save("model_{:07d}".format(iteration), **arguments)
         if iteration == max_iter:
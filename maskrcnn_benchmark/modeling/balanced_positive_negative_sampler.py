@@ -7,15 +7,26 @@ class BalancedPositiveNegativeSampler(object):
     This class samples batches, ensuring that they contain a fixed proportion of positives
     """
 
-    def __init__(self, batch_size_per_image, positive_fraction, random_sample):
+    def __init__(
+        self,
+        batch_size_per_image,
+        positive_fraction,
+        random_sample,
+        batched_random_sample=False,
+    ):
         """
         Arguments:
             batch_size_per_image (int): number of elements to be selected per image
             positive_fraction (float): percentace of positive elements per batch
+            batched_random_sample (bool): if True, the random samples of a [N, K]
+                Tensor are drawn for all the images at once, which gives other
+                samples than the randperm of each image. Otherwise only the
+                randperm calls are done per image
         """
         self.batch_size_per_image = batch_size_per_image
         self.positive_fraction = positive_fraction
         self.random_sample = random_sample
+        self.batched_random_sample = batched_random_sample
 
     def __call__(self, matched_idxs):
         """
@@ -32,7 +43,15 @@ class BalancedPositiveNegativeSampler(object):
         Returns two lists of binary masks for each image.
         The first list contains the positive elements that were selected,
         and the second list the negative example.
+
+        matched_idxs can also be a [N, K] Tensor with one row per image (padded
+        with -1 if the images have different numbers of elements), in which
+        case all the images are sampled at once and pos_idx and neg_idx are
+        [N, K] Tensors
         """
+        if isinstance(matched_idxs, torch.Tensor):
+            return self._sample_batched(matched_idxs)
+
         pos_idx = []
         neg_idx = []
         for matched_idxs_per_image in matched_idxs:
@@ -71,3 +90,64 @@ class BalancedPositiveNegativeSampler(object):
             neg_idx.append(neg_idx_per_image_mask)
 
         return pos_idx, neg_idx
+
+    def _sample_batched(self, matched_idxs):
+        positive = matched_idxs >= 1
+        negative = matched_idxs == 0
+
+        num_pos = int(self.batch_size_per_image * self.positive_fraction)
+        # protect against not enough positive examples
+        num_pos = positive.sum(dim=1).clamp(max=num_pos)
+        num_neg = self.batch_size_per_image - num_pos
+        # protect against not enough negative examples
+        num_neg = torch.min(negative.sum(dim=1), num_neg)
+
+        if self.random_sample and not self.batched_random_sample:
+            pos_idx, neg_idx = self._select_randperm(positive, num_pos, negative, num_neg)
+        else:
+            pos_idx = self._select(positive, num_pos)
+            neg_idx = self._select(negative, num_neg)
+        return pos_idx.to(torch.uint8), neg_idx.to(torch.uint8)
+
+    def _select_randperm(self, positive, num_pos, negative, num_neg):
+        """
+        Selects the same random candidates as the randperm of each image in
+        the loop over a list: only the draws are done per image, in the same
+        order
+        """
+        device = positive.device
+        counts = torch.stack(
+            [positive.sum(dim=1), num_pos, negative.sum(dim=1), num_neg], dim=1
+        ).tolist()
+        pos_drawn = []
+        neg_drawn = []
+        for num_positive, n_pos, num_negative, n_neg in counts:
+            pos_drawn.append(torch.randperm(num_positive, device=device)[:n_pos])
+            neg_drawn.append(torch.randperm(num_negative, device=device)[:n_neg])
+
+        def select(candidates, num, drawn):
+            # mark the drawn ranks among the candidates of each image
+            rows = torch.arange(len(candidates), device=device).repeat_interleave(num)
+            drawn_ranks = torch.zeros_like(candidates)
+            drawn_ranks[rows, torch.cat(drawn)] = True
+            rank = (candidates.cumsum(dim=1) - 1).clamp(min=0)
+            return candidates & drawn_ranks.gather(1, rank)
+
+        return select(positive, num_pos, pos_drawn), select(negative, num_neg, neg_drawn)
+
+    def _select(self, candidates, num):
+        """
+        Selects num[i] of the candidates of each row i: the first ones, or
+        random ones when random_sample is set
+        """
+        if self.random_sample:
+            # the candidates come first when sorting by random keys in [0, 1)
+            keys = torch.rand(candidates.shape, device=candidates.device)
+            keys[~candidates] = 2
+            order = keys.argsort(dim=1)
+            rank = torch.empty_like(order)
+            positions = torch.arange(candidates.shape[1], device=candidates.device)
+            rank.scatter_(1, order, positions.expand_as(order))
+        else:
+            rank = candidates.cumsum(dim=1) - 1
+        return candidates & (rank < num[:, None])
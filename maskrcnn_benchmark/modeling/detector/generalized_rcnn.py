@@ -8,6 +8,7 @@ from torch import nn
 from maskrcnn_benchmark.structures.image_list import to_image_list
 
 from ..backbone import build_backbone
+from ..image_normalizer import make_image_normalizer
 from ..rpn.rpn import build_rpn
 from ..roi_heads.roi_heads import build_roi_heads
 
@@ -28,6 +29,7 @@ class GeneralizedRCNN(nn.Module):
         self.backbone = build_backbone(cfg)
         self.rpn = build_rpn(cfg)
         self.roi_heads = build_roi_heads(cfg)
+        self.normalizer = make_image_normalizer(cfg)
 
     def forward(self, images, targets=None):
         """
@@ -45,6 +47,9 @@ class GeneralizedRCNN(nn.Module):
         if self.training and targets is None:
             raise ValueError("In training mode, targets should be passed")
         images = to_image_list(images)
+        if images.tensors.dtype == torch.uint8:
+            # the data loader left the normalization to the model
+            images = self.normalizer(images)
         features = self.backbone(images.tensors)
 
         proposals, proposal_losses = self.rpn(images, features, targets)
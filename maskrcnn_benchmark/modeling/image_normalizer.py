@@ -0,0 +1,50 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import torch
+
+from maskrcnn_benchmark.structures.image_list import ImageList
+
+
+class ImageNormalizer(object):
+    """
+    Normalizes a padded batch of uint8 RGB images, as produced by the data
+    loader when INPUT.NORMALIZE_ON_DEVICE is set. This is the batched
+    equivalent of ToTensor + Normalize, applied once on the device after
+    the (4x smaller) uint8 batch has been transferred.
+    """
+
+    def __init__(self, mean, std, to_bgr255=True):
+        self.to_bgr255 = to_bgr255
+        # without to_bgr255, mean and std are given for images in [0, 1]
+        self.scale = 1.0 if to_bgr255 else 255.0
+        self.mean = torch.tensor(mean, dtype=torch.float32).view(1, -1, 1, 1)
+        self.std = torch.tensor(std, dtype=torch.float32).view(1, -1, 1, 1)
+
+    def __call__(self, images):
+        """
+        Arguments:
+            images (ImageList): batch of uint8 images
+
+        Returns:
+            images (ImageList): batch of normalized float images, whose
+                padding is zero as for batches normalized by the transforms
+        """
+        tensors = images.tensors
+        device = tensors.device
+        if self.to_bgr255:
+            tensors = tensors[:, [2, 1, 0]]
+        tensors = tensors.to(torch.float32)
+        if self.scale != 1.0:
+            tensors.div_(self.scale)
+        tensors.sub_(self.mean.to(device)).div_(self.std.to(device))
+
+        # the uint8 batch was padded with zeros before normalization
+        for tensor, (height, width) in zip(tensors, images.image_sizes):
+            tensor[:, height:, :].zero_()
+            tensor[:, :height, width:].zero_()
+        return ImageList(tensors, images.image_sizes)
+
+
+def make_image_normalizer(cfg):
+    return ImageNormalizer(
+        cfg.INPUT.PIXEL_MEAN, cfg.INPUT.PIXEL_STD, cfg.INPUT.TO_BGR255
+    )
@@ -83,6 +83,14 @@ class Matcher(object):
         if self.allow_low_quality_matches:
             all_matches = matches.clone()
 
+        self.apply_thresholds_(matches, matched_vals)
+
+        if self.allow_low_quality_matches:
+            self.set_low_quality_matches_(matches, all_matches, match_quality_matrix)
+
+        return matches
+
+    def apply_thresholds_(self, matches, matched_vals):
         # Assign candidate matches with low quality to negative (unassigned) values
         below_low_threshold = matched_vals < self.low_threshold
         between_thresholds = (matched_vals >= self.low_threshold) & (
@@ -91,8 +99,69 @@ class Matcher(object):
         matches[below_low_threshold] = Matcher.BELOW_LOW_THRESHOLD
         matches[between_thresholds] = Matcher.BETWEEN_THRESHOLDS
 
+    def match_tiled(self, compute_quality, num_predictions, tile_size):
+        """
+        Same as self(compute_quality(0, num_predictions)), but the match
+        quality matrix is computed by tiles of tile_size predictions, so that
+        the memory used is bounded by M x tile_size instead of M x N. Only
+        the best quality of every prediction and of every ground-truth are
+        kept across tiles, and the ties of the low quality matches are found
+        in a second pass over the tiles.
+
+        Args:
+            compute_quality (callable): compute_quality(start, end) returns the
+                pairwise quality between the M ground-truth elements and the
+                predicted elements in [start, end), e.g., their IoU
+            num_predictions (int): N
+            tile_size (int): number of predictions per tile
+        """
+        if num_predictions == 0:
+            raise ValueError(
+                "No proposal boxes available for one of the images "
+                "during training")
+
+        tiles = [
+            (start, min(start + tile_size, num_predictions))
+            for start in range(0, num_predictions, tile_size)
+        ]
+        matched_vals = []
+        matches = []
+        highest_quality_foreach_gt = None
+        for start, end in tiles:
+            match_quality_matrix = compute_quality(start, end)
+            if match_quality_matrix.shape[0] == 0:
+                raise ValueError(
+                    "No ground-truth boxes available for one of the images "
+                    "during training")
+            tile_vals, tile_matches = match_quality_matrix.max(dim=0)
+            matched_vals.append(tile_vals)
+            matches.append(tile_matches)
+            if self.allow_low_quality_matches:
+                tile_highest, _ = match_quality_matrix.max(dim=1)
+                if highest_quality_foreach_gt is None:
+                    highest_quality_foreach_gt = tile_highest
+                else:
+                    highest_quality_foreach_gt = torch.max(
+                        highest_quality_foreach_gt, tile_highest
+                    )
+        matched_vals = torch.cat(matched_vals)
+        matches = torch.cat(matches)
+
         if self.allow_low_quality_matches:
-            self.set_low_quality_matches_(matches, all_matches, match_quality_matrix)
+            all_matches = matches.clone()
+
+        self.apply_thresholds_(matches, matched_vals)
+
+        if self.allow_low_quality_matches:
+            for start, end in tiles:
+                match_quality_matrix = compute_quality(start, end)
+                # predictions that are the best match of a ground-truth,
+                # including ties
+                is_highest = (
+                    match_quality_matrix == highest_quality_foreach_gt[:, None]
+                ).any(dim=0)
+                pred_inds_to_update = torch.nonzero(is_highest).squeeze(1) + start
+                matches[pred_inds_to_update] = all_matches[pred_inds_to_update]
 
         return matches
 
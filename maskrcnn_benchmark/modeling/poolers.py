@@ -77,14 +77,9 @@ class Pooler(nn.Module):
 
     def convert_to_roi_format(self, boxes):
         concat_boxes = cat([b.bbox for b in boxes], dim=0)
-        device, dtype = concat_boxes.device, concat_boxes.dtype
-        ids = cat(
-            [
-                torch.full((len(b), 1), i, dtype=dtype, device=device)
-                for i, b in enumerate(boxes)
-            ],
-            dim=0,
-        )
+        lengths = torch.as_tensor([len(b) for b in boxes], device=concat_boxes.device)
+        ids = torch.arange(len(boxes), device=concat_boxes.device)
+        ids = ids.repeat_interleave(lengths).to(concat_boxes.dtype)[:, None]
         rois = torch.cat([ids, concat_boxes], dim=1)
         return rois
 
@@ -92,7 +87,8 @@ class Pooler(nn.Module):
         """
         Arguments:
             x (list[Tensor]): feature maps for each level
-            boxes (list[BoxList]): boxes to be used to perform the pooling operation.
+            boxes (list[BoxList]): boxes to be used to perform
+                the pooling operation.
         Returns:
             result (Tensor)
         """
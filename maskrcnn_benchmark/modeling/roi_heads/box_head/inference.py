@@ -60,6 +60,11 @@ class PostProcessor(nn.Module):
 
         num_classes = class_prob.shape[1]
 
+        # clip the boxes of all the images at once
+        proposals = self.clip_proposals(
+            proposals.view(-1, 4), boxes_per_image, num_classes, image_shapes
+        ).view(-1, num_classes * 4)
+
         proposals = proposals.split(boxes_per_image, dim=0)
         class_prob = class_prob.split(boxes_per_image, dim=0)
 
@@ -68,11 +73,24 @@ class PostProcessor(nn.Module):
             class_prob, proposals, image_shapes
         ):
             boxlist = self.prepare_boxlist(boxes_per_img, prob, image_shape)
-            boxlist = boxlist.clip_to_image(remove_empty=False)
             boxlist = self.filter_results(boxlist, num_classes)
             results.append(boxlist)
         return results
 
+    def clip_proposals(self, proposals, boxes_per_image, num_classes, image_shapes):
+        """
+        Clips the [sum(boxes_per_image) * num_classes, 4] decoded boxes to
+        their images, as BoxList.clip_to_image(remove_empty=False)
+        """
+        TO_REMOVE = 1
+        max_size = torch.as_tensor(
+            image_shapes, dtype=proposals.dtype, device=proposals.device
+        ) - TO_REMOVE
+        repeats = torch.as_tensor(boxes_per_image, device=proposals.device) * num_classes
+        max_xyxy = max_size.repeat(1, 2).repeat_interleave(repeats, dim=0)
+        proposals.clamp_(min=0)
+        return torch.min(proposals, max_xyxy, out=proposals)
+
     def prepare_boxlist(self, boxes, scores, image_shape):
         """
         Returns BoxList from `boxes` and adds probability scores information
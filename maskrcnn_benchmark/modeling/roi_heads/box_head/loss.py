@@ -12,6 +12,8 @@ from maskrcnn_benchmark.modeling.balanced_positive_negative_sampler import (
     BalancedPositiveNegativeSampler
 )
 from maskrcnn_benchmark.modeling.utils import cat
+from maskrcnn_benchmark.structures.batched_box_list import BatchedBoxList
+from maskrcnn_benchmark.structures.batched_box_list import pad_tensors
 
 
 class FastRCNNLossComputation(object):
@@ -45,32 +47,43 @@ class FastRCNNLossComputation(object):
         return matched_targets
 
     def prepare_targets(self, proposals, targets):
-        labels = []
-        regression_targets = []
+        """
+        Returns the [N, K] labels and the [N, K, 4] regression targets of the
+        proposals, padded to the largest number K of proposals of an image
+        with the label -1: only the matching is done per image
+        """
+        matched_idxs = []
+        matched_labels = []
+        matched_boxes = []
         for proposals_per_image, targets_per_image in zip(proposals, targets):
             matched_targets = self.match_targets_to_proposals(
                 proposals_per_image, targets_per_image
             )
-            matched_idxs = matched_targets.get_field("matched_idxs")
-
-            labels_per_image = matched_targets.get_field("labels")
-            labels_per_image = labels_per_image.to(dtype=torch.int64)
+            matched_idxs.append(matched_targets.get_field("matched_idxs"))
+            matched_labels.append(matched_targets.get_field("labels"))
+            matched_boxes.append(matched_targets.bbox)
 
-            # Label background (below the low threshold)
-            bg_inds = matched_idxs == Matcher.BELOW_LOW_THRESHOLD
-            labels_per_image[bg_inds] = 0
-
-            # Label ignore proposals (between low and high thresholds)
-            ignore_inds = matched_idxs == Matcher.BETWEEN_THRESHOLDS
-            labels_per_image[ignore_inds] = -1  # -1 is ignored by sampler
-
-            # compute regression targets
-            regression_targets_per_image = self.box_coder.encode(
-                matched_targets.bbox, proposals_per_image.bbox
-            )
-
-            labels.append(labels_per_image)
-            regression_targets.append(regression_targets_per_image)
+        matched_idxs = pad_tensors(
+            matched_idxs, padding_value=Matcher.BETWEEN_THRESHOLDS
+        )
+        labels = pad_tensors(matched_labels)
+        labels = labels.to(dtype=torch.int64)
+
+        # Label background (below the low threshold)
+        bg_inds = matched_idxs == Matcher.BELOW_LOW_THRESHOLD
+        labels[bg_inds] = 0
+
+        # Label ignore proposals (between low and high thresholds), and the
+        # padding
+        ignore_inds = matched_idxs == Matcher.BETWEEN_THRESHOLDS
+        labels[ignore_inds] = -1  # -1 is ignored by sampler
+
+        # compute regression targets
+        proposal_boxes = pad_tensors([p.bbox for p in proposals])
+        regression_targets = self.box_coder.encode(
+            pad_tensors(matched_boxes).view(-1, 4), proposal_boxes.view(-1, 4)
+        )
+        regression_targets = regression_targets.view(proposal_boxes.shape)
 
         return labels, regression_targets
 
@@ -86,26 +99,23 @@ class FastRCNNLossComputation(object):
         """
 
         labels, regression_targets = self.prepare_targets(proposals, targets)
+        # sample all the images at once, the padding (-1) is ignored
         sampled_pos_inds, sampled_neg_inds = self.fg_bg_sampler(labels)
 
-        proposals = list(proposals)
         # add corresponding label and regression_targets information to the bounding boxes
-        for labels_per_image, regression_targets_per_image, proposals_per_image in zip(
-            labels, regression_targets, proposals
-        ):
-            proposals_per_image.add_field("labels", labels_per_image)
-            proposals_per_image.add_field(
-                "regression_targets", regression_targets_per_image
-            )
+        proposals = BatchedBoxList.from_boxlists(proposals)
+        proposals.add_field("labels", labels)
+        proposals.add_field("regression_targets", regression_targets)
 
         # distributed sampled proposals, that were obtained on all feature maps
         # concatenated via the fg_bg_sampler, into individual feature map levels
         for img_idx, (pos_inds_img, neg_inds_img) in enumerate(
             zip(sampled_pos_inds, sampled_neg_inds)
         ):
+            num_proposals = proposals.lengths[img_idx]
+            pos_inds_img = pos_inds_img[:num_proposals]
+            neg_inds_img = neg_inds_img[:num_proposals]
             img_sampled_inds = torch.nonzero(pos_inds_img | neg_inds_img).squeeze(1)
-            proposals_per_image = proposals[img_idx][img_sampled_inds]
-            proposals[img_idx] = proposals_per_image
 
             save_dir = './new_dump/box'
             if not os.path.exists(save_dir):
@@ -117,6 +127,7 @@ class FastRCNNLossComputation(object):
             sampled_inds_mask_save_path = save_dir + '/{}_sampled_inds'.format(img_idx)
             numpy.save(sampled_inds_mask_save_path, img_sampled_inds.cpu().detach().numpy())
 
+        proposals = proposals.compact(sampled_pos_inds | sampled_neg_inds).to_boxlists()
         self._proposals = proposals
         return proposals
 
@@ -193,7 +204,8 @@ def make_roi_box_loss_evaluator(cfg):
     box_coder = BoxCoder(weights=bbox_reg_weights)
 
     fg_bg_sampler = BalancedPositiveNegativeSampler(
-        cfg.MODEL.ROI_HEADS.BATCH_SIZE_PER_IMAGE, cfg.MODEL.ROI_HEADS.POSITIVE_FRACTION, cfg.MODEL.ROI_HEADS.RANDOM_SAMPLE
+        cfg.MODEL.ROI_HEADS.BATCH_SIZE_PER_IMAGE, cfg.MODEL.ROI_HEADS.POSITIVE_FRACTION, cfg.MODEL.ROI_HEADS.RANDOM_SAMPLE,
+        cfg.MODEL.ROI_HEADS.BATCHED_RANDOM_SAMPLE,
     )
 
     loss_evaluator = FastRCNNLossComputation(matcher, fg_bg_sampler, box_coder)
@@ -21,7 +21,6 @@ def project_masks_on_boxes(segmentation_masks, proposals, discretization_size):
         segmentation_masks: an instance of SegmentationMask
         proposals: an instance of BoxList
     """
-    masks = []
     M = discretization_size
     device = proposals.bbox.device
     proposals = proposals.convert("xyxy")
@@ -32,17 +31,14 @@ def project_masks_on_boxes(segmentation_masks, proposals, discretization_size):
     # masks is not efficient GPU-wise (possibly several small tensors for
     # representing a single instance mask)
     proposals = proposals.bbox.to(torch.device("cpu"))
-    for segmentation_mask, proposal in zip(segmentation_masks, proposals):
-        # crop the masks, resize them to the desired resolution and
-        # then convert them to the tensor representation,
-        # instead of the list representation that was used
-        cropped_mask = segmentation_mask.crop(proposal)
-        scaled_mask = cropped_mask.resize((M, M))
-        mask = scaled_mask.convert(mode="mask")
-        masks.append(mask)
-    if len(masks) == 0:
+    if len(proposals) == 0:
         return torch.empty(0, dtype=torch.float32, device=device)
-    return torch.stack(masks, dim=0).to(device, dtype=torch.float32)
+    # crop the masks, resize them to the desired resolution and
+    # then convert them to the tensor representation,
+    # instead of the list representation that was used
+    scaled_masks = segmentation_masks.crop_and_resize(proposals, (M, M))
+    masks = scaled_masks.convert(mode="mask")
+    return masks.to(device, dtype=torch.float32)
 
 
 class MaskRCNNLossComputation(object):
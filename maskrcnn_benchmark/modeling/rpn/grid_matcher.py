@@ -0,0 +1,174 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import torch
+
+
+class AnchorGrid(object):
+    """
+    Layout of the anchors of one feature map, as produced by
+    AnchorGenerator.grid_anchors: anchor (y * grid_width + x) * A + a is
+    cell_anchors[a] shifted by (x * stride, y * stride)
+    """
+
+    def __init__(self, grid_height, grid_width, stride, cell_anchors):
+        self.grid_height = grid_height
+        self.grid_width = grid_width
+        self.stride = stride
+        self.cell_anchors = cell_anchors
+
+    def __len__(self):
+        return self.grid_height * self.grid_width * len(self.cell_anchors)
+
+
+def _candidate_pairs(gt_boxes, grid, offset):
+    """
+    Returns the (gt index, anchor index) pairs of the anchors of the grid
+    that can overlap each ground-truth box. The ranges of cells are
+    conservative: the pairs that are not returned have an IoU of 0.
+    """
+    TO_REMOVE = 1
+    stride = float(grid.stride)
+    gt = gt_boxes.double()[:, None, :]
+    cell = grid.cell_anchors.to(gt_boxes.device).double()[None, :, :]
+    # an anchor overlaps a box when anchor_x1 < gt_x2 + 1 and
+    # gt_x1 < anchor_x2 + 1, with one cell of margin for the rounding
+    x_lo = torch.floor((gt[..., 0] - TO_REMOVE - cell[..., 2]) / stride) - 1
+    x_hi = torch.floor((gt[..., 2] + TO_REMOVE - cell[..., 0]) / stride) + 1
+    y_lo = torch.floor((gt[..., 1] - TO_REMOVE - cell[..., 3]) / stride) - 1
+    y_hi = torch.floor((gt[..., 3] + TO_REMOVE - cell[..., 1]) / stride) + 1
+    x_lo = x_lo.clamp(min=0).long()
+    y_lo = y_lo.clamp(min=0).long()
+    x_hi = x_hi.clamp(max=grid.grid_width - 1).long()
+    y_hi = y_hi.clamp(max=grid.grid_height - 1).long()
+    num_x = (x_hi - x_lo + 1).clamp(min=0)
+    num_y = (y_hi - y_lo + 1).clamp(min=0)
+
+    # one row per (gt, cell anchor), enumerate the cells of its range
+    num_cells = (num_x * num_y).reshape(-1)
+    rows = torch.repeat_interleave(
+        torch.arange(len(num_cells), device=gt_boxes.device), num_cells
+    )
+    row_starts = torch.cumsum(num_cells, dim=0) - num_cells
+    k = torch.arange(len(rows), device=gt_boxes.device) - row_starts[rows]
+    num_x = num_x.reshape(-1)[rows]
+    x = x_lo.reshape(-1)[rows] + k % num_x
+    y = y_lo.reshape(-1)[rows] + k // num_x
+
+    num_cell_anchors = len(grid.cell_anchors)
+    gt_inds = rows // num_cell_anchors
+    cell_inds = rows % num_cell_anchors
+    anchor_inds = offset + (y * grid.grid_width + x) * num_cell_anchors + cell_inds
+    return gt_inds, anchor_inds
+
+
+class GridAnchorMatcher(object):
+    """
+    Matches the anchors laid out on grids (see AnchorGrid) to the
+    ground-truth boxes, with the same result as
+    matcher(boxlist_iou(target, anchors)), but computing the IoU only for
+    the anchors close enough to each box to overlap it. The cost grows
+    with the number of boxes times the number of anchors around them,
+    instead of the total number of anchors.
+
+    Returns None when the sparse matching can't give the same result, and
+    the caller must use the dense IoU matrix instead: no boxes or anchors,
+    a non-positive low threshold, a degenerate box, or, when
+    allow_low_quality_matches is set, a box without any overlapping anchor
+    (its best matches are then all the anchors, with an IoU of 0).
+    """
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+
+    def __call__(self, target, anchor, grids):
+        """
+        Arguments:
+            target (BoxList): the ground-truth boxes
+            anchor (BoxList): the anchors of all the grids, concatenated
+            grids (list[AnchorGrid])
+        """
+        matcher = self.matcher
+        num_anchors = len(anchor)
+        gt_boxes = target.bbox
+        if (
+            len(target) == 0
+            or num_anchors == 0
+            or sum(len(grid) for grid in grids) != num_anchors
+            or matcher.low_threshold <= 0
+            or target.mode != "xyxy"
+            or bool((target.area() <= 0).any())
+        ):
+            return None
+
+        gt_inds = []
+        anchor_inds = []
+        offset = 0
+        for grid in grids:
+            level_gt_inds, level_anchor_inds = _candidate_pairs(gt_boxes, grid, offset)
+            gt_inds.append(level_gt_inds)
+            anchor_inds.append(level_anchor_inds)
+            offset += len(grid)
+        gt_inds = torch.cat(gt_inds)
+        anchor_inds = torch.cat(anchor_inds)
+
+        # same operations as boxlist_iou, for the candidate pairs only
+        TO_REMOVE = 1
+        box1 = gt_boxes[gt_inds]
+        box2 = anchor.bbox[anchor_inds]
+        area1 = target.area()[gt_inds]
+        area2 = (box2[:, 2] - box2[:, 0] + TO_REMOVE) * (box2[:, 3] - box2[:, 1] + TO_REMOVE)
+        lt = torch.max(box1[:, :2], box2[:, :2])
+        rb = torch.min(box1[:, 2:], box2[:, 2:])
+        wh = (rb - lt + TO_REMOVE).clamp(min=0)
+        inter = wh[:, 0] * wh[:, 1]
+        iou = inter / (area1 + area2 - inter)
+
+        if matcher.allow_low_quality_matches:
+            highest_quality_foreach_gt = iou.new_zeros(len(target)).scatter_reduce_(
+                0, gt_inds, iou, reduce="amax"
+            )
+            if bool((highest_quality_foreach_gt <= 0).any()):
+                return None
+
+        # the best gt of each anchor, the first one in case of ties, as
+        # Tensor.max; the other pairs have an IoU of 0
+        matched_vals = iou.new_zeros(num_anchors).scatter_reduce_(
+            0, anchor_inds, iou, reduce="amax"
+        )
+        is_best = (iou == matched_vals[anchor_inds]) & (iou > 0)
+        matches = torch.full(
+            (num_anchors,), len(target), dtype=torch.int64, device=gt_boxes.device
+        )
+        matches.scatter_reduce_(0, anchor_inds[is_best], gt_inds[is_best], reduce="amin")
+        matches[matched_vals == 0] = 0
+
+        if matcher.allow_low_quality_matches:
+            all_matches = matches.clone()
+
+        matcher.apply_thresholds_(matches, matched_vals)
+
+        if matcher.allow_low_quality_matches:
+            is_highest = iou == highest_quality_foreach_gt[gt_inds]
+            pred_inds_to_update = anchor_inds[is_highest]
+            matches[pred_inds_to_update] = all_matches[pred_inds_to_update]
+
+        return matches
+
+
+def make_anchor_grids(anchors_per_level, grid_sizes, anchor_strides, num_anchors_per_level):
+    """
+    Returns the AnchorGrids of the anchors of an image.
+
+    Arguments:
+        anchors_per_level (list[BoxList]): the anchors of each feature map
+        grid_sizes (list[tuple[int, int]]): (height, width) of each feature map
+        anchor_strides (list[int])
+        num_anchors_per_level (list[int]): the number of cell anchors
+    """
+    grids = []
+    for anchors, (grid_height, grid_width), stride, num_cell_anchors in zip(
+        anchors_per_level, grid_sizes, anchor_strides, num_anchors_per_level
+    ):
+        # the anchors of the first cell are not shifted
+        cell_anchors = anchors.bbox[:num_cell_anchors]
+        grids.append(AnchorGrid(int(grid_height), int(grid_width), stride, cell_anchors))
+    return grids
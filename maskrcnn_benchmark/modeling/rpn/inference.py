@@ -2,10 +2,9 @@
 import torch
 
 from maskrcnn_benchmark.modeling.box_coder import BoxCoder
-from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.batched_box_list import BatchedBoxList
 from maskrcnn_benchmark.structures.boxlist_ops import cat_boxlist
 from maskrcnn_benchmark.structures.boxlist_ops import boxlist_nms
-from maskrcnn_benchmark.structures.boxlist_ops import remove_small_boxes
 from maskrcnn_benchmark.utils.tensor_saver import get_tensor_saver
 
 from ..utils import cat
@@ -106,12 +105,14 @@ class RPNPostProcessor(torch.nn.Module):
         )
         proposals = proposals.view(N, -1, 4)
 
+        # clip and remove the small boxes of all the images at once, only the
+        # NMS depends on the boxes kept in each image
+        proposals = BatchedBoxList(proposals, [pre_nms_top_n] * N, image_shapes)
+        proposals.add_field("objectness", objectness)
+        proposals = proposals.clip_to_image().remove_small_boxes(self.min_size)
+
         result = []
-        for im_i, (proposal, score, im_shape) in enumerate(zip(proposals, objectness, image_shapes)):
-            boxlist = BoxList(proposal, im_shape, mode="xyxy")
-            boxlist.add_field("objectness", score)
-            boxlist = boxlist.clip_to_image(remove_empty=False)
-            boxlist = remove_small_boxes(boxlist, self.min_size)
+        for im_i, boxlist in enumerate(proposals.to_boxlists()):
             boxlist = boxlist_nms(
                 boxlist,
                 self.nms_thresh,
@@ -9,9 +9,12 @@ from torch.nn import functional as F
 
 from ..balanced_positive_negative_sampler import BalancedPositiveNegativeSampler
 from ..utils import cat
+from .grid_matcher import GridAnchorMatcher
+from .grid_matcher import make_anchor_grids
 
 from maskrcnn_benchmark.layers import smooth_l1_loss
 from maskrcnn_benchmark.modeling.matcher import Matcher
+from maskrcnn_benchmark.structures.batched_box_list import BatchedBoxList
 from maskrcnn_benchmark.structures.boxlist_ops import boxlist_iou
 from maskrcnn_benchmark.structures.boxlist_ops import cat_boxlist
 from maskrcnn_benchmark.utils.tensor_saver import get_tensor_saver
@@ -22,21 +25,49 @@ class RPNLossComputation(object):
     This class computes the RPN loss.
     """
 
-    def __init__(self, proposal_matcher, fg_bg_sampler, box_coder):
+    def __init__(
+        self,
+        proposal_matcher,
+        fg_bg_sampler,
+        box_coder,
+        matcher_tile_size=0,
+        anchor_strides=None,
+    ):
         """
         Arguments:
             proposal_matcher (Matcher)
             fg_bg_sampler (BalancedPositiveNegativeSampler)
             box_coder (BoxCoder)
+            matcher_tile_size (int): if > 0, the IoU with the targets is
+                computed by tiles of this many anchors (see Matcher.match_tiled)
+            anchor_strides (list[int]): if given, the IoU is only computed for
+                the anchors near each target (see GridAnchorMatcher)
         """
         # self.target_preparator = target_preparator
         self.proposal_matcher = proposal_matcher
         self.fg_bg_sampler = fg_bg_sampler
         self.box_coder = box_coder
-
-    def match_targets_to_anchors(self, anchor, target):
+        self.matcher_tile_size = matcher_tile_size
+        self.anchor_strides = anchor_strides
+        self.grid_matcher = GridAnchorMatcher(proposal_matcher)
+
+    def _match_dense(self, anchor, target):
+        if self.matcher_tile_size > 0:
+            return self.proposal_matcher.match_tiled(
+                lambda start, end: boxlist_iou(target, anchor[start:end]),
+                len(anchor),
+                self.matcher_tile_size,
+            )
         match_quality_matrix = boxlist_iou(target, anchor)
-        matched_idxs = self.proposal_matcher(match_quality_matrix)
+        return self.proposal_matcher(match_quality_matrix)
+
+    def match_targets_to_anchors(self, anchor, target, grids=None):
+        matched_idxs = None
+        if grids is not None:
+            # None when the dense IoU matrix is needed
+            matched_idxs = self.grid_matcher(target, anchor, grids)
+        if matched_idxs is None:
+            matched_idxs = self._match_dense(anchor, target)
         # RPN doesn't need any fields from target
         # for creating the labels, so clear them all
         target = target.copy_with_fields([])
@@ -48,31 +79,36 @@ class RPNLossComputation(object):
         matched_targets.add_field("matched_idxs", matched_idxs)
         return matched_targets
 
-    def prepare_targets(self, anchors, targets):
-        labels = []
-        regression_targets = []
+    def prepare_targets(self, anchors, targets, grids=None):
+        """
+        Returns the [N, A] labels and the [N, A, 4] regression targets of the
+        images, which share the anchors: only the matching is done per image
+        """
+        matched_idxs = []
+        matched_boxes = []
         for anchors_per_image, targets_per_image in zip(anchors, targets):
             matched_targets = self.match_targets_to_anchors(
-                anchors_per_image, targets_per_image
+                anchors_per_image, targets_per_image, grids
             )
-
-            matched_idxs = matched_targets.get_field("matched_idxs")
-            labels_per_image = matched_idxs >= 0
-            labels_per_image = labels_per_image.to(dtype=torch.float32)
-            # discard anchors that go out of the boundaries of the image
-            labels_per_image[~anchors_per_image.get_field("visibility")] = -1
-
-            # discard indices that are between thresholds
-            inds_to_discard = matched_idxs == Matcher.BETWEEN_THRESHOLDS
-            labels_per_image[inds_to_discard] = -1
-
-            # compute regression targets
-            regression_targets_per_image = self.box_coder.encode(
-                matched_targets.bbox, anchors_per_image.bbox
-            )
-
-            labels.append(labels_per_image)
-            regression_targets.append(regression_targets_per_image)
+            matched_idxs.append(matched_targets.get_field("matched_idxs"))
+            matched_boxes.append(matched_targets.bbox)
+
+        anchors = BatchedBoxList.from_boxlists(anchors, fields=["visibility"])
+        matched_idxs = torch.stack(matched_idxs)
+        labels = matched_idxs >= 0
+        labels = labels.to(dtype=torch.float32)
+        # discard anchors that go out of the boundaries of the image
+        labels[~anchors.get_field("visibility")] = -1
+
+        # discard indices that are between thresholds
+        inds_to_discard = matched_idxs == Matcher.BETWEEN_THRESHOLDS
+        labels[inds_to_discard] = -1
+
+        # compute regression targets
+        regression_targets = self.box_coder.encode(
+            torch.stack(matched_boxes).view(-1, 4), anchors.bbox.view(-1, 4)
+        )
+        regression_targets = regression_targets.view(anchors.bbox.shape)
 
         return labels, regression_targets
 
@@ -114,9 +150,20 @@ class RPNLossComputation(object):
             box_loss (Tensor)
         """
 
+        grids = None
+        if self.anchor_strides is not None:
+            # all the images have the same anchors
+            grids = make_anchor_grids(
+                anchors[0],
+                [o.shape[-2:] for o in objectness],
+                self.anchor_strides,
+                [o.shape[1] for o in objectness],
+            )
         anchors = [cat_boxlist(anchors_per_image) for anchors_per_image in anchors]
 
-        labels, regression_targets = self.prepare_targets(anchors, targets)
+        labels, regression_targets = self.prepare_targets(anchors, targets, grids)
+        # all the images have the same anchors, so that they can be sampled
+        # at once
         sampled_pos_inds, sampled_neg_inds = self.fg_bg_sampler(labels)
 
         for i, (labels_per_im, regression_targets_per_im) in enumerate(zip(labels, regression_targets)):
@@ -127,8 +174,8 @@ class RPNLossComputation(object):
             get_tensor_saver().save(sampled_pos_inds_per_im, 'sampled_pos_inds', 'rpn', im_idx=i)
             get_tensor_saver().save(sampled_neg_inds_per_im, 'sampled_neg_inds', 'rpn', im_idx=i)
 
-        sampled_pos_inds = torch.nonzero(torch.cat(sampled_pos_inds, dim=0)).squeeze(1)
-        sampled_neg_inds = torch.nonzero(torch.cat(sampled_neg_inds, dim=0)).squeeze(1)
+        sampled_pos_inds = torch.nonzero(sampled_pos_inds.view(-1)).squeeze(1)
+        sampled_neg_inds = torch.nonzero(sampled_neg_inds.view(-1)).squeeze(1)
 
         sampled_inds = torch.cat([sampled_pos_inds, sampled_neg_inds], dim=0)
 
@@ -157,8 +204,8 @@ class RPNLossComputation(object):
         objectness = cat(objectness_flattened, dim=1).reshape(-1)
         box_regression = cat(box_regression_flattened, dim=1).reshape(-1, 4)
 
-        labels = torch.cat(labels, dim=0)
-        regression_targets = torch.cat(regression_targets, dim=0)
+        labels = labels.view(-1)
+        regression_targets = regression_targets.view(-1, 4)
 
         get_tensor_saver().save(box_regression, 'box_regression', 'rpn')
         get_tensor_saver().save(regression_targets, 'regression_targets', 'rpn')
@@ -187,8 +234,19 @@ def make_rpn_loss_evaluator(cfg, box_coder):
     )
 
     fg_bg_sampler = BalancedPositiveNegativeSampler(
-        cfg.MODEL.RPN.BATCH_SIZE_PER_IMAGE, cfg.MODEL.RPN.POSITIVE_FRACTION, cfg.MODEL.RPN.RANDOM_SAMPLE
+        cfg.MODEL.RPN.BATCH_SIZE_PER_IMAGE, cfg.MODEL.RPN.POSITIVE_FRACTION, cfg.MODEL.RPN.RANDOM_SAMPLE,
+        cfg.MODEL.RPN.BATCHED_RANDOM_SAMPLE,
     )
 
-    loss_evaluator = RPNLossComputation(matcher, fg_bg_sampler, box_coder)
+    anchor_strides = None
+    if cfg.MODEL.RPN.SPARSE_MATCHING:
+        anchor_strides = cfg.MODEL.RPN.ANCHOR_STRIDE
+
+    loss_evaluator = RPNLossComputation(
+        matcher,
+        fg_bg_sampler,
+        box_coder,
+        cfg.MODEL.RPN.MATCHER_TILE_SIZE,
+        anchor_strides,
+    )
     return loss_evaluator
@@ -0,0 +1,213 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import torch
+
+from .bounding_box import BoxList
+
+
+def pad_tensors(tensors, padding_value=0):
+    """
+    Stacks tensors of shapes [K_i, ...] into a [N, max(K_i), ...] tensor,
+    filling the missing rows with padding_value
+    """
+    max_len = max([len(t) for t in tensors] + [0])
+    padded = tensors[0].new_full(
+        (len(tensors), max_len) + tuple(tensors[0].shape[1:]), padding_value
+    )
+    for t, p in zip(tensors, padded):
+        p[: len(t)] = t
+    return padded
+
+
+class BatchedBoxList(object):
+    """
+    The bounding boxes of a batch of images, padded to the same number of
+    boxes: bbox is a [N, K, 4] Tensor, and only the first lengths[i] boxes
+    of image i are valid. The extra fields are [N, K, ...] Tensors, padded
+    the same way.
+
+    It lets the operations on all the images of a batch be done at once
+    instead of looping over a list[BoxList], which from_boxlists and
+    to_boxlists convert from and to.
+    """
+
+    def __init__(self, bbox, lengths, image_sizes, mode="xyxy"):
+        if bbox.ndimension() != 3 or bbox.size(-1) != 4:
+            raise ValueError(
+                "bbox should have a shape [N, K, 4], got {}".format(tuple(bbox.shape))
+            )
+        if mode not in ("xyxy", "xywh"):
+            raise ValueError("mode should be 'xyxy' or 'xywh'")
+        self.bbox = bbox
+        self.lengths = list(lengths)
+        self.image_sizes = list(image_sizes)  # (image_width, image_height)
+        self.mode = mode
+        self.extra_fields = {}
+
+    @classmethod
+    def from_boxlists(cls, boxlists, fields=None, padding_value=0):
+        """
+        Arguments:
+            boxlists (list[BoxList]): with the same mode
+            fields (list[str]): the Tensor fields to keep, all by default
+        """
+        mode = boxlists[0].mode
+        batched = cls(
+            pad_tensors([b.convert(mode).bbox for b in boxlists]),
+            [len(b) for b in boxlists],
+            [b.size for b in boxlists],
+            mode,
+        )
+        if fields is None:
+            fields = [
+                k
+                for k, v in boxlists[0].extra_fields.items()
+                if isinstance(v, torch.Tensor)
+            ]
+        for field in fields:
+            batched.add_field(
+                field,
+                pad_tensors([b.get_field(field) for b in boxlists], padding_value),
+            )
+        return batched
+
+    def to_boxlists(self):
+        boxlists = []
+        for i, (length, image_size) in enumerate(zip(self.lengths, self.image_sizes)):
+            boxlist = BoxList(self.bbox[i, :length], image_size, self.mode)
+            for k, v in self.extra_fields.items():
+                boxlist.add_field(k, v[i, :length])
+            boxlists.append(boxlist)
+        return boxlists
+
+    def add_field(self, field, field_data):
+        self.extra_fields[field] = field_data
+
+    def get_field(self, field):
+        return self.extra_fields[field]
+
+    def has_field(self, field):
+        return field in self.extra_fields
+
+    def fields(self):
+        return list(self.extra_fields.keys())
+
+    def valid_mask(self):
+        """
+        Returns a [N, K] bool Tensor, False for the padding
+        """
+        lengths = torch.as_tensor(self.lengths, device=self.bbox.device)
+        positions = torch.arange(self.bbox.shape[1], device=self.bbox.device)
+        return positions[None, :] < lengths[:, None]
+
+    def batch_indices(self):
+        """
+        Returns the index of the image of each valid box, in the order of flat
+        """
+        lengths = torch.as_tensor(self.lengths, device=self.bbox.device)
+        return torch.arange(len(self), device=self.bbox.device).repeat_interleave(
+            lengths
+        )
+
+    def flat(self, tensor=None):
+        """
+        Returns the valid rows of a padded [N, K, ...] Tensor (bbox by
+        default) concatenated, as for a cat of the BoxLists
+        """
+        if tensor is None:
+            tensor = self.bbox
+        if len(self) == 1:
+            return tensor[0, : self.lengths[0]]
+        return tensor[self.valid_mask()]
+
+    def compact(self, keep):
+        """
+        Returns the boxes for which the [N, K] bool Tensor keep is True, moved
+        to the front of the rows of their images in the same order, as
+        indexing each BoxList with keep
+        """
+        keep = keep.to(torch.bool) & self.valid_mask()
+        lengths = keep.sum(dim=1)
+        rows, cols = keep.nonzero().unbind(dim=1)
+        # the position of each kept box in its image
+        positions = (keep.cumsum(dim=1) - 1)[rows, cols]
+        max_len = int(lengths.max()) if len(self) > 0 else 0
+
+        def gather(tensor):
+            compacted = tensor.new_zeros((len(self), max_len) + tuple(tensor.shape[2:]))
+            compacted[rows, positions] = tensor[rows, cols]
+            return compacted
+
+        batched = BatchedBoxList(
+            gather(self.bbox), lengths.tolist(), self.image_sizes, self.mode
+        )
+        for k, v in self.extra_fields.items():
+            batched.add_field(k, gather(v))
+        return batched
+
+    def remove_small_boxes(self, min_size):
+        """
+        Only keeps the boxes with both sides >= min_size, like
+        boxlist_ops.remove_small_boxes on each image
+        """
+        box = self.bbox
+        if self.mode == "xyxy":
+            TO_REMOVE = 1
+            ws = box[..., 2] - box[..., 0] + TO_REMOVE
+            hs = box[..., 3] - box[..., 1] + TO_REMOVE
+        else:
+            ws, hs = box[..., 2], box[..., 3]
+        return self.compact((ws >= min_size) & (hs >= min_size))
+
+    def num_boxes(self):
+        return sum(self.lengths)
+
+    def __len__(self):
+        return self.bbox.shape[0]
+
+    def clip_to_image(self):
+        """
+        Clips the boxes of each image to it, in place, like
+        BoxList.clip_to_image(remove_empty=False)
+        """
+        TO_REMOVE = 1
+        max_size = torch.as_tensor(
+            self.image_sizes, dtype=self.bbox.dtype, device=self.bbox.device
+        ) - TO_REMOVE
+        max_xyxy = max_size.repeat(1, 2)[:, None, :]
+        self.bbox.clamp_(min=0)
+        torch.min(self.bbox, max_xyxy, out=self.bbox)
+        return self
+
+    def area(self):
+        """
+        Returns a [N, K] Tensor, with the padding having a meaningless area
+        """
+        box = self.bbox
+        if self.mode == "xyxy":
+            TO_REMOVE = 1
+            area = (box[..., 2] - box[..., 0] + TO_REMOVE) * (
+                box[..., 3] - box[..., 1] + TO_REMOVE
+            )
+        elif self.mode == "xywh":
+            area = box[..., 2] * box[..., 3]
+        else:
+            raise RuntimeError("Should not be here")
+        return area
+
+    def to(self, device, non_blocking=False):
+        batched = BatchedBoxList(
+            self.bbox.to(device, non_blocking=non_blocking),
+            self.lengths,
+            self.image_sizes,
+            self.mode,
+        )
+        for k, v in self.extra_fields.items():
+            batched.add_field(k, v.to(device, non_blocking=non_blocking))
+        return batched
+
+    def __repr__(self):
+        s = self.__class__.__name__ + "("
+        s += "num_images={}, ".format(len(self))
+        s += "num_boxes={}, ".format(self.num_boxes())
+        s += "mode={})".format(self.mode)
+        return s
@@ -14,11 +14,20 @@ class BoxList(object):
     to an image, we also store the corresponding image dimensions.
     They can contain extra information that is specific to each bounding box, such as
     labels.
+
+    Indexing a BoxList indexes its bbox, but its sliced fields and its
+    non-Tensor fields (e.g., masks) are only indexed when they are first
+    accessed, so that the fields which are never read cost nothing.
     """
 
+    __slots__ = ("bbox", "size", "mode", "_fields", "_pending")
+
     def __init__(self, bbox, image_size, mode="xyxy"):
-        device = bbox.device if isinstance(bbox, torch.Tensor) else torch.device("cpu")
-        bbox = torch.as_tensor(bbox, dtype=torch.float32, device=device)
+        if not (isinstance(bbox, torch.Tensor) and bbox.dtype == torch.float32):
+            device = (
+                bbox.device if isinstance(bbox, torch.Tensor) else torch.device("cpu")
+            )
+            bbox = torch.as_tensor(bbox, dtype=torch.float32, device=device)
         if bbox.ndimension() != 2:
             raise ValueError(
                 "bbox should have 2 dimensions, got {}".format(bbox.ndimension())
@@ -34,23 +43,77 @@ class BoxList(object):
         self.bbox = bbox
         self.size = image_size  # (image_width, image_height)
         self.mode = mode
-        self.extra_fields = {}
+        # field -> data, possibly not indexed yet
+        self._fields = {}
+        # field -> indices still to be applied to its data, in order
+        self._pending = {}
+
+    @classmethod
+    def _create(cls, bbox, image_size, mode):
+        """
+        Constructor without the validation, for a float32 [N, 4] Tensor bbox
+        and a valid mode, e.g., computed from another BoxList
+        """
+        boxlist = cls.__new__(cls)
+        boxlist.bbox = bbox
+        boxlist.size = image_size
+        boxlist.mode = mode
+        boxlist._fields = {}
+        boxlist._pending = {}
+        return boxlist
+
+    @property
+    def extra_fields(self):
+        for field in list(self._pending):
+            self.get_field(field)
+        return self._fields
 
     def add_field(self, field, field_data):
-        self.extra_fields[field] = field_data
+        self._fields[field] = field_data
+        self._pending.pop(field, None)
 
     def get_field(self, field):
-        return self.extra_fields[field]
+        data = self._fields[field]
+        if field in self._pending:
+            for item in self._pending.pop(field):
+                data = data[item]
+            self._fields[field] = data
+        return data
 
     def has_field(self, field):
-        return field in self.extra_fields
+        return field in self._fields
 
     def fields(self):
-        return list(self.extra_fields.keys())
+        return list(self._fields.keys())
+
+    def _copy_field(self, bbox, field):
+        self._fields[field] = bbox._fields[field]
+        if field in bbox._pending:
+            self._pending[field] = bbox._pending[field]
+        else:
+            self._pending.pop(field, None)
 
     def _copy_extra_fields(self, bbox):
-        for k, v in bbox.extra_fields.items():
-            self.extra_fields[k] = v
+        for k in bbox._fields:
+            self._copy_field(bbox, k)
+
+    def _copy_transformed_fields(self, bbox, transform):
+        """
+        Copies the fields of bbox, with the non-Tensor ones (e.g., masks)
+        passed through transform. The Tensor fields stay lazily indexed.
+        """
+        for k, v in list(bbox._fields.items()):
+            if isinstance(v, torch.Tensor):
+                self._copy_field(bbox, k)
+            else:
+                self.add_field(k, transform(bbox.get_field(k)))
+
+    def __getstate__(self):
+        return self.bbox, self.size, self.mode, self.extra_fields
+
+    def __setstate__(self, state):
+        self.bbox, self.size, self.mode, self._fields = state
+        self._pending = {}
 
     def convert(self, mode):
         if mode not in ("xyxy", "xywh"):
@@ -62,13 +125,13 @@ class BoxList(object):
         xmin, ymin, xmax, ymax = self._split_into_xyxy()
         if mode == "xyxy":
             bbox = torch.cat((xmin, ymin, xmax, ymax), dim=-1)
-            bbox = BoxList(bbox, self.size, mode=mode)
+            bbox = BoxList._create(bbox, self.size, mode)
         else:
             TO_REMOVE = 1
             bbox = torch.cat(
                 (xmin, ymin, xmax - xmin + TO_REMOVE, ymax - ymin + TO_REMOVE), dim=-1
             )
-            bbox = BoxList(bbox, self.size, mode=mode)
+            bbox = BoxList._create(bbox, self.size, mode)
         bbox._copy_extra_fields(self)
         return bbox
 
@@ -100,12 +163,10 @@ class BoxList(object):
         if ratios[0] == ratios[1]:
             ratio = ratios[0]
             scaled_box = self.bbox * ratio
-            bbox = BoxList(scaled_box, size, mode=self.mode)
-            # bbox._copy_extra_fields(self)
-            for k, v in self.extra_fields.items():
-                if not isinstance(v, torch.Tensor):
-                    v = v.resize(size, *args, **kwargs)
-                bbox.add_field(k, v)
+            bbox = BoxList._create(scaled_box, size, self.mode)
+            bbox._copy_transformed_fields(
+                self, lambda v: v.resize(size, *args, **kwargs)
+            )
             return bbox
 
         ratio_width, ratio_height = ratios
@@ -117,12 +178,8 @@ class BoxList(object):
         scaled_box = torch.cat(
             (scaled_xmin, scaled_ymin, scaled_xmax, scaled_ymax), dim=-1
         )
-        bbox = BoxList(scaled_box, size, mode="xyxy")
-        # bbox._copy_extra_fields(self)
-        for k, v in self.extra_fields.items():
-            if not isinstance(v, torch.Tensor):
-                v = v.resize(size, *args, **kwargs)
-            bbox.add_field(k, v)
+        bbox = BoxList._create(scaled_box, size, "xyxy")
+        bbox._copy_transformed_fields(self, lambda v: v.resize(size, *args, **kwargs))
 
         return bbox.convert(self.mode)
 
@@ -156,12 +213,8 @@ class BoxList(object):
         transposed_boxes = torch.cat(
             (transposed_xmin, transposed_ymin, transposed_xmax, transposed_ymax), dim=-1
         )
-        bbox = BoxList(transposed_boxes, self.size, mode="xyxy")
-        # bbox._copy_extra_fields(self)
-        for k, v in self.extra_fields.items():
-            if not isinstance(v, torch.Tensor):
-                v = v.transpose(method)
-            bbox.add_field(k, v)
+        bbox = BoxList._create(transposed_boxes, self.size, "xyxy")
+        bbox._copy_transformed_fields(self, lambda v: v.transpose(method))
         return bbox.convert(self.mode)
 
     def crop(self, box):
@@ -185,27 +238,46 @@ class BoxList(object):
             (cropped_xmin, cropped_ymin, cropped_xmax, cropped_ymax), dim=-1
         )
         bbox = BoxList(cropped_box, (w, h), mode="xyxy")
-        # bbox._copy_extra_fields(self)
-        for k, v in self.extra_fields.items():
-            if not isinstance(v, torch.Tensor):
-                v = v.crop(box)
-            bbox.add_field(k, v)
+        bbox._copy_transformed_fields(self, lambda v: v.crop(box))
         return bbox.convert(self.mode)
 
     # Tensor-like methods
 
-    def to(self, device):
-        bbox = BoxList(self.bbox.to(device), self.size, self.mode)
+    def to(self, device, non_blocking=False):
+        bbox = BoxList._create(
+            self.bbox.to(device, non_blocking=non_blocking), self.size, self.mode
+        )
         for k, v in self.extra_fields.items():
-            if hasattr(v, "to"):
+            if isinstance(v, torch.Tensor):
+                v = v.to(device, non_blocking=non_blocking)
+            elif hasattr(v, "to"):
                 v = v.to(device)
             bbox.add_field(k, v)
         return bbox
 
     def __getitem__(self, item):
-        bbox = BoxList(self.bbox[item], self.size, self.mode)
-        for k, v in self.extra_fields.items():
-            bbox.add_field(k, v[item])
+        boxes = self.bbox[item]
+        if boxes.ndimension() != 2:
+            # e.g., an integer index, which the constructor rejects
+            return BoxList(boxes, self.size, self.mode)
+        bbox = BoxList._create(boxes, self.size, self.mode)
+        pending = self._pending
+        if isinstance(item, slice):
+            # the indexed fields are views either way
+            bbox._fields = dict(self._fields)
+            bbox._pending = {k: pending.get(k, ()) + (item,) for k in self._fields}
+            return bbox
+        # advanced indexing returns copies: the Tensor fields are indexed now,
+        # so that later in-place writes to them or to the index don't show in
+        # the result. The other fields (e.g., masks) are not modified in place,
+        # and are indexed when read, with a copy of the index
+        item_copy = _copy_index(item)
+        for k, v in self._fields.items():
+            if isinstance(v, torch.Tensor) or item_copy is None:
+                bbox._fields[k] = self.get_field(k)[item]
+            else:
+                bbox._fields[k] = v
+                bbox._pending[k] = pending.get(k, ()) + (item_copy,)
         return bbox
 
     def __len__(self):
@@ -236,11 +308,11 @@ class BoxList(object):
         return area
 
     def copy_with_fields(self, fields):
-        bbox = BoxList(self.bbox, self.size, self.mode)
+        bbox = BoxList._create(self.bbox, self.size, self.mode)
         if not isinstance(fields, (list, tuple)):
             fields = [fields]
         for field in fields:
-            bbox.add_field(field, self.get_field(field))
+            bbox._copy_field(self, field)
         return bbox
 
     def __repr__(self):
@@ -252,6 +324,17 @@ class BoxList(object):
         return s
 
 
+def _copy_index(item):
+    """
+    Returns a copy of a Tensor or list index, or None for the other indices
+    """
+    if isinstance(item, torch.Tensor):
+        return item.clone()
+    if isinstance(item, list):
+        return list(item)
+    return None
+
+
 if __name__ == "__main__":
     bbox = BoxList([[0, 0, 10, 10], [0, 0, 5, 5]], (10, 10))
     s_bbox = bbox.resize((5, 5))
@@ -123,7 +123,7 @@ def cat_boxlist(bboxes):
     fields = set(bboxes[0].fields())
     assert all(set(bbox.fields()) == fields for bbox in bboxes)
 
-    cat_boxes = BoxList(_cat([bbox.bbox for bbox in bboxes], dim=0), size, mode)
+    cat_boxes = BoxList._create(_cat([bbox.bbox for bbox in bboxes], dim=0), size, mode)
 
     for field in fields:
         data = _cat([bbox.get_field(field) for bbox in bboxes], dim=0)
@@ -0,0 +1,179 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import torch
+
+from .bounding_box import BoxList
+from .bounding_box import FLIP_LEFT_RIGHT
+from .segmentation_mask import SegmentationMask
+
+
+class DeferredBoxList(object):
+    """
+    Wraps a BoxList, and records the resize and the horizontal flip applied
+    to it instead of applying them. apply_deferred_transforms then applies
+    them to the boxes and the polygons of all the targets of a batch at
+    once, with the same float32 operations as BoxList.resize and
+    BoxList.transpose.
+
+    Only a resize followed by a flip can be recorded: any other use (another
+    transform, or reading the boxes) applies the pending transforms first.
+    """
+
+    def __init__(self, boxlist):
+        self.boxlist = boxlist
+        self.size = boxlist.size
+        # (ratio_width, ratio_height) of the pending resize
+        self.ratios = None
+        # width of the image when the pending flip was applied
+        self.flip_width = None
+
+    def resize(self, size, *args, **kwargs):
+        if (
+            self.ratios is not None
+            or self.flip_width is not None
+            or args
+            or kwargs
+            or not _can_defer(self.boxlist)
+        ):
+            return DeferredBoxList(self.materialize().resize(size, *args, **kwargs))
+        self.ratios = tuple(
+            float(s) / float(s_orig) for s, s_orig in zip(size, self.size)
+        )
+        self.size = size
+        return self
+
+    def transpose(self, method):
+        if (
+            method != FLIP_LEFT_RIGHT
+            or self.flip_width is not None
+            or not _can_defer(self.boxlist)
+        ):
+            return DeferredBoxList(self.materialize().transpose(method))
+        self.flip_width = self.size[0]
+        return self
+
+    def has_pending_transforms(self):
+        return self.ratios is not None or self.flip_width is not None
+
+    def materialize(self):
+        """
+        Returns the BoxList with the pending transforms applied
+        """
+        return apply_deferred_transforms([self])[0]
+
+    def __len__(self):
+        return len(self.boxlist)
+
+    def __getattr__(self, name):
+        if name.startswith("__") or name == "boxlist":
+            # e.g., while unpickling
+            raise AttributeError(name)
+        # anything else needs the transformed BoxList
+        return getattr(self.materialize(), name)
+
+    def __repr__(self):
+        s = self.__class__.__name__ + "("
+        s += "num_boxes={}, ".format(len(self))
+        s += "ratios={}, ".format(self.ratios)
+        s += "flip_width={})".format(self.flip_width)
+        return s
+
+
+def _can_defer(boxlist):
+    if boxlist.mode != "xyxy":
+        return False
+    for field in boxlist.fields():
+        # the lazily indexed fields are only read for the masks
+        if field == "masks":
+            if not isinstance(boxlist.get_field(field), SegmentationMask):
+                return False
+        elif not isinstance(boxlist._fields[field], torch.Tensor):
+            return False
+    return True
+
+
+def apply_deferred_transforms(targets):
+    """
+    Returns the targets with the pending transforms of the DeferredBoxLists
+    applied, as BoxLists. The boxes of all the targets are transformed in a
+    single pass, and the polygons of their masks in another one.
+
+    Arguments:
+        targets (list[BoxList or DeferredBoxList])
+    """
+    targets = list(targets)
+    deferred = []
+    for i, target in enumerate(targets):
+        if isinstance(target, DeferredBoxList):
+            if target.has_pending_transforms():
+                deferred.append(i)
+            else:
+                targets[i] = target.boxlist
+    if not deferred:
+        return targets
+
+    boxlists = [targets[i].boxlist for i in deferred]
+    boxes = torch.cat([b.bbox for b in boxlists], dim=0)
+    device = boxes.device
+    ratios = torch.tensor(
+        [targets[i].ratios or (1.0, 1.0) for i in deferred],
+        dtype=torch.float32,
+        device=device,
+    )
+    flips = torch.tensor(
+        [targets[i].flip_width is not None for i in deferred], device=device
+    )
+    widths = torch.tensor(
+        [targets[i].flip_width or 0 for i in deferred],
+        dtype=torch.float32,
+        device=device,
+    )
+    TO_REMOVE = 1
+
+    # boxes
+    counts = torch.as_tensor([len(b) for b in boxlists], device=device)
+    boxes = boxes * ratios.repeat(1, 2).repeat_interleave(counts, dim=0)
+    box_widths = widths.repeat_interleave(counts)
+    flipped = torch.stack(
+        [
+            box_widths - boxes[:, 2] - TO_REMOVE,
+            boxes[:, 1],
+            box_widths - boxes[:, 0] - TO_REMOVE,
+            boxes[:, 3],
+        ],
+        dim=1,
+    )
+    boxes = torch.where(flips.repeat_interleave(counts)[:, None], flipped, boxes)
+    boxes = boxes.split(counts.tolist())
+
+    # polygons: every polygon has an even number of coordinates, so the x
+    # coordinates are at the even positions of their concatenation
+    with_masks = [j for j, b in enumerate(boxlists) if b.has_field("masks")]
+    masks = [boxlists[j].get_field("masks") for j in with_masks]
+    new_coords = {}
+    if masks:
+        coords = torch.cat([m.coords for m in masks])
+        mask_device = coords.device
+        num_coords = torch.as_tensor([len(m.coords) for m in masks], device=mask_device)
+        with_masks = torch.as_tensor(with_masks, device=device)
+        mask_ratios = ratios[with_masks].to(mask_device)
+        mask_flips = flips[with_masks].to(mask_device)
+        mask_widths = widths[with_masks].to(mask_device)
+        coords = coords * mask_ratios.repeat_interleave(num_coords // 2, dim=0).reshape(-1)
+        is_x = torch.arange(len(coords), device=mask_device) % 2 == 0
+        coord_flips = mask_flips.repeat_interleave(num_coords) & is_x
+        coord_widths = mask_widths.repeat_interleave(num_coords)
+        coords = torch.where(coord_flips, coord_widths - coords - TO_REMOVE, coords)
+        new_coords = dict(zip(with_masks.tolist(), coords.split(num_coords.tolist())))
+
+    for j, i in enumerate(deferred):
+        size = targets[i].size
+        boxlist = boxlists[j]
+        result = BoxList._create(boxes[j], size, "xyxy")
+        for field in boxlist.fields():
+            if field == "masks":
+                mask = boxlist.get_field(field)
+                result.add_field(field, mask._with_coords(new_coords[j], size))
+            else:
+                result._copy_field(boxlist, field)
+        targets[i] = result
+    return targets
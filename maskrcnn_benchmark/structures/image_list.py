@@ -26,13 +26,16 @@ class ImageList(object):
         return ImageList(cast_tensor, self.image_sizes)
 
 
-def to_image_list(tensors, size_divisible=0):
+def to_image_list(tensors, size_divisible=0, out=None):
     """
     tensors can be an ImageList, a torch.Tensor or
     an iterable of Tensors. It can't be a numpy array.
     When tensors is an iterable of Tensors, it pads
     the Tensors with zeros so that they have the same
-    shape
+    shape.
+    If out (a 1D tensor with at least as many elements as the
+    padded batch) is given, the batch is a contiguous view of it,
+    and only the padding is zeroed instead of the whole batch
     """
     if isinstance(tensors, torch.Tensor) and size_divisible > 0:
         tensors = [tensors]
@@ -59,9 +62,21 @@ def to_image_list(tensors, size_divisible=0):
             max_size = tuple(max_size)
 
         batch_shape = (len(tensors),) + max_size
-        batched_imgs = tensors[0].new(*batch_shape).zero_()
-        for img, pad_img in zip(tensors, batched_imgs):
-            pad_img[: img.shape[0], : img.shape[1], : img.shape[2]].copy_(img)
+        if out is None:
+            batched_imgs = tensors[0].new(*batch_shape).zero_()
+            for img, pad_img in zip(tensors, batched_imgs):
+                pad_img[: img.shape[0], : img.shape[1], : img.shape[2]].copy_(img)
+        else:
+            numel = 1
+            for s in batch_shape:
+                numel *= s
+            batched_imgs = out[:numel].view(batch_shape)
+            for img, pad_img in zip(tensors, batched_imgs):
+                c, h, w = img.shape
+                pad_img[:c, :h, :w].copy_(img)
+                pad_img[c:].zero_()
+                pad_img[:c, h:, :].zero_()
+                pad_img[:c, :h, w:].zero_()
 
         image_sizes = [im.shape[-2:] for im in tensors]
 
@@ -1,4 +1,7 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import itertools
+
+import numpy
 import torch
 
 import pycocotools.mask as mask_utils
@@ -143,9 +146,64 @@ class Polygons(object):
         return s
 
 
+def index_ranges(starts, lengths):
+    """
+    Concatenation of the index ranges [starts[i], starts[i] + lengths[i])
+    """
+    total = int(lengths.sum())
+    if total == 0:
+        return starts.new_empty((0,))
+    range_starts = torch.cumsum(lengths, dim=0) - lengths
+    offsets = torch.repeat_interleave(starts - range_starts, lengths)
+    return torch.arange(total, dtype=torch.int64) + offsets
+
+
+def lengths_to_offsets(lengths):
+    offsets = lengths.new_zeros((len(lengths) + 1,))
+    torch.cumsum(lengths, dim=0, out=offsets[1:])
+    return offsets
+
+
+def _pack_polygons(polygons):
+    """
+    Flattens a list of instances, each being a list of polygons, into a
+    single coordinate tensor plus polygon and instance offsets
+    """
+    flat = []
+    instance_lengths = []
+    for instance in polygons:
+        if isinstance(instance, Polygons):
+            instance = instance.polygons
+        instance_lengths.append(len(instance))
+        flat.extend(instance)
+    poly_lengths = torch.as_tensor([len(p) for p in flat], dtype=torch.int64)
+    if all(isinstance(p, list) for p in flat):
+        coords = torch.tensor(
+            list(itertools.chain.from_iterable(flat)), dtype=torch.float32
+        )
+    elif len(flat) > 0:
+        coords = torch.cat(
+            [torch.as_tensor(p, dtype=torch.float32).reshape(-1) for p in flat]
+        )
+    else:
+        coords = torch.empty(0, dtype=torch.float32)
+    instance_lengths = torch.as_tensor(instance_lengths, dtype=torch.int64)
+    return (
+        coords,
+        lengths_to_offsets(poly_lengths),
+        lengths_to_offsets(instance_lengths),
+    )
+
+
 class SegmentationMask(object):
     """
-    This class stores the segmentations for all objects in the image
+    This class stores the segmentations for all objects in the image.
+
+    The polygons of all the instances are packed in a single tensor of
+    coordinates (x0, y0, x1, y1, ...), together with the offsets of every
+    polygon in that tensor and the offsets of the polygons of every instance,
+    so that geometric transforms and indexing are vectorized tensor
+    operations instead of loops over many small tensors.
     """
 
     def __init__(self, polygons, size, mode=None):
@@ -158,57 +216,195 @@ class SegmentationMask(object):
         """
         assert isinstance(polygons, list)
 
-        self.polygons = [Polygons(p, size, mode) for p in polygons]
+        self.coords, self.poly_offsets, self.instance_offsets = _pack_polygons(
+            polygons
+        )
         self.size = size
         self.mode = mode
 
+    @classmethod
+    def from_packed(cls, coords, poly_offsets, instance_offsets, size, mode=None):
+        """
+        Arguments:
+            coords (Tensor[float32]): the coordinates of all the polygons
+            poly_offsets (Tensor[int64]): polygon k is coords[poly_offsets[k]:
+                poly_offsets[k + 1]]
+            instance_offsets (Tensor[int64]): instance i is made of the polygons
+                instance_offsets[i] to instance_offsets[i + 1]
+        """
+        mask = cls.__new__(cls)
+        mask.coords = coords
+        mask.poly_offsets = poly_offsets
+        mask.instance_offsets = instance_offsets
+        mask.size = size
+        mask.mode = mode
+        return mask
+
+    def _with_coords(self, coords, size):
+        return SegmentationMask.from_packed(
+            coords, self.poly_offsets, self.instance_offsets, size, self.mode
+        )
+
+    @property
+    def polygons(self):
+        return list(self)
+
     def transpose(self, method):
         if method not in (FLIP_LEFT_RIGHT, FLIP_TOP_BOTTOM):
             raise NotImplementedError(
                 "Only FLIP_LEFT_RIGHT and FLIP_TOP_BOTTOM implemented"
             )
 
-        flipped = []
-        for polygon in self.polygons:
-            flipped.append(polygon.transpose(method))
-        return SegmentationMask(flipped, size=self.size, mode=self.mode)
+        width, height = self.size
+        if method == FLIP_LEFT_RIGHT:
+            dim = width
+            idx = 0
+        elif method == FLIP_TOP_BOTTOM:
+            dim = height
+            idx = 1
+
+        # every polygon has an even number of coordinates, so the x (resp. y)
+        # coordinates of all the polygons are at the even (resp. odd) positions
+        flipped = self.coords.clone()
+        TO_REMOVE = 1
+        flipped[idx::2] = dim - self.coords[idx::2] - TO_REMOVE
+        return self._with_coords(flipped, self.size)
 
     def crop(self, box):
         w, h = box[2] - box[0], box[3] - box[1]
-        cropped = []
-        for polygon in self.polygons:
-            cropped.append(polygon.crop(box))
-        return SegmentationMask(cropped, size=(w, h), mode=self.mode)
+        cropped = self.coords.clone()
+        cropped[0::2] = cropped[0::2] - box[0]  # .clamp(min=0, max=w)
+        cropped[1::2] = cropped[1::2] - box[1]  # .clamp(min=0, max=h)
+        return self._with_coords(cropped, (w, h))
 
     def resize(self, size, *args, **kwargs):
-        scaled = []
-        for polygon in self.polygons:
-            scaled.append(polygon.resize(size, *args, **kwargs))
-        return SegmentationMask(scaled, size=size, mode=self.mode)
+        ratios = tuple(float(s) / float(s_orig) for s, s_orig in zip(size, self.size))
+        if ratios[0] == ratios[1]:
+            return self._with_coords(self.coords * ratios[0], size)
+
+        ratio_w, ratio_h = ratios
+        scaled = self.coords.clone()
+        scaled[0::2] *= ratio_w
+        scaled[1::2] *= ratio_h
+        return self._with_coords(scaled, size)
+
+    def _coord_to_instance(self):
+        num_polys_per_instance = self.instance_offsets[1:] - self.instance_offsets[:-1]
+        poly_to_instance = torch.repeat_interleave(
+            torch.arange(len(self)), num_polys_per_instance
+        )
+        return torch.repeat_interleave(
+            poly_to_instance, self.poly_offsets[1:] - self.poly_offsets[:-1]
+        )
+
+    def crop_and_resize(self, boxes, size):
+        """
+        Crops every instance i with boxes[i] and resizes the result to `size`,
+        which is equivalent to calling `crop` and `resize` on every instance
+        separately, but done in a single pass over the coordinates.
+
+        Arguments:
+            boxes (Tensor): Nx4 boxes in xyxy format, one for each instance
+            size (tuple[int, int]): (width, height) of the output
+        """
+        assert len(boxes) == len(self), "{} boxes for {} instances".format(
+            len(boxes), len(self)
+        )
+        boxes = boxes.to(self.coords.device)
+        # same clamping as Polygons.crop
+        widths = (boxes[:, 2] - boxes[:, 0]).clamp(min=1)
+        heights = (boxes[:, 3] - boxes[:, 1]).clamp(min=1)
+        # ratios are computed in double precision, as Polygons.resize does
+        ratio_w = (float(size[0]) / widths.double()).float()
+        ratio_h = (float(size[1]) / heights.double()).float()
+
+        coord_to_instance = self._coord_to_instance()
+        x_inds = coord_to_instance[0::2]
+        y_inds = coord_to_instance[1::2]
+        scaled = self.coords.clone()
+        scaled[0::2] = (scaled[0::2] - boxes[x_inds, 0]) * ratio_w[x_inds]
+        scaled[1::2] = (scaled[1::2] - boxes[y_inds, 1]) * ratio_h[y_inds]
+        return self._with_coords(scaled, size)
+
+    def convert(self, mode):
+        """
+        Rasterizes all the instances. Returns a NxHxW uint8 tensor for
+        mode == "mask".
+        """
+        width, height = self.size
+        if mode != "mask":
+            return
+        if len(self) == 0:
+            return torch.empty((0, height, width), dtype=torch.uint8)
+        poly_lengths = self.poly_offsets[1:] - self.poly_offsets[:-1]
+        polys_per_instance = self.instance_offsets[1:] - self.instance_offsets[:-1]
+        if bool((poly_lengths <= 4).any()) or bool((polys_per_instance == 0).any()):
+            # let Polygons handle the corner cases of pycocotools
+            return torch.stack([p.convert(mode) for p in self], dim=0)
+
+        coords = self.coords.numpy()
+        poly_offsets = self.poly_offsets.tolist()
+        polys = [
+            coords[start:end] for start, end in zip(poly_offsets[:-1], poly_offsets[1:])
+        ]
+        rles = mask_utils.frPyObjects(polys, height, width)
+        instance_offsets = self.instance_offsets.tolist()
+        rles = [
+            mask_utils.merge(rles[start:end])
+            for start, end in zip(instance_offsets[:-1], instance_offsets[1:])
+        ]
+        masks = mask_utils.decode(rles)
+        return torch.from_numpy(numpy.ascontiguousarray(masks.transpose(2, 0, 1)))
 
     def to(self, *args, **kwargs):
         return self
 
     def __getitem__(self, item):
-        if isinstance(item, (int, slice)):
-            selected_polygons = [self.polygons[item]]
+        if isinstance(item, int):
+            if item < 0:
+                item += len(self)
+            item = torch.as_tensor([item], dtype=torch.int64)
+        elif isinstance(item, slice):
+            item = torch.arange(len(self))[item]
         else:
-            # advanced indexing on a single dimension
-            selected_polygons = []
-            if isinstance(item, torch.Tensor) and item.dtype == torch.uint8:
+            item = torch.as_tensor(item)
+            if item.dtype in (torch.uint8, torch.bool):
                 item = item.nonzero()
-                item = item.squeeze(1) if item.numel() > 0 else item
-                item = item.tolist()
-            for i in item:
-                selected_polygons.append(self.polygons[i])
-        return SegmentationMask(selected_polygons, size=self.size, mode=self.mode)
+                item = item.squeeze(1) if item.numel() > 0 else item.reshape(-1)
+            item = item.to(dtype=torch.int64, device=torch.device("cpu")).reshape(-1)
+
+        # gather the polygons of the selected instances, and then their
+        # coordinates
+        instance_starts = self.instance_offsets[item]
+        num_polys = self.instance_offsets[item + 1] - instance_starts
+        poly_ids = index_ranges(instance_starts, num_polys)
+        poly_starts = self.poly_offsets[poly_ids]
+        poly_lengths = self.poly_offsets[poly_ids + 1] - poly_starts
+        coords = self.coords[index_ranges(poly_starts, poly_lengths)]
+        return SegmentationMask.from_packed(
+            coords,
+            lengths_to_offsets(poly_lengths),
+            lengths_to_offsets(num_polys),
+            self.size,
+            self.mode,
+        )
+
+    def __len__(self):
+        return len(self.instance_offsets) - 1
 
     def __iter__(self):
-        return iter(self.polygons)
+        poly_offsets = self.poly_offsets.tolist()
+        instance_offsets = self.instance_offsets.tolist()
+        for start, end in zip(instance_offsets[:-1], instance_offsets[1:]):
+            polygons = [
+                self.coords[poly_offsets[k] : poly_offsets[k + 1]]
+                for k in range(start, end)
+            ]
+            yield Polygons(polygons, size=self.size, mode=self.mode)
 
     def __repr__(self):
         s = self.__class__.__name__ + "("
-        s += "num_instances={}, ".format(len(self.polygons))
+        s += "num_instances={}, ".format(len(self))
         s += "image_width={}, ".format(self.size[0])
         s += "image_height={})".format(self.size[1])
         return s
@@ -0,0 +1,53 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import unittest
+
+import torch
+
+from maskrcnn_benchmark.modeling.balanced_positive_negative_sampler import (
+    BalancedPositiveNegativeSampler
+)
+from maskrcnn_benchmark.structures.batched_box_list import pad_tensors
+
+
+class TestBalancedPositiveNegativeSampler(unittest.TestCase):
+    def setUp(self):
+        generator = torch.Generator().manual_seed(0)
+        self.matched_idxs = [
+            torch.randint(-1, 3, (n,), generator=generator) for n in (50, 7, 0, 30)
+        ]
+
+    def check_same_samples(self, sampler, seed=None):
+        if seed is not None:
+            torch.manual_seed(seed)
+        pos, neg = sampler(self.matched_idxs)
+        if seed is not None:
+            torch.manual_seed(seed)
+        batched_pos, batched_neg = sampler(pad_tensors(self.matched_idxs, -1))
+        for i, m in enumerate(self.matched_idxs):
+            self.assertTrue(torch.equal(batched_pos[i, : len(m)], pos[i]))
+            self.assertTrue(torch.equal(batched_neg[i, : len(m)], neg[i]))
+            self.assertEqual(int(batched_pos[i, len(m):].sum()), 0)
+            self.assertEqual(int(batched_neg[i, len(m):].sum()), 0)
+
+    def test_first_samples(self):
+        self.check_same_samples(BalancedPositiveNegativeSampler(16, 0.25, False))
+
+    def test_random_samples(self):
+        # the same draws as for the list of the images
+        self.check_same_samples(BalancedPositiveNegativeSampler(16, 0.25, True), 3)
+
+    def test_batched_random_samples(self):
+        pos, neg = BalancedPositiveNegativeSampler(16, 0.25, False)(self.matched_idxs)
+        sampler = BalancedPositiveNegativeSampler(16, 0.25, True, True)
+        padded = pad_tensors(self.matched_idxs, -1)
+        batched_pos, batched_neg = sampler(padded)
+        for i, (p, n) in enumerate(zip(pos, neg)):
+            # the same number of elements is drawn among the same candidates
+            self.assertEqual(int(batched_pos[i].sum()), int(p.sum()))
+            self.assertEqual(int(batched_neg[i].sum()), int(n.sum()))
+            self.assertTrue((padded[i][batched_pos[i].bool()] >= 1).all())
+            self.assertTrue((padded[i][batched_neg[i].bool()] == 0).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import unittest
+
+import torch
+
+from maskrcnn_benchmark.structures.batched_box_list import BatchedBoxList
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+
+
+def _make_boxlists():
+    torch.manual_seed(0)
+    boxlists = []
+    for num_boxes, size in [(5, (40, 30)), (0, (20, 50)), (3, (64, 64))]:
+        xy = torch.rand(num_boxes, 2) * 50 - 10
+        wh = torch.rand(num_boxes, 2) * 40
+        boxlist = BoxList(torch.cat([xy, xy + wh], dim=1), size)
+        boxlist.add_field("labels", torch.arange(num_boxes) + 1)
+        boxlists.append(boxlist)
+    return boxlists
+
+
+class TestBatchedBoxList(unittest.TestCase):
+    def check_boxlists(self, boxlists, expected):
+        self.assertEqual(len(boxlists), len(expected))
+        for boxlist, expected_boxlist in zip(boxlists, expected):
+            self.assertEqual(boxlist.size, expected_boxlist.size)
+            self.assertTrue(torch.equal(boxlist.bbox, expected_boxlist.bbox))
+            self.assertTrue(
+                torch.equal(
+                    boxlist.get_field("labels"), expected_boxlist.get_field("labels")
+                )
+            )
+
+    def test_round_trip(self):
+        boxlists = _make_boxlists()
+        batched = BatchedBoxList.from_boxlists(boxlists)
+        self.assertEqual(tuple(batched.bbox.shape), (3, 5, 4))
+        self.assertEqual(batched.num_boxes(), 8)
+        self.check_boxlists(batched.to_boxlists(), boxlists)
+        self.assertTrue(
+            torch.equal(batched.flat(), torch.cat([b.bbox for b in boxlists]))
+        )
+        self.assertTrue(
+            torch.equal(
+                batched.flat(batched.area()), torch.cat([b.area() for b in boxlists])
+            )
+        )
+        self.assertEqual(batched.batch_indices().tolist(), [0] * 5 + [2] * 3)
+
+    def test_clip_to_image(self):
+        boxlists = _make_boxlists()
+        batched = BatchedBoxList.from_boxlists(boxlists).clip_to_image()
+        expected = [b.clip_to_image(remove_empty=False) for b in boxlists]
+        self.check_boxlists(batched.to_boxlists(), expected)
+
+    def test_compact(self):
+        boxlists = _make_boxlists()
+        batched = BatchedBoxList.from_boxlists(boxlists)
+        keep = torch.zeros(3, 5, dtype=torch.bool)
+        keep[0, [1, 3, 4]] = True
+        # the padding is never kept
+        keep[1, 0] = True
+        keep[2, 2] = True
+        compacted = batched.compact(keep)
+        self.assertEqual(compacted.lengths, [3, 0, 1])
+        expected = [boxlists[0][[1, 3, 4]], boxlists[1], boxlists[2][[2]]]
+        self.check_boxlists(compacted.to_boxlists(), expected)
+
+    def test_remove_small_boxes(self):
+        boxlists = _make_boxlists()
+        batched = BatchedBoxList.from_boxlists(boxlists).remove_small_boxes(15)
+        expected = []
+        for boxlist in boxlists:
+            _, _, ws, hs = boxlist.convert("xywh").bbox.unbind(dim=1)
+            expected.append(boxlist[((ws >= 15) & (hs >= 15)).nonzero().squeeze(1)])
+        self.assertLess(batched.num_boxes(), 8)
+        self.check_boxlists(batched.to_boxlists(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
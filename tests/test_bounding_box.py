@@ -0,0 +1,87 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import pickle
+import unittest
+
+import torch
+
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.bounding_box import FLIP_LEFT_RIGHT
+from maskrcnn_benchmark.structures.segmentation_mask import SegmentationMask
+
+
+def _make_boxlist():
+    boxes = torch.tensor(
+        [[0, 0, 10, 10], [1, 2, 5, 6], [3, 3, 9, 4], [4, 0, 7, 7]], dtype=torch.float32
+    )
+    boxlist = BoxList(boxes, (20, 15))
+    boxlist.add_field("labels", torch.tensor([1, 2, 3, 4]))
+    polygons = [[[i, 0, 5, 0, 5, 5]] for i in range(4)]
+    boxlist.add_field("masks", SegmentationMask(polygons, (20, 15)))
+    return boxlist
+
+
+class TestBoxList(unittest.TestCase):
+    def test_lazy_indexing(self):
+        boxlist = _make_boxlist()
+        sliced = boxlist[torch.tensor([3, 1, 0])][1:]
+        self.assertEqual(sliced.fields(), ["labels", "masks"])
+        self.assertEqual(sliced.get_field("labels").tolist(), [2, 1])
+        self.assertEqual(
+            sliced.get_field("masks").coords.tolist(), [1, 0, 5, 0, 5, 5, 0, 0, 5, 0, 5, 5]
+        )
+        # the fields of the original are not modified
+        self.assertEqual(boxlist.get_field("labels").tolist(), [1, 2, 3, 4])
+
+        flipped = boxlist[torch.tensor([2])].transpose(FLIP_LEFT_RIGHT)
+        self.assertEqual(flipped.bbox.tolist(), [[10, 3, 16, 4]])
+        self.assertEqual(flipped.get_field("labels").tolist(), [3])
+
+        copied = boxlist[1:3].copy_with_fields("labels")
+        self.assertEqual(copied.fields(), ["labels"])
+        self.assertEqual(copied.get_field("labels").tolist(), [2, 3])
+
+    def test_indexing_copies(self):
+        boxlist = _make_boxlist()
+        keep = torch.tensor([True, False, True, False])
+        sliced = boxlist[keep]
+        # in-place writes to the index
+        keep[1] = True
+        self.assertEqual(len(sliced), 2)
+        self.assertEqual(sliced.get_field("labels").tolist(), [1, 3])
+        self.assertEqual(len(sliced.get_field("masks")), 2)
+
+        # in-place writes to the fields of the indexed BoxList
+        labels = boxlist.get_field("labels")
+        idx = torch.tensor([0, 3])
+        indexed = boxlist[idx]
+        labels[0] = 99
+        self.assertEqual(indexed.get_field("labels").tolist(), [1, 4])
+
+    def test_add_field_replaces_pending(self):
+        sliced = _make_boxlist()[:2]
+        sliced.add_field("labels", torch.tensor([7, 8]))
+        self.assertEqual(sliced.get_field("labels").tolist(), [7, 8])
+
+    def test_pickle(self):
+        sliced = _make_boxlist()[torch.tensor([0, 2])]
+        loaded = pickle.loads(pickle.dumps(sliced))
+        self.assertTrue(torch.equal(loaded.bbox, sliced.bbox))
+        self.assertEqual(loaded.get_field("labels").tolist(), [1, 3])
+        self.assertEqual(len(loaded.get_field("masks")), 2)
+
+    def test_convert(self):
+        boxlist = _make_boxlist()
+        self.assertIs(boxlist.convert("xyxy"), boxlist)
+        round_trip = boxlist.convert("xywh").convert("xyxy")
+        self.assertTrue(torch.equal(round_trip.bbox, boxlist.bbox))
+        self.assertEqual(round_trip.get_field("labels").tolist(), [1, 2, 3, 4])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            BoxList(torch.zeros(3), (10, 10))
+        with self.assertRaises(ValueError):
+            _make_boxlist()[0]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+from PIL import Image
+
+from maskrcnn_benchmark.data.datasets.coco import COCODataset
+
+
+def _write_coco(data_dir):
+    rng = np.random.RandomState(0)
+    # the category ids are not contiguous nor sorted, and 90 is removed
+    # with its images
+    categories = [{"id": i, "name": str(i)} for i in (7, 2, 18, 90)]
+    images = []
+    annotations = []
+
+    def add_annotation(img_id, width, height, category_id, iscrowd):
+        x, y = rng.uniform(-5, width), rng.uniform(-5, height)
+        w, h = rng.uniform(0, 20, size=2).tolist()
+        if iscrowd:
+            segmentation = {"counts": [0, 10, 20], "size": [height, width]}
+        else:
+            segmentation = [rng.uniform(0, 30, size=6).tolist()]
+        annotations.append({
+            "id": len(annotations) + 1,
+            "image_id": img_id,
+            "bbox": [x, y, w, h],
+            "category_id": category_id,
+            "iscrowd": iscrowd,
+            "area": w * h,
+            "segmentation": segmentation,
+        })
+
+    # the images are listed in another order than their ids
+    for img_id in (12, 3, 7, 1, 30, 4, 9, 25):
+        width, height = int(rng.randint(20, 40)), int(rng.randint(20, 40))
+        file_name = "{}.png".format(img_id)
+        pixels = rng.randint(0, 256, size=(height, width, 3)).astype(np.uint8)
+        Image.fromarray(pixels).save(os.path.join(data_dir, file_name))
+        images.append({"id": img_id, "file_name": file_name, "width": width, "height": height})
+        if img_id == 3:
+            # no annotations
+            continue
+        if img_id == 7:
+            # only crowd annotations
+            add_annotation(img_id, width, height, 2, 1)
+            continue
+        if img_id == 30:
+            add_annotation(img_id, width, height, 90, 0)
+        for _ in range(rng.randint(1, 5)):
+            category_id = int(rng.choice([7, 2, 18]))
+            add_annotation(img_id, width, height, category_id, int(rng.rand() < 0.3))
+
+    ann_file = os.path.join(data_dir, "annotations.json")
+    with open(ann_file, "w") as f:
+        json.dump({"images": images, "annotations": annotations, "categories": categories}, f)
+    return ann_file
+
+
+class TestCocoAnnotationIndex(unittest.TestCase):
+    def setUp(self):
+        # COCODataset creates a dump directory in the working directory
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)
+        self.ann_file = _write_coco(self.tmp_dir)
+        self.cache_dir = os.path.join(self.tmp_dir, "cache")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir)
+
+    def check_target(self, target, expected):
+        self.assertEqual(target.size, expected.size)
+        self.assertEqual(target.mode, expected.mode)
+        self.assertTrue(torch.allclose(target.bbox, expected.bbox))
+        self.assertTrue(torch.equal(target.get_field("labels"), expected.get_field("labels")))
+        masks = target.get_field("masks")
+        expected_masks = expected.get_field("masks")
+        self.assertEqual(len(masks), len(expected_masks))
+        for polygons, expected_polygons in zip(masks, expected_masks):
+            for poly, expected_poly in zip(polygons.polygons, expected_polygons.polygons):
+                self.assertTrue(torch.allclose(poly, expected_poly))
+
+    def test_same_as_pycocotools(self):
+        for remove_images_without_annotations in (False, True):
+            for use_contiguous_category_id in (False, True):
+                expected = COCODataset(
+                    self.ann_file, self.tmp_dir, remove_images_without_annotations,
+                    use_contiguous_category_id=use_contiguous_category_id,
+                )
+                # built once, then loaded
+                for _ in range(2):
+                    dataset = COCODataset(
+                        self.ann_file, self.tmp_dir, remove_images_without_annotations,
+                        use_contiguous_category_id=use_contiguous_category_id,
+                        ann_cache_dir=self.cache_dir,
+                    )
+                    self.check_dataset(dataset, expected)
+
+        ids = COCODataset(self.ann_file, self.tmp_dir, True, ann_cache_dir=self.cache_dir).ids
+        # the image without annotations and the one of category 90 are
+        # removed, the image with only crowd annotations is kept
+        self.assertEqual(ids, [1, 4, 7, 9, 12, 25])
+
+    def check_dataset(self, dataset, expected):
+        self.assertEqual(dataset.ids, expected.ids)
+        self.assertEqual(
+            dataset.json_category_id_to_contiguous_id,
+            expected.json_category_id_to_contiguous_id,
+        )
+        self.assertEqual(
+            dataset.contiguous_category_id_to_json_id,
+            expected.contiguous_category_id_to_json_id,
+        )
+        for idx in range(len(expected)):
+            img_info = expected.get_img_info(idx)
+            self.assertEqual(
+                dataset.get_img_info(idx),
+                {k: img_info[k] for k in ("id", "file_name", "width", "height")},
+            )
+            self.assertEqual(dataset.get_image_path(idx), expected.get_image_path(idx))
+            self.assertEqual(
+                dataset.get_num_annotations(idx), expected.get_num_annotations(idx)
+            )
+            self.check_target(dataset.get_groundtruth(idx), expected.get_groundtruth(idx))
+            img, target, _ = dataset[idx]
+            expected_img, expected_target, _ = expected[idx]
+            self.assertTrue(np.array_equal(np.asarray(img), np.asarray(expected_img)))
+            self.check_target(target, expected_target)
+
+    def test_cached_dataset_attributes(self):
+        dataset = COCODataset(self.ann_file, self.tmp_dir, False, ann_cache_dir=self.cache_dir)
+        self.assertIsNone(dataset._coco)
+        self.assertEqual(dataset.root, self.tmp_dir)
+        self.assertIsNone(dataset.transform)
+        self.assertIsNone(dataset.target_transform)
+        self.assertIn("Number of datapoints: 7", repr(dataset))
+        # the json file is parsed on demand
+        self.assertEqual(sorted(dataset.coco.imgs), [1, 3, 4, 7, 9, 12, 25, 30])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+
+from maskrcnn_benchmark.data.datasets.coco_annotation_index import CocoAnnotationIndex
+from maskrcnn_benchmark.data.datasets.coco_targets import CocoTargets
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.segmentation_mask import SegmentationMask
+
+
+class _FakeCOCO(object):
+    def __init__(self, imgs, anns, cat_ids):
+        self.imgs = imgs
+        self.imgToAnns = {}
+        for ann in anns:
+            self.imgToAnns.setdefault(ann["image_id"], []).append(ann)
+        self.cat_ids = cat_ids
+
+    def getCatIds(self):
+        return self.cat_ids
+
+
+def _make_index():
+    rng = np.random.RandomState(0)
+    imgs = {}
+    anns = []
+    for img_id in range(1, 21):
+        width, height = int(rng.randint(20, 60)), int(rng.randint(20, 60))
+        imgs[img_id] = {"width": width, "height": height, "file_name": "x.jpg"}
+        for _ in range(rng.randint(0, 5)):
+            # boxes partly outside of the image, some of them empty
+            x, y = rng.uniform(-10, width + 5), rng.uniform(-10, height + 5)
+            w, h = rng.choice([0.5, 1.0, 7.25, 30.0], size=2)
+            iscrowd = int(rng.rand() < 0.2)
+            if iscrowd:
+                segmentation = {"counts": "abc", "size": [height, width]}
+            else:
+                segmentation = [
+                    rng.uniform(0, 50, size=2 * rng.randint(3, 6)).tolist()
+                    for _ in range(rng.randint(1, 3))
+                ]
+            anns.append({
+                "image_id": img_id,
+                "bbox": [x, y, w, h],
+                "category_id": int(rng.choice([1, 3, 7])),
+                "iscrowd": iscrowd,
+                "segmentation": segmentation,
+            })
+    return CocoAnnotationIndex.from_coco(_FakeCOCO(imgs, anns, [1, 3, 7]))
+
+
+def _reference_target(index, row, category_lut):
+    # what COCODataset does without the compiled targets
+    boxes, classes, iscrowd, masks = index.get_annotations(row)
+    keep = iscrowd == 0
+    size = tuple(index.image_sizes[row].tolist())
+    target = BoxList(torch.from_numpy(boxes[keep]), size, mode="xywh").convert("xyxy")
+    target.add_field("labels", torch.tensor(category_lut[classes[keep]].tolist()))
+    masks = [m for m, k in zip(masks, keep) if k]
+    target.add_field("masks", SegmentationMask(masks, size))
+    return target.clip_to_image(remove_empty=True)
+
+
+class TestCocoTargets(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_same_as_reference(self):
+        index = _make_index()
+        category_lut = np.array([0, 1, 0, 2, 0, 0, 0, 3])
+        targets = CocoTargets.load_or_compile(index, self.tmp_dir + "/index")
+        num_objects = 0
+        for row in range(len(index)):
+            size = tuple(index.image_sizes[row].tolist())
+            target = targets.get_target(row, size, category_lut)
+            expected = _reference_target(index, row, category_lut)
+            self.assertTrue(torch.equal(target.bbox, expected.bbox))
+            self.assertTrue(
+                torch.equal(target.get_field("labels"), expected.get_field("labels"))
+            )
+            masks = target.get_field("masks")
+            expected_masks = expected.get_field("masks")
+            self.assertTrue(torch.equal(masks.coords, expected_masks.coords))
+            self.assertTrue(
+                torch.equal(masks.poly_offsets, expected_masks.poly_offsets)
+            )
+            self.assertTrue(
+                torch.equal(masks.instance_offsets, expected_masks.instance_offsets)
+            )
+            num_objects += len(target)
+        self.assertEqual(num_objects, targets.target_offsets[-1])
+        self.assertGreater(num_objects, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
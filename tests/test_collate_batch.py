@@ -0,0 +1,100 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import time
+import unittest
+
+import torch
+from torch import nn
+
+from maskrcnn_benchmark.config import cfg as default_cfg
+from maskrcnn_benchmark.data.build import _make_buffer_pool
+from maskrcnn_benchmark.data.collate_batch import BatchCollator
+from maskrcnn_benchmark.data.collate_batch import ImageBufferPool
+from maskrcnn_benchmark.engine.inference import compute_on_dataset
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+
+
+class _IndexDataset(object):
+    # the images are filled with their index
+    def __len__(self):
+        return 24
+
+    def __getitem__(self, idx):
+        image = torch.full((3, 20, 30), float(idx))
+        return image, BoxList(torch.zeros(1, 4), (30, 20)), idx
+
+
+class _SlowModel(nn.Module):
+    # lets the DataPrefetcher fill its queue
+    def __init__(self):
+        super(_SlowModel, self).__init__()
+        self.seen = []
+
+    def forward(self, images):
+        time.sleep(0.02)
+        self.seen.extend(
+            (image.min().item(), image.max().item()) for image in images.tensors
+        )
+        return [BoxList(torch.zeros(0, 4), (30, 20)) for _ in images.tensors]
+
+
+class TestBatchCollator(unittest.TestCase):
+    def create_batch(self, sizes, dtype):
+        return [
+            (torch.randint(1, 255, (3, h, w)).to(dtype), None, i)
+            for i, (h, w) in enumerate(sizes)
+        ]
+
+    def test_buffer_pool(self):
+        collator = BatchCollator(32)
+        pooled_collator = BatchCollator(32, ImageBufferPool(2, 100))
+        for dtype in (torch.float32, torch.uint8):
+            # the buffers are reused with stale content and other shapes
+            for sizes in (
+                [(100, 120), (90, 130)],
+                [(60, 40)],
+                [(70, 50), (30, 20), (65, 66)],
+                [(20, 30), (64, 64)],
+            ):
+                batch = self.create_batch(sizes, dtype)
+                images = collator(batch)[0]
+                pooled_images = pooled_collator(batch)[0]
+                self.assertTrue(pooled_images.tensors.is_contiguous())
+                self.assertTrue(torch.equal(images.tensors, pooled_images.tensors))
+                self.assertEqual(images.image_sizes, pooled_images.image_sizes)
+
+    def test_live_batches_not_overwritten(self):
+        pool = ImageBufferPool(1, 100)
+        pooled_collator = BatchCollator(32, pool)
+        batches = [self.create_batch([(40, 50)], torch.uint8) for _ in range(3)]
+        # all the batches are alive, e.g., in the queue of a DataPrefetcher
+        pooled_images = [pooled_collator(batch)[0] for batch in batches]
+        for batch, images in zip(batches, pooled_images):
+            expected = BatchCollator(32)(batch)[0]
+            self.assertTrue(torch.equal(images.tensors, expected.tensors))
+
+        # a released buffer is reused
+        buffer = pool.buffers[0]
+        del pooled_images, images
+        pooled_collator(batches[0])
+        self.assertIs(pool.buffers[0], buffer)
+
+    def test_inference_prefetching(self):
+        cfg = default_cfg.clone()
+        cfg.DATALOADER.NUM_WORKERS = 2
+        cfg.DATALOADER.PREFETCH_BATCHES = 4
+        cfg.DATALOADER.COLLATE_BUFFER_POOL_SIZE = 1
+        cfg.INPUT.MAX_SIZE_TEST = 32
+        # the queue of the DataPrefetcher holds batches collated by the
+        # workers, which must not reuse their buffers
+        collator = BatchCollator(32, _make_buffer_pool(cfg, False, 1))
+        data_loader = torch.utils.data.DataLoader(
+            _IndexDataset(), batch_size=1, num_workers=2, collate_fn=collator
+        )
+        model = _SlowModel()
+        compute_on_dataset(model, data_loader, "cpu", cfg.DATALOADER.PREFETCH_BATCHES)
+        expected = [(0.0, float(i)) for i in range(len(_IndexDataset()))]
+        self.assertEqual(model.seen, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
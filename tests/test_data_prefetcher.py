@@ -0,0 +1,45 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import unittest
+
+import torch
+
+from maskrcnn_benchmark.data.prefetcher import DataPrefetcher
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.image_list import to_image_list
+
+
+class TestDataPrefetcher(unittest.TestCase):
+    def create_batches(self, num_batches):
+        return [
+            (
+                to_image_list([torch.rand(3, 10, 12)]),
+                [BoxList(torch.rand(2, 4), (12, 10))],
+                (i,),
+            )
+            for i in range(num_batches)
+        ]
+
+    def test_same_batches(self):
+        batches = self.create_batches(5)
+        prefetcher = DataPrefetcher(batches, "cpu", num_prefetch=2)
+        self.assertEqual(len(prefetcher), 5)
+        for _ in range(2):
+            result = list(prefetcher)
+            self.assertEqual(len(result), len(batches))
+            for (images, targets, idxs), expected in zip(result, batches):
+                self.assertTrue(torch.equal(images.tensors, expected[0].tensors))
+                self.assertTrue(torch.equal(targets[0].bbox, expected[1][0].bbox))
+                self.assertEqual(idxs, expected[2])
+            self.assertGreaterEqual(prefetcher.stall_time, 0)
+
+    def test_exception(self):
+        class FailingLoader(object):
+            def __iter__(self):
+                raise RuntimeError("failed")
+
+        with self.assertRaises(RuntimeError):
+            list(DataPrefetcher(FailingLoader(), "cpu"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,13 +3,25 @@ import itertools
 import random
 import unittest
 
+import torch
 from torch.utils.data.sampler import BatchSampler
 from torch.utils.data.sampler import Sampler
 from torch.utils.data.sampler import SequentialSampler
 from torch.utils.data.sampler import RandomSampler
 
+from maskrcnn_benchmark.data.build import make_cost_balanced_batch_sampler
+from maskrcnn_benchmark.data.build import make_data_sampler
+from maskrcnn_benchmark.data.samplers import DistributedSampler
 from maskrcnn_benchmark.data.samplers import GroupedBatchSampler
 from maskrcnn_benchmark.data.samplers import IterationBasedBatchSampler
+from maskrcnn_benchmark.data.samplers import ReadAheadBatchSampler
+from maskrcnn_benchmark.data.samplers import ShapeBucketedBatchSampler
+from maskrcnn_benchmark.data.samplers.cost_balanced_batch_sampler import (
+    balance_batch,
+)
+from maskrcnn_benchmark.data.samplers.shape_bucketed_batch_sampler import (
+    compute_padding_waste,
+)
 
 
 class SubsetSampler(Sampler):
@@ -23,6 +35,31 @@ class SubsetSampler(Sampler):
         return len(self.indices)
 
 
+def _reference_grouped_batches(sampled_ids, group_ids, batch_size, drop_uneven):
+    # the algorithm of GroupedBatchSampler before it was vectorized
+    sampled_ids = torch.as_tensor(sampled_ids)
+    group_ids = torch.as_tensor(group_ids)
+    order = torch.full((len(group_ids),), -1, dtype=torch.int64)
+    order[sampled_ids] = torch.arange(len(sampled_ids))
+    mask = order >= 0
+    clusters = [(group_ids == i) & mask for i in torch.unique(group_ids).sort(0)[0]]
+    relative_order = [order[cluster] for cluster in clusters]
+    permutation_ids = [s[s.sort()[1]] for s in relative_order]
+    permuted_clusters = [sampled_ids[idx] for idx in permutation_ids]
+    splits = [c.split(batch_size) for c in permuted_clusters]
+    merged = tuple(itertools.chain.from_iterable(splits))
+    first_element_of_batch = [t[0].item() for t in merged]
+    inv_sampled_ids_map = {v: k for k, v in enumerate(sampled_ids.tolist())}
+    first_index_of_batch = torch.as_tensor(
+        [inv_sampled_ids_map[s] for s in first_element_of_batch]
+    )
+    permutation_order = first_index_of_batch.sort(0)[1].tolist()
+    batches = [merged[i].tolist() for i in permutation_order]
+    if drop_uneven:
+        batches = [batch for batch in batches if len(batch) == batch_size]
+    return batches
+
+
 class TestGroupedBatchSampler(unittest.TestCase):
     def test_respect_order_simple(self):
         drop_uneven = False
@@ -108,6 +145,50 @@ class TestGroupedBatchSampler(unittest.TestCase):
         expected = [[0, 6, 1]]
         self.assertEqual(result, expected)
 
+    def test_same_as_reference(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            dataset_size = rng.randint(1, 60)
+            group_ids = [rng.randint(0, 3) for _ in range(dataset_size)]
+            # every group has a sampled element, some elements are sampled
+            # twice, e.g., with the padding of DistributedSampler
+            sampled_ids = rng.sample(range(dataset_size), rng.randint(1, dataset_size))
+            sampled_ids += rng.sample(sampled_ids, rng.randint(0, len(sampled_ids)))
+            rng.shuffle(sampled_ids)
+            group_ids = [
+                group_ids[i] if i in sampled_ids else group_ids[sampled_ids[0]]
+                for i in range(dataset_size)
+            ]
+            for batch_size in (1, 2, 5):
+                for drop_uneven in (False, True):
+                    batch_sampler = GroupedBatchSampler(
+                        SubsetSampler(sampled_ids), group_ids, batch_size, drop_uneven
+                    )
+                    expected = _reference_grouped_batches(
+                        sampled_ids, group_ids, batch_size, drop_uneven
+                    )
+                    self.assertEqual(list(batch_sampler), expected)
+                    self.assertEqual(len(batch_sampler), len(expected))
+
+    def test_group_without_sampled_elements(self):
+        group_ids = [0, 1, 2, 0, 1, 2, 0, 1, 2]
+        sampled_ids = [4, 0, 3, 1, 7, 6]
+        # the previous algorithm failed on an empty group
+        with self.assertRaises(IndexError):
+            _reference_grouped_batches(sampled_ids, group_ids, 2, False)
+        # the empty group is skipped: same batches as without it
+        expected = _reference_grouped_batches(sampled_ids, [0, 1, 0] * 3, 2, False)
+        self.assertEqual(expected, [[4, 1], [0, 3], [7], [6]])
+        for drop_uneven in (False, True):
+            batch_sampler = GroupedBatchSampler(
+                SubsetSampler(sampled_ids), group_ids, 2, drop_uneven
+            )
+            self.assertEqual(list(batch_sampler), expected[: 2 if drop_uneven else 4])
+
+        batch_sampler = GroupedBatchSampler(SubsetSampler([]), group_ids, 2)
+        self.assertEqual(list(batch_sampler), [])
+        self.assertEqual(len(batch_sampler), 0)
+
     def test_len(self):
         batch_size = 3
         drop_uneven = True
@@ -127,6 +208,37 @@ class TestGroupedBatchSampler(unittest.TestCase):
         self.assertEqual(len(result), len(batch_sampler))
 
 
+class TestShapeBucketedBatchSampler(unittest.TestCase):
+    def test_buckets(self):
+        image_shapes = [
+            [800, 1000], [800, 1333], [800, 1010], [1333, 800],
+            [800, 1300], [1200, 800], [800, 1020], [800, 1340],
+        ]
+        sampler = SequentialSampler(image_shapes)
+
+        batch_sampler = ShapeBucketedBatchSampler(
+            sampler, image_shapes, 2, size_divisible=32, min_bucket_size=2
+        )
+        result = list(batch_sampler)
+        self.assertEqual(result, [[0, 2], [1, 4], [3, 5], [6], [7]])
+        self.assertEqual(len(result), len(batch_sampler))
+
+        grouped_result = [[0, 1], [2, 4], [3, 5], [6, 7]]
+        self.assertLess(
+            batch_sampler.padding_waste,
+            compute_padding_waste(image_shapes, grouped_result, 32),
+        )
+
+    def test_sort_by_shape(self):
+        image_shapes = [[800, 1000], [1333, 800], [800, 1333], [800, 1010]]
+        sampler = SequentialSampler(image_shapes)
+
+        batch_sampler = ShapeBucketedBatchSampler(
+            sampler, image_shapes, 2, size_divisible=32, sort_by_shape=True
+        )
+        self.assertEqual(list(batch_sampler), [[0, 3], [2], [1]])
+
+
 class TestIterationBasedBatchSampler(unittest.TestCase):
     def test_number_of_iters_and_elements(self):
         for batch_size in [2, 3, 4]:
@@ -148,6 +260,101 @@ class TestIterationBasedBatchSampler(unittest.TestCase):
                         expected = [x for x in range(start, end)]
                         self.assertEqual(batch, expected)
 
+    def test_resume(self):
+        dataset = list(range(23))
+        group_ids = [i % 3 == 0 for i in dataset]
+
+        def make_batch_sampler(start_iter=0):
+            sampler = DistributedSampler(dataset, num_replicas=1, rank=0)
+            batch_sampler = GroupedBatchSampler(sampler, group_ids, 4)
+            return IterationBasedBatchSampler(batch_sampler, 40, start_iter)
+
+        batches = list(make_batch_sampler())
+        for start_iter in [0, 3, 7, 8, 20, 39]:
+            # the batches after start_iter are sampled ahead of time
+            iter_sampler = make_batch_sampler()
+            sampled = list(itertools.islice(iter_sampler, start_iter + 3))
+            self.assertEqual(sampled, batches[: start_iter + 3])
+            state = iter_sampler.state_dict(start_iter)
+
+            resumed_sampler = make_batch_sampler(start_iter)
+            resumed_sampler.load_state_dict(state)
+            self.assertEqual(list(resumed_sampler), batches[start_iter:])
+
+    def test_seeded_from_torch(self):
+        dataset = list(range(23))
+
+        def make_batch_sampler(seed, start_iter=0):
+            torch.manual_seed(seed)
+            sampler = make_data_sampler(dataset, shuffle=True, distributed=False)
+            batch_sampler = BatchSampler(sampler, 4, drop_last=False)
+            return IterationBasedBatchSampler(batch_sampler, 20, start_iter)
+
+        batches = list(make_batch_sampler(0))
+        self.assertEqual(list(make_batch_sampler(0)), batches)
+        self.assertNotEqual(list(make_batch_sampler(1)), batches)
+
+        # the seed of the sampler is resumed, whatever the torch RNG
+        iter_sampler = make_batch_sampler(0)
+        list(itertools.islice(iter_sampler, 12))
+        resumed_sampler = make_batch_sampler(2, 9)
+        resumed_sampler.load_state_dict(iter_sampler.state_dict(9))
+        self.assertEqual(list(resumed_sampler), batches[9:])
+
+
+class TestReadAheadBatchSampler(unittest.TestCase):
+    def test_read_ahead(self):
+        sampler = RandomSampler(range(20))
+        batch_sampler = BatchSampler(sampler, 3, drop_last=False)
+        batch_sampler = IterationBasedBatchSampler(batch_sampler, 10)
+        requested = []
+
+        def get_image_path(idx):
+            requested.append(idx)
+            return "/nonexistent/{}.jpg".format(idx)
+
+        read_ahead_sampler = ReadAheadBatchSampler(batch_sampler, get_image_path, 2)
+        self.assertEqual(len(read_ahead_sampler), 10)
+        num_requested = []
+        batches = []
+        for batch in read_ahead_sampler:
+            batches.append(batch)
+            num_requested.append(len(requested))
+        self.assertEqual(len(batches), 10)
+        # the images of the 2 next batches were requested already
+        self.assertEqual(requested, list(itertools.chain(*batches)))
+        for i, n in enumerate(num_requested):
+            self.assertEqual(n, len(list(itertools.chain(*batches[: i + 3]))))
+
+
+class TestCostBalancedBatchSampler(unittest.TestCase):
+    def test_balance_batch(self):
+        costs = [10, 1, 1, 1, 9, 2, 1, 1]
+        ranks = balance_batch(costs, 2)
+        self.assertEqual(ranks.tolist().count(0), 4)
+        loads = [sum(c for c, r in zip(costs, ranks) if r == k) for k in range(2)]
+        self.assertEqual(sorted(loads), [13, 13])
+
+    def test_ranks_split_global_batches(self):
+        dataset = list(range(41))
+        group_ids = [i % 2 for i in dataset]
+        costs = [random.random() for _ in dataset]
+        num_replicas = 3
+        rank_batches = [
+            list(
+                make_cost_balanced_batch_sampler(
+                    dataset, group_ids, costs, 2, num_replicas, rank, num_iters=15
+                )
+            )
+            for rank in range(num_replicas)
+        ]
+        for batches in zip(*rank_batches):
+            self.assertTrue(all(len(batch) == 2 for batch in batches))
+            elements = list(itertools.chain(*batches))
+            self.assertEqual(len(set(elements)), 6)
+            self.assertEqual(len(set(group_ids[i] for i in elements)), 1)
+        self.assertEqual(len(rank_batches[0]), 15)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,122 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision.transforms import functional as F
+
+from maskrcnn_benchmark.data.datasets.coco import COCODataset
+from maskrcnn_benchmark.data.datasets.decoded_shards import DecodedImageShards
+from maskrcnn_benchmark.data.datasets.decoded_shards import write_decoded_shards
+from maskrcnn_benchmark.data.transforms import Resize
+
+# (width, height) of the images
+_SIZES = {1: (40, 30), 2: (25, 50), 5: (33, 33)}
+
+
+def _write_coco(data_dir):
+    rng = np.random.RandomState(0)
+    images = []
+    annotations = []
+    for img_id, (width, height) in _SIZES.items():
+        file_name = "{}.png".format(img_id)
+        pixels = rng.randint(0, 256, size=(height, width, 3)).astype(np.uint8)
+        Image.fromarray(pixels).save(os.path.join(data_dir, file_name))
+        images.append({"id": img_id, "file_name": file_name, "width": width, "height": height})
+        for k in range(2):
+            x, y = 2.0 + 3 * k, 4.5 + k
+            annotations.append({
+                "id": len(annotations) + 1,
+                "image_id": img_id,
+                "bbox": [x, y, 10.0, 12.5],
+                "category_id": 3 + k,
+                "iscrowd": 0,
+                "area": 125.0,
+                "segmentation": [[x, y, x + 10, y, x + 10, y + 12.5]],
+            })
+    categories = [{"id": 3, "name": "a"}, {"id": 4, "name": "b"}]
+    ann_file = os.path.join(data_dir, "annotations.json")
+    with open(ann_file, "w") as f:
+        json.dump({"images": images, "annotations": annotations, "categories": categories}, f)
+    return ann_file
+
+
+class TestDecodedShards(unittest.TestCase):
+    def setUp(self):
+        # COCODataset creates a dump directory in the working directory
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)
+        self.ann_file = _write_coco(self.tmp_dir)
+        self.shards_dir = os.path.join(self.tmp_dir, "shards")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir)
+
+    def load_image(self, img_id):
+        path = os.path.join(self.tmp_dir, "{}.png".format(img_id))
+        return Image.open(path).convert("RGB")
+
+    def test_round_trip(self):
+        for resize in (None, Resize(20, 1000)):
+            shutil.rmtree(self.shards_dir, ignore_errors=True)
+            # about one image per shard
+            write_decoded_shards(
+                self.shards_dir, list(_SIZES), self.load_image, resize, max_shard_bytes=4000
+            )
+            shards = DecodedImageShards(self.shards_dir)
+            # the memory maps are not pickled
+            shards.get(1)
+            shards = pickle.loads(pickle.dumps(shards))
+            self.assertEqual(len(shards), 3)
+            self.assertNotIn(3, shards)
+            for img_id, size in _SIZES.items():
+                img = self.load_image(img_id)
+                if resize is not None:
+                    img = F.resize(img, resize.get_size(img.size))
+                self.assertTrue(np.array_equal(shards.get(img_id), np.asarray(img)))
+                self.assertEqual(shards.original_size(img_id), size)
+            self.assertGreater(len(os.listdir(self.shards_dir)), 3)
+
+    def test_dataset_targets(self):
+        resize = Resize(20, 1000)
+        write_decoded_shards(self.shards_dir, list(_SIZES), self.load_image, resize)
+        for ann_cache_dir in (None, os.path.join(self.tmp_dir, "cache")):
+            dataset = COCODataset(
+                self.ann_file, self.tmp_dir, False, resize, ann_cache_dir=ann_cache_dir
+            )
+            sharded = COCODataset(
+                self.ann_file, self.tmp_dir, False, resize,
+                decoded_shards_dir=self.shards_dir, ann_cache_dir=ann_cache_dir,
+            )
+            for idx in range(len(dataset)):
+                img, target, _ = dataset[idx]
+                sharded_img, sharded_target, _ = sharded[idx]
+                self.assertEqual(sharded_img.size, img.size)
+                self.assertTrue(np.array_equal(np.asarray(sharded_img), np.asarray(img)))
+                self.assertEqual(sharded_target.size, img.size)
+                self.assertTrue(torch.allclose(sharded_target.bbox, target.bbox))
+                self.assertTrue(
+                    torch.equal(sharded_target.get_field("labels"), target.get_field("labels"))
+                )
+
+            # without transforms, the target is rescaled to the stored image
+            sharded.transforms = None
+            for idx in range(len(sharded)):
+                img, target, _ = sharded[idx]
+                original = sharded.get_groundtruth(idx)
+                expected = original.clip_to_image(remove_empty=True).resize(img.size)
+                self.assertNotEqual(original.size, img.size)
+                self.assertEqual(target.size, img.size)
+                self.assertTrue(torch.allclose(target.bbox, expected.bbox))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import os
+import shutil
+import tempfile
+import unittest
+
+import torch
+
+from maskrcnn_benchmark.data.image_cache import SharedImageCache
+from maskrcnn_benchmark.data.image_cache import attach_image_cache
+
+
+class _FileDataset(object):
+    def __init__(self, paths):
+        self.paths = paths
+        self.image_cache = None
+
+    def __len__(self):
+        return len(self.paths)
+
+    def get_image_path(self, index):
+        return self.paths[index]
+
+    def __getitem__(self, index):
+        return self.image_cache.read(index, self.paths[index])
+
+
+class TestImageCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.paths = []
+        for i in range(6):
+            path = os.path.join(self.tmp_dir, "{}.jpg".format(i))
+            with open(path, "wb") as f:
+                f.write(os.urandom(100 * (i + 1)))
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def read_file(self, i):
+        with open(self.paths[i], "rb") as f:
+            return f.read()
+
+    def test_hits_and_misses(self):
+        cache = SharedImageCache(len(self.paths), 4096, block_size=256)
+        for _ in range(2):
+            for i in range(len(self.paths)):
+                self.assertEqual(cache.read(i, self.paths[i]), self.read_file(i))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (6, 6))
+        self.assertEqual(stats["bytes"], 2100)
+
+    def test_lru_eviction(self):
+        # 4 blocks: images 0 and 1 take one block, image 2 two blocks
+        cache = SharedImageCache(len(self.paths), 1024, block_size=256)
+        for i in range(3):
+            cache.read(i, self.paths[i])
+        cache.read(0, self.paths[0])
+        # image 3 takes two blocks: 1 is evicted, then 2
+        cache.read(3, self.paths[3])
+        self.assertEqual(cache.stats()["num_images"], 2)
+        cache.read(0, self.paths[0])
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.assertEqual(cache.read(3, self.paths[3]), self.read_file(3))
+        self.assertEqual(cache.stats()["hits"], 3)
+
+    def test_clock_eviction(self):
+        # 4 blocks: images 0 and 1 take a block each, image 2 two blocks
+        cache = SharedImageCache(len(self.paths), 1024, block_size=256)
+        for i in range(3):
+            cache.read(i, self.paths[i])
+        # image 0 is read again: the head skips it once
+        cache.read(0, self.paths[0])
+        self.assertEqual(cache.read(3, self.paths[3]), self.read_file(3))
+        cached = (cache.entries[:, 0] >= 0).nonzero().view(-1).tolist()
+        self.assertEqual(cached, [0, 3])
+        self.assertEqual(cache.block_owner.tolist(), [0, 3, 3, -1])
+
+        # image 0 has to be read again to be skipped again
+        cache.read(0, self.paths[0])
+        cache.read(4, self.paths[4])
+        cached = (cache.entries[:, 0] >= 0).nonzero().view(-1).tolist()
+        self.assertEqual(cached, [0, 4])
+        self.assertEqual(cache.block_owner.tolist(), [0, 4, 4, -1])
+
+    def test_consistency(self):
+        cache = SharedImageCache(len(self.paths), 2048, block_size=256)
+        generator = torch.Generator().manual_seed(0)
+        for key in torch.randint(len(self.paths), (200,), generator=generator).tolist():
+            self.assertEqual(cache.read(key, self.paths[key]), self.read_file(key))
+            # every cached image owns the blocks it is in, and only these
+            owners = cache.block_owner.clone()
+            used_bytes = 0
+            for k, (offset, length, _) in enumerate(cache.entries.tolist()):
+                if offset < 0:
+                    continue
+                first = offset // 256
+                num_blocks = -(-length // 256)
+                self.assertTrue((owners[first : first + num_blocks] == k).all())
+                owners[first : first + num_blocks] = -1
+                used_bytes += length
+            self.assertTrue((owners == -1).all())
+            self.assertEqual(cache.stats()["bytes"], used_bytes)
+
+    def test_too_large(self):
+        cache = SharedImageCache(len(self.paths), 256, block_size=256)
+        self.assertEqual(cache.read(5, self.paths[5]), self.read_file(5))
+        self.assertEqual(cache.stats()["num_images"], 0)
+
+    def test_preload(self):
+        cache = SharedImageCache(len(self.paths), 1024, block_size=256)
+        dataset = _FileDataset(self.paths)
+        keys, paths = attach_image_cache([dataset], cache)
+        cache.preload(keys, paths, num_threads=2)
+        stats = cache.stats()
+        # images 0, 1 and 2 fill the cache, 3 doesn't fit and stops the preload
+        self.assertEqual(stats["num_images"], 3)
+        self.assertEqual(stats["misses"], 0)
+
+    def test_shared_by_workers(self):
+        cache = SharedImageCache(len(self.paths), 8192, block_size=256)
+        dataset = _FileDataset(self.paths)
+        attach_image_cache([dataset], cache)
+        data_loader = torch.utils.data.DataLoader(
+            dataset, batch_size=1, num_workers=2, collate_fn=lambda batch: batch[0]
+        )
+        for _ in range(2):
+            for i, data in enumerate(data_loader):
+                self.assertEqual(data, self.read_file(i))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (6, 6))
+
+
+if __name__ == "__main__":
+    unittest.main()
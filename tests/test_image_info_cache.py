@@ -0,0 +1,148 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from maskrcnn_benchmark.data.datasets.concat_dataset import ConcatDataset
+from maskrcnn_benchmark.data.datasets.image_info_cache import compute_image_info
+from maskrcnn_benchmark.data.datasets.image_info_cache import load_or_compute_image_info
+from maskrcnn_benchmark.data.datasets.list_dataset import ListDataset
+from maskrcnn_benchmark.data.datasets.voc import PascalVOCDataset
+
+
+class _SizeDataset(object):
+    def __init__(self, sizes, key="a"):
+        self.sizes = sizes
+        self.key = key
+        self.num_calls = 0
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def get_img_info(self, index):
+        self.num_calls += 1
+        height, width = self.sizes[index]
+        return {"height": height, "width": width}
+
+    def get_num_annotations(self, index):
+        return index
+
+    def get_cache_key(self):
+        return self.key
+
+
+def _write_voc(data_dir, sizes):
+    os.makedirs(os.path.join(data_dir, "Annotations"))
+    os.makedirs(os.path.join(data_dir, "ImageSets", "Main"))
+    ids = ["{:06d}".format(i) for i in range(len(sizes))]
+    for img_id, size in zip(ids, sizes):
+        _write_voc_annotation(data_dir, img_id, size)
+    with open(os.path.join(data_dir, "ImageSets", "Main", "train.txt"), "w") as f:
+        f.write("\n".join(ids) + "\n")
+
+
+def _write_voc_annotation(data_dir, img_id, size):
+    path = os.path.join(data_dir, "Annotations", img_id + ".xml")
+    with open(path, "w") as f:
+        f.write(
+            "<annotation><size><width>{}</width><height>{}</height></size>"
+            "</annotation>".format(size[1], size[0])
+        )
+    return path
+
+
+class TestImageInfoCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, "cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_hit_and_miss(self):
+        sizes = [(10, 20), (30, 40), (50, 60)]
+        expected = np.array([(10, 20, 0), (30, 40, 1), (50, 60, 2)])
+        dataset = _SizeDataset(sizes)
+        self.assertTrue((compute_image_info(dataset) == expected).all())
+
+        # miss: computed and saved
+        dataset = _SizeDataset(sizes)
+        image_info = load_or_compute_image_info(dataset, self.cache_dir)
+        self.assertTrue((image_info == expected).all())
+        self.assertEqual(dataset.num_calls, 3)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        # hit: loaded
+        dataset = _SizeDataset(sizes)
+        image_info = load_or_compute_image_info(dataset, self.cache_dir)
+        self.assertTrue((image_info == expected).all())
+        self.assertEqual(dataset.num_calls, 0)
+
+        # another key
+        dataset = _SizeDataset(sizes[:2], "b")
+        image_info = load_or_compute_image_info(dataset, self.cache_dir)
+        self.assertTrue((image_info == expected[:2]).all())
+        self.assertEqual(dataset.num_calls, 2)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+        # not cached without a cache directory
+        dataset = _SizeDataset(sizes)
+        load_or_compute_image_info(dataset, "")
+        self.assertEqual(dataset.num_calls, 3)
+
+    def test_wrong_length(self):
+        load_or_compute_image_info(_SizeDataset([(1, 2)] * 3), self.cache_dir)
+        # same key, but another number of images: recomputed
+        dataset = _SizeDataset([(1, 2)] * 4)
+        image_info = load_or_compute_image_info(dataset, self.cache_dir)
+        self.assertEqual(len(image_info), 4)
+        self.assertEqual(dataset.num_calls, 4)
+
+    def test_concat_dataset(self):
+        datasets = [_SizeDataset([(1, 2)], "a"), _SizeDataset([(3, 4), (5, 6)], "b")]
+        image_info = load_or_compute_image_info(ConcatDataset(datasets), self.cache_dir)
+        self.assertEqual(image_info.tolist(), [[1, 2, 0], [3, 4, 0], [5, 6, 1]])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_voc_invalidation(self):
+        data_dir = os.path.join(self.tmp_dir, "voc")
+        _write_voc(data_dir, [(10, 20), (30, 40)])
+        dataset = PascalVOCDataset(data_dir, "train")
+        image_info = load_or_compute_image_info(dataset, self.cache_dir)
+        self.assertEqual(image_info[:, :2].tolist(), [[10, 20], [30, 40]])
+
+        # an annotation is edited in place, the directory is not modified
+        annotations_dir = os.path.join(data_dir, "Annotations")
+        dir_stat = os.stat(annotations_dir)
+        path = _write_voc_annotation(data_dir, "000001", (70, 80))
+        mtime = dir_stat.st_mtime + 10
+        os.utime(path, (mtime, mtime))
+        os.utime(annotations_dir, (dir_stat.st_atime, dir_stat.st_mtime))
+
+        dataset = PascalVOCDataset(data_dir, "train")
+        image_info = load_or_compute_image_info(dataset, self.cache_dir)
+        self.assertEqual(image_info[:, :2].tolist(), [[10, 20], [70, 80]])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_list_dataset_invalidation(self):
+        paths = [os.path.join(self.tmp_dir, "{}.jpg".format(i)) for i in range(2)]
+        for path, (width, height) in zip(paths, [(20, 10), (30, 40)]):
+            Image.new("RGB", (width, height)).save(path)
+        image_info = load_or_compute_image_info(ListDataset(paths), self.cache_dir)
+        self.assertEqual(image_info[:, :2].tolist(), [[10, 20], [40, 30]])
+
+        # an image is replaced by another one at the same path
+        mtime = os.stat(paths[1]).st_mtime + 10
+        Image.new("RGB", (50, 60)).save(paths[1])
+        os.utime(paths[1], (mtime, mtime))
+        image_info = load_or_compute_image_info(ListDataset(paths), self.cache_dir)
+        self.assertEqual(image_info[:, :2].tolist(), [[10, 20], [60, 50]])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
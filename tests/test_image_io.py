@@ -0,0 +1,85 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+from PIL import Image
+
+from maskrcnn_benchmark.data.transforms import Resize
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+
+from maskrcnn_benchmark.data.image_io import load_image
+from maskrcnn_benchmark.data.image_io import read_image_size
+from maskrcnn_benchmark.data.image_io import read_image_sizes
+
+
+class TestImageIO(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def create_image(self, width, height, name, **kwargs):
+        pixels = numpy.random.RandomState(0).randint(0, 256, (height, width, 3))
+        path = os.path.join(self.tmp_dir, name)
+        Image.fromarray(pixels.astype(numpy.uint8)).save(path, **kwargs)
+        return path
+
+    def test_read_image_size(self):
+        paths = [
+            self.create_image(320, 240, "a.jpg"),
+            self.create_image(123, 457, "b.jpg", progressive=True),
+            self.create_image(77, 31, "c.png"),
+            self.create_image(40, 50, "d.bmp"),
+        ]
+        expected = [(320, 240), (123, 457), (77, 31), (40, 50)]
+        self.assertEqual([read_image_size(p) for p in paths], expected)
+        self.assertEqual(read_image_sizes(paths, num_threads=2), expected)
+
+    def test_draft_decoding(self):
+        # a smooth image, as JPEG compression and DCT scaling are made for
+        y, x = numpy.mgrid[0:1203, 0:1601].astype(numpy.float32)
+        pixels = numpy.stack(
+            [
+                127 + 120 * numpy.sin(x / 97.0) * numpy.cos(y / 131.0),
+                255 * x / x.max(),
+                255 * y / y.max(),
+            ],
+            axis=2,
+        )
+        path = os.path.join(self.tmp_dir, "large.jpg")
+        Image.fromarray(pixels.astype(numpy.uint8)).save(path, quality=95)
+
+        resize = Resize(300, 1333)
+        image, size = load_image(path)
+        self.assertEqual(size, (1601, 1203))
+        draft_image, draft_size = load_image(path, resize)
+        self.assertEqual(draft_size, (1601, 1203))
+        # decoded at 1/4 of the resolution, then resized to the target
+        self.assertEqual(draft_image.size, (399, 300))
+        self.assertEqual(draft_image.mode, "RGB")
+        # grayscale JPEG images are converted as well
+        gray_path = os.path.join(self.tmp_dir, "gray.jpg")
+        Image.fromarray(pixels[..., 1].astype(numpy.uint8)).save(gray_path)
+        gray_image, _ = load_image(gray_path, resize)
+        self.assertEqual((gray_image.size, gray_image.mode), ((399, 300), "RGB"))
+
+        target = BoxList([[10, 20, 1000, 800]], size)
+        expected, expected_target = resize(image, target)
+        result, result_target = resize(draft_image, target.resize(draft_image.size))
+        self.assertEqual(result.size, expected.size)
+        self.assertTrue(
+            numpy.allclose(result_target.bbox, expected_target.bbox, atol=1e-3)
+        )
+        diff = numpy.abs(
+            numpy.asarray(result, numpy.float32) - numpy.asarray(expected, numpy.float32)
+        )
+        self.assertLess(diff.mean(), 2.0)
+        self.assertLess(numpy.percentile(diff, 99), 8.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import unittest
+
+import torch
+
+from maskrcnn_benchmark.modeling.matcher import Matcher
+from maskrcnn_benchmark.modeling.rpn.grid_matcher import AnchorGrid
+from maskrcnn_benchmark.modeling.rpn.grid_matcher import GridAnchorMatcher
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+
+
+def _iou(boxes1, boxes2):
+    # same as boxlist_iou
+    TO_REMOVE = 1
+    area1 = (boxes1[:, 2] - boxes1[:, 0] + TO_REMOVE) * (boxes1[:, 3] - boxes1[:, 1] + TO_REMOVE)
+    area2 = (boxes2[:, 2] - boxes2[:, 0] + TO_REMOVE) * (boxes2[:, 3] - boxes2[:, 1] + TO_REMOVE)
+    lt = torch.max(boxes1[:, None, :2], boxes2[:, :2])
+    rb = torch.min(boxes1[:, None, 2:], boxes2[:, 2:])
+    wh = (rb - lt + TO_REMOVE).clamp(min=0)
+    inter = wh[:, :, 0] * wh[:, :, 1]
+    return inter / (area1[:, None] + area2 - inter)
+
+
+def _random_boxes(num_boxes, generator):
+    xy = torch.randint(0, 100, (num_boxes, 2), generator=generator).float()
+    wh = torch.randint(1, 40, (num_boxes, 2), generator=generator).float()
+    return torch.cat([xy, xy + wh], dim=1)
+
+
+def _grid_anchors(grids):
+    # same layout as AnchorGenerator.grid_anchors
+    anchors = []
+    for grid in grids:
+        shift_y, shift_x = torch.meshgrid(
+            torch.arange(grid.grid_height).float() * grid.stride,
+            torch.arange(grid.grid_width).float() * grid.stride,
+        )
+        shifts = torch.stack([shift_x, shift_y, shift_x, shift_y], dim=2)
+        anchors.append((shifts.view(-1, 1, 4) + grid.cell_anchors).view(-1, 4))
+    return torch.cat(anchors)
+
+
+class TestTiledMatcher(unittest.TestCase):
+    def check_same_matches(self, match_quality_matrix):
+        num_predictions = match_quality_matrix.shape[1]
+        for allow_low_quality_matches in (False, True):
+            matcher = Matcher(0.7, 0.3, allow_low_quality_matches)
+            expected = matcher(match_quality_matrix.clone())
+            for tile_size in (1, 7, num_predictions, num_predictions + 5):
+                matches = matcher.match_tiled(
+                    lambda start, end: match_quality_matrix[:, start:end],
+                    num_predictions,
+                    tile_size,
+                )
+                self.assertTrue(torch.equal(matches, expected))
+
+    def test_iou(self):
+        generator = torch.Generator().manual_seed(0)
+        for num_gt in (1, 3, 20):
+            gt = _random_boxes(num_gt, generator)
+            # integer boxes have many ties
+            anchors = _random_boxes(300, generator)
+            self.check_same_matches(_iou(gt, anchors))
+
+    def test_ties(self):
+        generator = torch.Generator().manual_seed(1)
+        quality = torch.randint(0, 5, (6, 50), generator=generator).float() / 4
+        self.check_same_matches(quality)
+
+    def test_empty(self):
+        matcher = Matcher(0.7, 0.3, True)
+        with self.assertRaises(ValueError):
+            matcher.match_tiled(lambda start, end: torch.zeros(0, end - start), 10, 4)
+        with self.assertRaises(ValueError):
+            matcher.match_tiled(lambda start, end: torch.zeros(3, end - start), 0, 4)
+
+
+class TestGridAnchorMatcher(unittest.TestCase):
+    def test_same_matches(self):
+        cell_anchors = torch.tensor(
+            [[-3.5, -1.5, 10.5, 8.5], [-1.5, -1.5, 8.5, 8.5], [-1.5, -3.5, 8.5, 10.5]]
+        )
+        grids = [
+            AnchorGrid(18, 20, 8, cell_anchors),
+            AnchorGrid(9, 10, 16, cell_anchors * 2),
+            AnchorGrid(5, 5, 32, cell_anchors * 4),
+        ]
+        anchors = _grid_anchors(grids)
+        generator = torch.Generator().manual_seed(2)
+        for num_gt in (1, 5, 30):
+            gt = _random_boxes(num_gt, generator) + 0.5
+            for allow_low_quality_matches in (False, True):
+                matcher = Matcher(0.7, 0.3, allow_low_quality_matches)
+                expected = matcher(_iou(gt, anchors))
+                matches = GridAnchorMatcher(matcher)(
+                    BoxList(gt, (160, 144)), BoxList(anchors, (160, 144)), grids
+                )
+                self.assertTrue(torch.equal(matches, expected))
+
+    def test_fallback(self):
+        grids = [AnchorGrid(4, 4, 8, torch.tensor([[0.0, 0.0, 7.0, 7.0]]))]
+        anchors = BoxList(_grid_anchors(grids), (32, 32))
+        matcher = GridAnchorMatcher(Matcher(0.7, 0.3, True))
+        # no anchor overlaps the box
+        far = BoxList(torch.tensor([[100.0, 100.0, 110.0, 110.0]]), (32, 32))
+        self.assertIsNone(matcher(far, anchors, grids))
+        empty = BoxList(torch.zeros(0, 4), (32, 32))
+        self.assertIsNone(matcher(empty, anchors, grids))
+
+
+if __name__ == "__main__":
+    unittest.main()
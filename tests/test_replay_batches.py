@@ -0,0 +1,88 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import os
+import shutil
+import tempfile
+import unittest
+
+import torch
+
+from maskrcnn_benchmark.data.replay_batches import ReplayBatches
+from maskrcnn_benchmark.data.replay_batches import ReplayDataLoader
+from maskrcnn_benchmark.data.replay_batches import write_replay_batches
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.image_list import to_image_list
+from maskrcnn_benchmark.structures.segmentation_mask import SegmentationMask
+
+
+class TestReplayBatches(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def create_batch(self, i):
+        images = [torch.rand(3, 20 + i, 30), torch.rand(3, 25, 28 + i)]
+        targets = []
+        for num_boxes, image in zip((2, 0), images):
+            size = (image.shape[2], image.shape[1])
+            target = BoxList(torch.rand(num_boxes, 4) * 10, size)
+            target.add_field("labels", torch.arange(num_boxes))
+            polygons = [[[1, 1, 5, 1, 5, 5.5]] * (k + 1) for k in range(num_boxes)]
+            target.add_field("masks", SegmentationMask(polygons, size))
+            targets.append(target)
+        return to_image_list(images, 8), targets, (2 * i, 2 * i + 1)
+
+    def test_replay(self):
+        batches = [self.create_batch(i) for i in range(3)]
+        path = os.path.join(self.tmp_dir, "batches.bin")
+        write_replay_batches(path, batches)
+
+        replay_batches = ReplayBatches(path)
+        self.assertEqual(len(replay_batches), len(batches))
+        for i, (images, targets, idxs) in enumerate(batches):
+            replay_images, replay_targets, replay_idxs = replay_batches[i]
+            self.assertTrue(torch.equal(images.tensors, replay_images.tensors))
+            self.assertEqual(idxs, replay_idxs)
+            for target, replay_target in zip(targets, replay_targets):
+                self.assertEqual(target.size, replay_target.size)
+                self.assertTrue(torch.equal(target.bbox, replay_target.bbox))
+                self.assertTrue(
+                    torch.equal(
+                        target.get_field("labels"), replay_target.get_field("labels")
+                    )
+                )
+                masks = target.get_field("masks")
+                replay_masks = replay_target.get_field("masks")
+                self.assertTrue(torch.equal(masks.coords, replay_masks.coords))
+                self.assertTrue(
+                    torch.equal(masks.instance_offsets, replay_masks.instance_offsets)
+                )
+
+        data_loader = ReplayDataLoader(replay_batches, 7, start_iter=2)
+        self.assertEqual(
+            [idxs for _, _, idxs in data_loader],
+            [(4, 5), (0, 1), (2, 3), (4, 5), (0, 1)],
+        )
+
+    def test_replay_distributed(self):
+        batches = [self.create_batch(i) for i in range(5)]
+        path = os.path.join(self.tmp_dir, "batches.bin")
+        write_replay_batches(path, batches, images_per_gpu=2, world_size=2)
+        replay_batches = ReplayBatches(path)
+        self.assertEqual(replay_batches.images_per_gpu, 2)
+        self.assertEqual(replay_batches.world_size, 2)
+
+        # each rank replays its own batches
+        replayed = [
+            [idxs for _, _, idxs in ReplayDataLoader(replay_batches, 4, 0, rank, 2)]
+            for rank in range(2)
+        ]
+        self.assertEqual(replayed[0], [(0, 1), (4, 5), (8, 9), (0, 1)])
+        self.assertEqual(replayed[1], [(2, 3), (6, 7), (2, 3), (6, 7)])
+        with self.assertRaises(ValueError):
+            ReplayDataLoader(replay_batches, 4, 0, 0, 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
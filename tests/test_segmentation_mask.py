@@ -0,0 +1,89 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import unittest
+
+import torch
+
+from maskrcnn_benchmark.structures.segmentation_mask import Polygons
+from maskrcnn_benchmark.structures.segmentation_mask import SegmentationMask
+
+
+class TestSegmentationMask(unittest.TestCase):
+    def create_polygons(self):
+        return [
+            [[10, 10, 40, 10, 40, 30, 10, 30]],
+            [[50, 50, 70, 52, 60, 80], [20.5, 60, 30, 60, 25, 70.25]],
+            [[0, 0, 99, 0, 99, 49, 0, 49]],
+        ]
+
+    def assertMasksEqual(self, mask, expected):
+        self.assertEqual(mask.size, expected[0].size)
+        self.assertEqual(len(mask), len(expected))
+        for instance, expected_instance in zip(mask, expected):
+            self.assertEqual(len(instance.polygons), len(expected_instance.polygons))
+            for p, q in zip(instance.polygons, expected_instance.polygons):
+                self.assertTrue(torch.equal(p, q))
+
+    def test_transforms(self):
+        size = (100, 50)
+        polygons = self.create_polygons()
+        mask = SegmentationMask(polygons, size)
+        instances = [Polygons(p, size, None) for p in polygons]
+
+        self.assertMasksEqual(mask, instances)
+        self.assertMasksEqual(
+            mask.transpose(0), [p.transpose(0) for p in instances]
+        )
+        self.assertMasksEqual(
+            mask.transpose(1), [p.transpose(1) for p in instances]
+        )
+        self.assertMasksEqual(
+            mask.resize((50, 25)), [p.resize((50, 25)) for p in instances]
+        )
+        self.assertMasksEqual(
+            mask.resize((73, 31)), [p.resize((73, 31)) for p in instances]
+        )
+        box = [5, 7, 60, 45]
+        self.assertMasksEqual(mask.crop(box), [p.crop(box) for p in instances])
+
+    def test_getitem(self):
+        size = (100, 50)
+        polygons = self.create_polygons()
+        mask = SegmentationMask(polygons, size)
+        instances = [Polygons(p, size, None) for p in polygons]
+
+        self.assertMasksEqual(mask[1], [instances[1]])
+        self.assertMasksEqual(mask[-1], [instances[2]])
+        self.assertMasksEqual(mask[1:], instances[1:])
+        self.assertMasksEqual(
+            mask[torch.tensor([2, 0, 1, 1])],
+            [instances[2], instances[0], instances[1], instances[1]],
+        )
+        self.assertMasksEqual(
+            mask[torch.tensor([1, 0, 1], dtype=torch.uint8)],
+            [instances[0], instances[2]],
+        )
+        self.assertEqual(len(mask[torch.tensor([], dtype=torch.int64)]), 0)
+
+    def test_crop_and_resize(self):
+        size = (100, 50)
+        polygons = self.create_polygons()
+        mask = SegmentationMask(polygons, size)
+        boxes = torch.tensor(
+            [[8.0, 9.0, 45.5, 33.0], [15.0, 45.0, 75.0, 81.0], [30.0, 30.0, 30.5, 40.0]]
+        )
+
+        result = mask.crop_and_resize(boxes, (28, 28))
+        expected = [
+            instance.crop(box).resize((28, 28)) for instance, box in zip(mask, boxes)
+        ]
+        for instance, expected_instance in zip(result, expected):
+            for p, q in zip(instance.polygons, expected_instance.polygons):
+                self.assertTrue(torch.equal(p, q))
+
+        masks = result.convert(mode="mask")
+        expected_masks = torch.stack([p.convert(mode="mask") for p in expected])
+        self.assertTrue(torch.equal(masks, expected_masks))
+
+
+if __name__ == "__main__":
+    unittest.main()
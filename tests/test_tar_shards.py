@@ -0,0 +1,92 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import os
+import shutil
+import tempfile
+import unittest
+
+import torch
+from PIL import Image
+
+from maskrcnn_benchmark.data.datasets.tar_shards import TarShardDataset
+from maskrcnn_benchmark.data.datasets.tar_shards import write_tar_shards
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.segmentation_mask import SegmentationMask
+
+
+def _batch_indices(batch):
+    return tuple(idx for _, _, idx in batch)
+
+
+class TestTarShards(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.targets = []
+        samples = []
+        for i in range(12):
+            # alternate landscape and portrait images
+            size = (40, 30) if i % 2 == 0 else (30, 40)
+            path = os.path.join(self.tmp_dir, "{}.jpg".format(i))
+            Image.new("RGB", size, (i, 0, 0)).save(path)
+            boxes = torch.tensor([[1.0, 2.0, 20.5, 25.0]] * (i % 3)).reshape(-1, 4)
+            target = BoxList(boxes, size)
+            target.add_field("labels", torch.arange(i % 3) + 1)
+            polygons = [[[1, 1, 5, 1, 5, 5.5]]] * (i % 3)
+            target.add_field("masks", SegmentationMask(polygons, size))
+            self.targets.append(target)
+            samples.append((i, path, target))
+        self.shard_dir = os.path.join(self.tmp_dir, "shards")
+        write_tar_shards(self.shard_dir, samples, samples_per_shard=3)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_samples(self):
+        dataset = TarShardDataset(
+            [self.shard_dir], 1, 12, aspect_grouping=False, shuffle_buffer_size=4
+        )
+        batches = list(dataset)
+        self.assertEqual(len(batches), 12)
+        self.assertEqual(
+            sorted(_batch_indices(b)[0] for b in batches), list(range(12))
+        )
+        for batch in batches:
+            img, target, idx = batch[0]
+            expected = self.targets[idx]
+            self.assertEqual(img.size, expected.size)
+            self.assertTrue(torch.equal(target.bbox, expected.bbox))
+            self.assertTrue(
+                torch.equal(target.get_field("labels"), expected.get_field("labels"))
+            )
+            masks = target.get_field("masks")
+            self.assertTrue(
+                torch.equal(masks.coords, expected.get_field("masks").coords)
+            )
+
+    def test_aspect_grouping(self):
+        dataset = TarShardDataset([self.shard_dir], 2, 20, shuffle_buffer_size=4)
+        for batch in dataset:
+            self.assertEqual(len(set(img.size for img, _, _ in batch)), 1)
+
+    def test_resume(self):
+        def run(start_iter):
+            dataset = TarShardDataset(
+                [self.shard_dir], 2, 17, start_iter, shuffle_buffer_size=4, seed=3
+            )
+            data_loader = torch.utils.data.DataLoader(
+                dataset, batch_size=None, num_workers=2, collate_fn=_batch_indices
+            )
+            return list(data_loader)
+
+        batches = run(0)
+        self.assertEqual(len(batches), 17)
+        for start_iter in (1, 6, 13):
+            self.assertEqual(run(start_iter), batches[start_iter:])
+
+    def test_too_few_shards(self):
+        dataset = TarShardDataset([self.shard_dir], 2, 10, world_size=8)
+        with self.assertRaises(ValueError):
+            list(dataset)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import os
+import shutil
+import tempfile
+import unittest
+
+import torch
+from torch import nn
+
+from maskrcnn_benchmark.config import cfg as default_cfg
+from maskrcnn_benchmark.data.build import _load_sampler_state
+from maskrcnn_benchmark.data.samplers import DistributedSampler
+from maskrcnn_benchmark.data.samplers import GroupedBatchSampler
+from maskrcnn_benchmark.data.samplers import IterationBasedBatchSampler
+from maskrcnn_benchmark.engine.trainer import do_train
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.image_list import to_image_list
+
+
+class _Interrupted(Exception):
+    pass
+
+
+class _RecordingModel(nn.Module):
+    def __init__(self):
+        super(_RecordingModel, self).__init__()
+        self.weight = nn.Parameter(torch.ones(1))
+        self.batches = []
+
+    def forward(self, images, targets):
+        # the images are filled with the indices of the dataset
+        self.batches.append([int(image[0, 0, 0]) for image in images.tensors])
+        return {"loss_recorded": self.weight.sum()}
+
+
+class _Checkpointer(object):
+    def __init__(self, interrupt_at):
+        self.interrupt_at = interrupt_at
+        self.saved = {}
+
+    def save(self, name, **kwargs):
+        self.saved[kwargs["iteration"]] = dict(kwargs)
+        if kwargs["iteration"] == self.interrupt_at:
+            raise _Interrupted()
+
+
+class _Scheduler(object):
+    def step(self):
+        pass
+
+
+def _collate(batch):
+    images = to_image_list([torch.full((3, 4, 4), float(i)) for i in batch])
+    targets = [BoxList(torch.zeros(1, 4), (4, 4)) for _ in batch]
+    return images, targets, tuple(batch)
+
+
+class TestDoTrain(unittest.TestCase):
+    def setUp(self):
+        # do_train dumps tensors and gradients to the working directory
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir)
+
+    def make_data_loader(self, num_iters, start_iter=0, sampler_states=None):
+        dataset = list(range(23))
+        group_ids = [i % 3 == 0 for i in dataset]
+        sampler = DistributedSampler(dataset, num_replicas=1, rank=0)
+        batch_sampler = GroupedBatchSampler(sampler, group_ids, 2)
+        batch_sampler = IterationBasedBatchSampler(batch_sampler, num_iters, start_iter)
+        if sampler_states:
+            _load_sampler_state(batch_sampler, sampler_states, start_iter, 1)
+        return torch.utils.data.DataLoader(
+            dataset, batch_sampler=batch_sampler, collate_fn=_collate
+        )
+
+    def train(self, cfg, data_loader, start_iter, interrupt_at):
+        model = _RecordingModel()
+        checkpointer = _Checkpointer(interrupt_at)
+        arguments = {"iteration": start_iter, "metrics_period": 1000}
+        with self.assertRaises(_Interrupted):
+            do_train(
+                cfg,
+                model,
+                data_loader,
+                torch.optim.SGD(model.parameters(), lr=0.1, momentum=0.9),
+                _Scheduler(),
+                checkpointer,
+                "cpu",
+                4,
+                arguments,
+            )
+        return model.batches, checkpointer.saved
+
+    def test_resume_from_sampler_states(self):
+        num_iters = 40
+        for prefetch_batches in (0, 3):
+            cfg = default_cfg.clone()
+            cfg.DATALOADER.PREFETCH_BATCHES = prefetch_batches
+            batches, _ = self.train(cfg, self.make_data_loader(num_iters), 0, 36)
+
+            # interrupted after the checkpoint at iteration 16
+            _, saved = self.train(cfg, self.make_data_loader(num_iters), 0, 16)
+            sampler_states = saved[16]["sampler_states"]
+            self.assertEqual(len(sampler_states), 1)
+            resumed_batches, _ = self.train(
+                cfg, self.make_data_loader(num_iters, 16, sampler_states), 16, 36
+            )
+            self.assertEqual(resumed_batches, batches[16:])
+
+    def test_data_loader_without_sampler_state(self):
+        # e.g., the replay and tar shards data loaders
+        data_loader = [_collate([i, i + 1]) for i in range(10)]
+        batches, saved = self.train(default_cfg.clone(), data_loader, 0, 8)
+        self.assertEqual(len(batches), 8)
+        self.assertNotIn("sampler_states", saved[4])
+
+
+if __name__ == "__main__":
+    unittest.main()
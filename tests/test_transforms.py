@@ -0,0 +1,132 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import random
+import unittest
+
+import numpy
+import torch
+from PIL import Image
+
+from maskrcnn_benchmark.config import cfg
+from maskrcnn_benchmark.data.collate_batch import BatchCollator
+from maskrcnn_benchmark.data.transforms import build_transforms
+from maskrcnn_benchmark.modeling.image_normalizer import make_image_normalizer
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.image_list import to_image_list
+from maskrcnn_benchmark.structures.segmentation_mask import SegmentationMask
+
+
+class TestFusedTransforms(unittest.TestCase):
+    def create_image(self, width, height):
+        pixels = numpy.random.RandomState(0).randint(0, 256, (height, width, 3))
+        return Image.fromarray(pixels.astype(numpy.uint8))
+
+    def test_same_as_default_transforms(self):
+        image = self.create_image(320, 240)
+        target = BoxList([[10, 20, 100, 200]], image.size)
+        for to_bgr255, mean, std in (
+            (True, [102.9801, 115.9465, 122.7717], [1.0, 1.0, 1.0]),
+            (False, [0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
+        ):
+            config = cfg.clone()
+            config.merge_from_list([
+                "INPUT.MIN_SIZE_TRAIN", 200,
+                "INPUT.MAX_SIZE_TRAIN", 300,
+                "INPUT.FLIP_PROB_TRAIN", 1.0,
+                "INPUT.TO_BGR255", to_bgr255,
+                "INPUT.PIXEL_MEAN", mean,
+                "INPUT.PIXEL_STD", std,
+            ])
+            img, tgt = build_transforms(config, is_train=True)(image, target)
+            config.merge_from_list(["INPUT.FUSED_TRANSFORMS", True])
+            fused_img, fused_tgt = build_transforms(config, is_train=True)(
+                image, target
+            )
+
+            self.assertEqual(img.shape, fused_img.shape)
+            self.assertLess((img - fused_img).abs().max().item(), 1e-4)
+            self.assertTrue(tgt.bbox.equal(fused_tgt.bbox))
+
+    def test_normalize_on_device(self):
+        images = [self.create_image(320, 240), self.create_image(200, 310)]
+        target = BoxList([[10, 20, 100, 200]], images[0].size)
+        for to_bgr255, mean, std in (
+            (True, [102.9801, 115.9465, 122.7717], [1.0, 1.0, 1.0]),
+            (False, [0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
+        ):
+            config = cfg.clone()
+            config.merge_from_list([
+                "INPUT.MIN_SIZE_TRAIN", 200,
+                "INPUT.MAX_SIZE_TRAIN", 300,
+                "INPUT.TO_BGR255", to_bgr255,
+                "INPUT.PIXEL_MEAN", mean,
+                "INPUT.PIXEL_STD", std,
+            ])
+            transforms = build_transforms(config, is_train=False)
+            expected = to_image_list([transforms(i, target)[0] for i in images], 32)
+
+            config.merge_from_list(["INPUT.NORMALIZE_ON_DEVICE", True])
+            transforms = build_transforms(config, is_train=False)
+            batch = to_image_list([transforms(i, target)[0] for i in images], 32)
+            self.assertEqual(batch.tensors.dtype, torch.uint8)
+            batch = make_image_normalizer(config)(batch)
+
+            self.assertEqual(batch.image_sizes, expected.image_sizes)
+            self.assertLess((batch.tensors - expected.tensors).abs().max().item(), 1e-4)
+
+
+class TestDeferTargetTransforms(unittest.TestCase):
+    def create_sample(self, rng, width, height):
+        image = Image.new("RGB", (width, height))
+        num_boxes = rng.randint(0, 5)
+        xy = rng.uniform(0, 100, (num_boxes, 2))
+        boxes = numpy.concatenate([xy, xy + rng.uniform(1, 90, (num_boxes, 2))], 1)
+        target = BoxList(torch.as_tensor(boxes, dtype=torch.float32), image.size)
+        target.add_field("labels", torch.arange(num_boxes))
+        polygons = [
+            [rng.uniform(0, 200, 2 * rng.randint(3, 6)).tolist()]
+            for _ in range(num_boxes)
+        ]
+        target.add_field("masks", SegmentationMask(polygons, image.size))
+        # lazily indexed fields
+        return image, target[torch.arange(num_boxes - 1, -1, -1)]
+
+    def test_same_as_eager_transforms(self):
+        rng = numpy.random.RandomState(0)
+        samples = [
+            self.create_sample(rng, int(rng.randint(100, 400)), int(rng.randint(100, 400)))
+            for _ in range(6)
+        ]
+        config = cfg.clone()
+        config.merge_from_list([
+            "INPUT.MIN_SIZE_TRAIN", 200,
+            "INPUT.MAX_SIZE_TRAIN", 333,
+            "INPUT.FLIP_PROB_TRAIN", 0.5,
+        ])
+        collator = BatchCollator(32)
+
+        def run(transforms):
+            random.seed(1)
+            return collator([transforms(*s) + (i,) for i, s in enumerate(samples)])
+
+        _, expected, _ = run(build_transforms(config, is_train=True))
+        config.merge_from_list(["INPUT.DEFER_TARGET_TRANSFORMS", True])
+        _, targets, _ = run(build_transforms(config, is_train=True))
+
+        for target, expected_target in zip(targets, expected):
+            self.assertIsInstance(target, BoxList)
+            self.assertEqual(target.size, expected_target.size)
+            self.assertTrue(torch.equal(target.bbox, expected_target.bbox))
+            self.assertTrue(
+                torch.equal(
+                    target.get_field("labels"), expected_target.get_field("labels")
+                )
+            )
+            masks = target.get_field("masks")
+            self.assertEqual(masks.size, expected_target.get_field("masks").size)
+            self.assertTrue(
+                torch.equal(masks.coords, expected_target.get_field("masks").coords)
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
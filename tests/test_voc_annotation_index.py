@@ -0,0 +1,170 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import os
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+import torch
+from PIL import Image
+
+from maskrcnn_benchmark.data.datasets.voc import PascalVOCDataset
+from maskrcnn_benchmark.data.transforms import Resize
+
+
+_OBJECT = """
+    <object>
+        <name>{name}</name>
+        <difficult>{difficult}</difficult>
+        <bndbox>
+            <xmin>{box[0]}</xmin><ymin>{box[1]}</ymin>
+            <xmax>{box[2]}</xmax><ymax>{box[3]}</ymax>
+        </bndbox>
+    </object>"""
+
+_ANNOTATIONS = {
+    "000001": ((375, 500), [("dog", 0, (48, 240, 195, 371)), ("Person ", 0, (8, 12, 352, 498))]),
+    "000002": ((500, 333), [("car", 1, (1, 1, 333, 500)), ("car", 0, (10, 20, 30, 40))]),
+    # only difficult objects
+    "000003": ((300, 400), [("chair", 1, (5, 5, 50, 60))]),
+    # no objects
+    "000004": ((200, 100), []),
+}
+
+
+class _DraftSize(Resize):
+    # only gives the draft decoding size, without resizing
+    def __call__(self, image, target):
+        return image, target
+
+
+def _write_annotation(path, size, objects):
+    objects = "".join(
+        _OBJECT.format(name=name, difficult=difficult, box=box)
+        for name, difficult, box in objects
+    )
+    with open(path, "w") as f:
+        f.write(
+            "<annotation><size><width>{}</width><height>{}</height>"
+            "<depth>3</depth></size>{}</annotation>".format(size[1], size[0], objects)
+        )
+
+
+def _parse_groundtruth(path, keep_difficult):
+    # the xml parsing of PascalVOCDataset before the annotation index
+    class_to_ind = dict(zip(PascalVOCDataset.CLASSES, range(len(PascalVOCDataset.CLASSES))))
+    anno = ET.parse(path).getroot()
+    boxes = []
+    labels = []
+    difficult_boxes = []
+    for obj in anno.iter("object"):
+        difficult = int(obj.find("difficult").text) == 1
+        if not keep_difficult and difficult:
+            continue
+        name = obj.find("name").text.lower().strip()
+        bb = obj.find("bndbox")
+        box = [bb.find(k).text for k in ("xmin", "ymin", "xmax", "ymax")]
+        boxes.append(tuple(int(x) - 1 for x in box))
+        labels.append(class_to_ind[name])
+        difficult_boxes.append(difficult)
+    size = anno.find("size")
+    height, width = int(size.find("height").text), int(size.find("width").text)
+    return {
+        "boxes": torch.tensor(boxes, dtype=torch.float32).reshape(-1, 4),
+        "labels": torch.tensor(labels, dtype=torch.int64),
+        "difficult": torch.tensor(difficult_boxes, dtype=torch.bool),
+        "height": height,
+        "width": width,
+    }
+
+
+class TestVocAnnotationIndex(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.data_dir, "cache")
+        os.makedirs(os.path.join(self.data_dir, "Annotations"))
+        os.makedirs(os.path.join(self.data_dir, "ImageSets", "Main"))
+        for img_id, (size, objects) in _ANNOTATIONS.items():
+            _write_annotation(self.ann_path(img_id), size, objects)
+        with open(os.path.join(self.data_dir, "ImageSets", "Main", "train.txt"), "w") as f:
+            f.write("\n".join(sorted(_ANNOTATIONS)) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def ann_path(self, img_id):
+        return os.path.join(self.data_dir, "Annotations", img_id + ".xml")
+
+    def check_dataset(self, dataset):
+        for index, img_id in enumerate(dataset.ids):
+            expected = _parse_groundtruth(self.ann_path(img_id), dataset.keep_difficult)
+            target = dataset.get_groundtruth(index)
+            self.assertEqual(target.size, (expected["width"], expected["height"]))
+            self.assertEqual(target.mode, "xyxy")
+            self.assertTrue(torch.equal(target.bbox, expected["boxes"]))
+            for field in ("labels", "difficult"):
+                self.assertEqual(target.get_field(field).dtype, expected[field].dtype)
+                self.assertTrue(torch.equal(target.get_field(field), expected[field]))
+            self.assertEqual(
+                dataset.get_img_info(index),
+                {"height": expected["height"], "width": expected["width"]},
+            )
+            self.assertEqual(dataset.get_num_annotations(index), len(expected["labels"]))
+
+    def test_same_as_xml(self):
+        for use_difficult in (False, True):
+            for ann_cache_dir in (None, self.cache_dir, self.cache_dir):
+                dataset = PascalVOCDataset(
+                    self.data_dir, "train", use_difficult, ann_cache_dir=ann_cache_dir
+                )
+                self.check_dataset(dataset)
+        # training and testing share the index
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_annotation_edited_in_place(self):
+        PascalVOCDataset(self.data_dir, "train", ann_cache_dir=self.cache_dir)
+        annotations_dir = os.path.join(self.data_dir, "Annotations")
+        dir_stat = os.stat(annotations_dir)
+        path = self.ann_path("000001")
+        mtime = os.stat(path).st_mtime
+        _write_annotation(path, (375, 500), [("cat", 0, (1, 2, 3, 4))])
+        os.utime(path, (mtime + 10, mtime + 10))
+        # the directory is not modified by an edit in place
+        os.utime(annotations_dir, (dir_stat.st_atime, dir_stat.st_mtime))
+
+        dataset = PascalVOCDataset(self.data_dir, "train", ann_cache_dir=self.cache_dir)
+        self.check_dataset(dataset)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_targets_of_images(self):
+        os.makedirs(os.path.join(self.data_dir, "JPEGImages"))
+        image_path = os.path.join(self.data_dir, "JPEGImages", "%s.jpg")
+        # the size of image 000001 matches its annotation, not the one of 000002
+        Image.new("RGB", (500, 375)).save(image_path % "000001")
+        Image.new("RGB", (300, 200)).save(image_path % "000002")
+        for img_id in ("000003", "000004"):
+            Image.new("RGB", (50, 50)).save(image_path % img_id)
+
+        # the targets are not rescaled to the images
+        dataset = PascalVOCDataset(self.data_dir, "train")
+        for index in (0, 1):
+            img, target, _ = dataset[index]
+            expected = dataset.get_groundtruth(index).clip_to_image(remove_empty=True)
+            self.assertEqual(target.size, expected.size)
+            self.assertTrue(torch.equal(target.bbox, expected.bbox))
+        self.assertEqual(img.size, (300, 200))
+
+        # unless the image is draft decoded at a smaller size
+        dataset = PascalVOCDataset(
+            self.data_dir, "train", transforms=_DraftSize(100, 1000), draft_decoding=True
+        )
+        img, target, _ = dataset[0]
+        self.assertEqual(img.size, (133, 100))
+        expected = dataset.get_groundtruth(0).clip_to_image(remove_empty=True)
+        expected = expected.resize((133, 100))
+        self.assertEqual(target.size, (133, 100))
+        self.assertTrue(torch.allclose(target.bbox, expected.bbox))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+r"""
+Measures the per-call overhead of the BoxList operations used in the hot
+paths of the model and of the data loading, on a small BoxList with the
+usual fields
+"""
+import argparse
+import timeit
+
+import torch
+
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.bounding_box import FLIP_LEFT_RIGHT
+from maskrcnn_benchmark.structures.segmentation_mask import SegmentationMask
+
+
+def make_boxlist(num_boxes, device):
+    xy = torch.rand(num_boxes, 2) * 500
+    boxes = torch.cat([xy, xy + torch.rand(num_boxes, 2) * 200], dim=1)
+    boxlist = BoxList(boxes.to(device), (800, 600))
+    boxlist.add_field("labels", torch.randint(1, 81, (num_boxes,), device=device))
+    boxlist.add_field("scores", torch.rand(num_boxes, device=device))
+    boxlist.add_field("objectness", torch.rand(num_boxes, device=device))
+    polygons = [[[0, 0, 10, 0, 10, 10, 0, 10]]] * num_boxes
+    boxlist.add_field("masks", SegmentationMask(polygons, (800, 600)))
+    return boxlist
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the BoxList overhead")
+    parser.add_argument("--num-boxes", type=int, default=64)
+    parser.add_argument("--iters", type=int, default=20000)
+    parser.add_argument("--device", default="cpu")
+    args = parser.parse_args()
+
+    boxlist = make_boxlist(args.num_boxes, args.device)
+    boxes = boxlist.bbox
+    keep = torch.arange(0, args.num_boxes, 2, device=args.device)
+
+    cases = [
+        ("BoxList(tensor)", lambda: BoxList(boxes, boxlist.size)),
+        ("boxlist[keep]", lambda: boxlist[keep]),
+        ("boxlist[keep].get_field", lambda: boxlist[keep].get_field("labels")),
+        ("boxlist[keep][keep2]", lambda: boxlist[keep][:8]),
+        ("convert('xyxy')", lambda: boxlist.convert("xyxy")),
+        ("convert('xywh')", lambda: boxlist.convert("xywh")),
+        ("copy_with_fields", lambda: boxlist.copy_with_fields(["labels"])),
+        ("resize", lambda: boxlist.resize((400, 300))),
+        ("transpose", lambda: boxlist.transpose(FLIP_LEFT_RIGHT)),
+    ]
+    for name, fn in cases:
+        seconds = min(timeit.repeat(fn, number=args.iters, repeat=3))
+        print("{:<28} {:8.2f} us/call".format(name, 1e6 * seconds / args.iters))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+r"""
+Measures the latency of GroupedBatchSampler at the start of an epoch, i.e.,
+the time between asking for a new epoch and getting its first batch, for
+datasets of millions of images
+"""
+import argparse
+import time
+
+import numpy as np
+from torch.utils.data.sampler import RandomSampler
+
+from maskrcnn_benchmark.data.samplers import GroupedBatchSampler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batch samplers")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000000, 10000000],
+        help="number of images in the dataset",
+    )
+    parser.add_argument("--num-groups", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=2)
+    parser.add_argument("--epochs", type=int, default=3)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        group_ids = np.random.randint(0, args.num_groups, size)
+        batch_sampler = GroupedBatchSampler(
+            RandomSampler(range(size)), group_ids, args.batch_size
+        )
+        timings = []
+        for _ in range(args.epochs):
+            start = time.time()
+            next(iter(batch_sampler))
+            timings.append(time.time() - start)
+        print(
+            "{:>10} images: {:8.1f} ms per epoch start (min {:.1f} ms), "
+            "{} batches".format(
+                size, 1000 * np.mean(timings), 1000 * np.min(timings),
+                len(batch_sampler),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+r"""
+Times every step of the default and of the fused (INPUT.FUSED_TRANSFORMS)
+training transforms, and checks that both produce the same image
+"""
+import argparse
+import time
+
+import numpy
+from PIL import Image
+
+from maskrcnn_benchmark.config import cfg
+from maskrcnn_benchmark.data.transforms import build_transforms
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+
+
+def time_transforms(transforms, image, target, num_iters):
+    """
+    Returns the output of the transforms and the average time spent in
+    each of them, in ms
+    """
+    timings = [0.0] * len(transforms.transforms)
+    for _ in range(num_iters):
+        img, tgt = image, target
+        for i, t in enumerate(transforms.transforms):
+            start = time.time()
+            img, tgt = t(img, tgt)
+            timings[i] += time.time() - start
+    return img, [1000.0 * t / num_iters for t in timings]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data transforms")
+    parser.add_argument("--image", default="", help="image to use, random if empty")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=960)
+    parser.add_argument("--iters", type=int, default=50)
+    parser.add_argument(
+        "--config-file", default="", metavar="FILE", help="path to config file"
+    )
+    args = parser.parse_args()
+
+    if args.config_file:
+        cfg.merge_from_file(args.config_file)
+    # deterministic flips, so that both pipelines see the same image
+    cfg.merge_from_list(["INPUT.FLIP_PROB_TRAIN", 1.0])
+
+    if args.image:
+        image = Image.open(args.image).convert("RGB")
+    else:
+        pixels = numpy.random.randint(0, 256, (args.height, args.width, 3))
+        image = Image.fromarray(pixels.astype(numpy.uint8))
+    target = BoxList([[0, 0, image.size[0] - 1, image.size[1] - 1]], image.size)
+
+    outputs = {}
+    for fused in (False, True):
+        cfg.merge_from_list(["INPUT.FUSED_TRANSFORMS", fused])
+        transforms = build_transforms(cfg, is_train=True)
+        output, timings = time_transforms(transforms, image, target, args.iters)
+        outputs[fused] = output
+        print("FUSED_TRANSFORMS={}".format(fused))
+        for t, ms in zip(transforms.transforms, timings):
+            print("    {:<40} {:8.3f} ms".format(t.__class__.__name__, ms))
+        print("    {:<40} {:8.3f} ms".format("total", sum(timings)))
+
+    max_diff = (outputs[False] - outputs[True]).abs().max().item()
+    print("max abs difference between the pipelines: {:.6f}".format(max_diff))
+
+
+if __name__ == "__main__":
+    main()
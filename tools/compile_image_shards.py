@@ -0,0 +1,111 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+r"""
+Decodes the images of the COCO-style datasets of a config once and packs
+them into memory-mappable shards, see DATASETS.DECODED_SHARDS_DIR
+"""
+# Set up custom environment before nearly anything else is imported
+# NOTE: this should be the first import (no not reorder)
+from maskrcnn_benchmark.utils.env import setup_environment  # noqa F401 isort:skip
+
+import argparse
+import logging
+import os
+
+from PIL import Image
+
+from maskrcnn_benchmark.config import cfg
+from maskrcnn_benchmark.data import datasets as D
+from maskrcnn_benchmark.data.datasets.decoded_shards import write_decoded_shards
+from maskrcnn_benchmark.data.transforms import Resize
+from maskrcnn_benchmark.utils.imports import import_file
+from maskrcnn_benchmark.utils.logger import setup_logger
+
+
+def compile_dataset(dataset_name, dataset_catalog, output_dir, resize, max_shard_bytes):
+    logger = logging.getLogger("maskrcnn_benchmark.compile_image_shards")
+    data = dataset_catalog.get(dataset_name)
+    if data["factory"] != "COCODataset":
+        logger.warning("Skipping {}: only COCODataset is supported".format(dataset_name))
+        return
+    dataset = D.COCODataset(remove_images_without_annotations=False, **data["args"])
+
+    def load_image(img_id):
+        path = dataset.coco.loadImgs(img_id)[0]["file_name"]
+        return Image.open(os.path.join(dataset.root, path)).convert("RGB")
+
+    shards_dir = os.path.join(output_dir, dataset_name)
+    logger.info("Compiling {} images of {} into {}".format(
+        len(dataset.ids), dataset_name, shards_dir))
+    index = write_decoded_shards(
+        shards_dir, dataset.ids, load_image, resize, max_shard_bytes
+    )
+    logger.info("Wrote {} shards".format(int(index[:, 0].max()) + 1 if len(index) else 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile decoded image shards")
+    parser.add_argument(
+        "--config-file",
+        default="",
+        metavar="FILE",
+        help="path to config file",
+    )
+    parser.add_argument(
+        "--no-resize",
+        action="store_true",
+        help="store the images at their original resolution",
+    )
+    parser.add_argument(
+        "--max-shard-size",
+        type=int,
+        default=1024,
+        help="maximum size of a shard file, in MB",
+    )
+    parser.add_argument(
+        "opts",
+        help="Modify config options using the command-line",
+        default=None,
+        nargs=argparse.REMAINDER,
+    )
+
+    args = parser.parse_args()
+
+    cfg.merge_from_file(args.config_file)
+    cfg.merge_from_list(args.opts)
+    cfg.freeze()
+
+    logger = setup_logger("maskrcnn_benchmark", "", 0)
+    output_dir = cfg.DATASETS.DECODED_SHARDS_DIR
+    if not output_dir:
+        raise RuntimeError("DATASETS.DECODED_SHARDS_DIR should be set")
+    logger.info("Writing shards to {}".format(output_dir))
+
+    paths_catalog = import_file(
+        "maskrcnn_benchmark.config.paths_catalog", cfg.PATHS_CATALOG, True
+    )
+    DatasetCatalog = paths_catalog.DatasetCatalog
+    max_shard_bytes = args.max_shard_size * 1024 * 1024
+
+    train_resize = Resize(cfg.INPUT.MIN_SIZE_TRAIN, cfg.INPUT.MAX_SIZE_TRAIN)
+    test_resize = Resize(cfg.INPUT.MIN_SIZE_TEST, cfg.INPUT.MAX_SIZE_TEST)
+    compiled = set()
+    for dataset_list, resize in (
+        (cfg.DATASETS.TRAIN, train_resize),
+        (cfg.DATASETS.TEST, test_resize),
+    ):
+        for dataset_name in dataset_list:
+            # datasets used for both training and testing keep the training size
+            if dataset_name in compiled:
+                continue
+            compiled.add(dataset_name)
+            compile_dataset(
+                dataset_name,
+                DatasetCatalog,
+                output_dir,
+                None if args.no_resize else resize,
+                max_shard_bytes,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+r"""
+Packs the training images of the COCO and Pascal VOC datasets of a config,
+with their targets, into tar shards that are streamed sequentially during
+training, see DATASETS.TAR_SHARDS_DIR
+"""
+# Set up custom environment before nearly anything else is imported
+# NOTE: this should be the first import (no not reorder)
+from maskrcnn_benchmark.utils.env import setup_environment  # noqa F401 isort:skip
+
+import argparse
+import logging
+import os
+
+import numpy as np
+
+from maskrcnn_benchmark.config import cfg
+from maskrcnn_benchmark.data.build import build_dataset
+from maskrcnn_benchmark.data.datasets.tar_shards import write_tar_shards
+from maskrcnn_benchmark.utils.imports import import_file
+from maskrcnn_benchmark.utils.logger import setup_logger
+
+
+def convert_dataset(dataset_name, dataset_catalog, output_dir, samples_per_shard, seed):
+    logger = logging.getLogger("maskrcnn_benchmark.convert_to_tar_shards")
+    factory = dataset_catalog.get(dataset_name)["factory"]
+    if factory not in ("COCODataset", "PascalVOCDataset"):
+        logger.warning("Skipping {}: only COCO and VOC are supported".format(dataset_name))
+        return
+    # the same images and targets as for training
+    dataset = build_dataset(
+        [dataset_name], None, dataset_catalog, is_train=True,
+        use_contiguous_category_id=cfg.DATASETS.USE_CONTIGUOUS_CATEGORY_ID,
+        annotation_cache_dir=cfg.DATASETS.ANNOTATION_CACHE_DIR,
+    )[0]
+    # shuffle the samples once, so that each shard is a random subset of
+    # the dataset and the shuffle buffer only has to mix a few shards
+    order = np.random.RandomState(seed).permutation(len(dataset)).tolist()
+    samples = (
+        (i, dataset.get_image_path(i), dataset.get_groundtruth(i)) for i in order
+    )
+
+    shards_dir = os.path.join(output_dir, dataset_name)
+    logger.info("Converting {} images of {} into {}".format(
+        len(dataset), dataset_name, shards_dir))
+    shards = write_tar_shards(shards_dir, samples, samples_per_shard)
+    logger.info("Wrote {} shards".format(len(shards)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert datasets to tar shards")
+    parser.add_argument(
+        "--config-file",
+        default="",
+        metavar="FILE",
+        help="path to config file",
+    )
+    parser.add_argument(
+        "--samples-per-shard",
+        type=int,
+        default=1000,
+        help="number of images of each shard",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="seed of the order of the images in the shards",
+    )
+    parser.add_argument(
+        "opts",
+        help="Modify config options using the command-line",
+        default=None,
+        nargs=argparse.REMAINDER,
+    )
+
+    args = parser.parse_args()
+
+    cfg.merge_from_file(args.config_file)
+    cfg.merge_from_list(args.opts)
+    cfg.freeze()
+
+    logger = setup_logger("maskrcnn_benchmark", "", 0)
+    output_dir = cfg.DATASETS.TAR_SHARDS_DIR
+    if not output_dir:
+        raise RuntimeError("DATASETS.TAR_SHARDS_DIR should be set")
+    logger.info("Writing shards to {}".format(output_dir))
+
+    paths_catalog = import_file(
+        "maskrcnn_benchmark.config.paths_catalog", cfg.PATHS_CATALOG, True
+    )
+    DatasetCatalog = paths_catalog.DatasetCatalog
+    for dataset_name in cfg.DATASETS.TRAIN:
+        convert_dataset(
+            dataset_name, DatasetCatalog, output_dir, args.samples_per_shard, args.seed
+        )
+
+
+if __name__ == "__main__":
+    main()
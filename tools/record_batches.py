@@ -0,0 +1,72 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+r"""
+Records the first batches of the training data loader of a config into a
+single file, which DATALOADER.SYNTHETIC_DATA_PATH can then replay to train
+without loading any data.
+
+The batches are recorded for training on --num-gpus GPUs: each one has the
+SOLVER.IMS_PER_BATCH / num_gpus images of a rank, and the ranks replay
+different batches.
+"""
+# Set up custom environment before nearly anything else is imported
+# NOTE: this should be the first import (no not reorder)
+from maskrcnn_benchmark.utils.env import setup_environment  # noqa F401 isort:skip
+
+import argparse
+import itertools
+
+from maskrcnn_benchmark.config import cfg
+from maskrcnn_benchmark.data import make_data_loader
+from maskrcnn_benchmark.data.replay_batches import write_replay_batches
+from maskrcnn_benchmark.utils.logger import setup_logger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record training batches")
+    parser.add_argument(
+        "--config-file",
+        default="",
+        metavar="FILE",
+        help="path to config file",
+    )
+    parser.add_argument("--output", required=True, help="file to write")
+    parser.add_argument(
+        "--num-batches", type=int, default=100, help="number of batches to record"
+    )
+    parser.add_argument(
+        "--num-gpus", type=int, default=1, help="number of GPUs to replay on"
+    )
+    parser.add_argument(
+        "opts",
+        help="Modify config options using the command-line",
+        default=None,
+        nargs=argparse.REMAINDER,
+    )
+
+    args = parser.parse_args()
+
+    cfg.merge_from_file(args.config_file)
+    cfg.merge_from_list(args.opts)
+    assert (
+        cfg.SOLVER.IMS_PER_BATCH % args.num_gpus == 0
+    ), "SOLVER.IMS_PER_BATCH must be divisible by --num-gpus"
+    # the batches of a single rank
+    images_per_gpu = cfg.SOLVER.IMS_PER_BATCH // args.num_gpus
+    cfg.merge_from_list(["SOLVER.IMS_PER_BATCH", images_per_gpu])
+    # record the real data, not previously recorded batches
+    cfg.merge_from_list(["DATALOADER.SYNTHETIC_DATA_PATH", ""])
+    cfg.freeze()
+
+    logger = setup_logger("maskrcnn_benchmark", "", 0)
+    data_loader = make_data_loader(cfg, is_train=True, is_distributed=False)
+    logger.info("Recording {} batches into {}".format(args.num_batches, args.output))
+    write_replay_batches(
+        args.output,
+        itertools.islice(data_loader, args.num_batches),
+        images_per_gpu,
+        args.num_gpus,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -86,6 +86,7 @@ def main():
             expected_results=cfg.TEST.EXPECTED_RESULTS,
             expected_results_sigma_tol=cfg.TEST.EXPECTED_RESULTS_SIGMA_TOL,
             output_folder=output_folder,
+            prefetch_batches=cfg.DATALOADER.PREFETCH_BATCHES,
         )
         synchronize()
 
@@ -66,6 +66,7 @@ def train(cfg, local_rank, distributed):
         is_train=True,
         is_distributed=distributed,
         start_iter=arguments["iteration"],
+        sampler_states=arguments.get("sampler_states"),
     )
 
     checkpoint_period = cfg.SOLVER.CHECKPOINT_PERIOD
@@ -112,6 +113,7 @@ def test(cfg, model, distributed):
             expected_results=cfg.TEST.EXPECTED_RESULTS,
             expected_results_sigma_tol=cfg.TEST.EXPECTED_RESULTS_SIGMA_TOL,
             output_folder=output_folder,
+            prefetch_batches=cfg.DATALOADER.PREFETCH_BATCHES,
         )
         synchronize()
 